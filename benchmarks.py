@@ -0,0 +1,261 @@
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from modules import evaluation, parallel, tensors
+from modules.boards import Board
+from modules.pieces import Pawn, Knight, Bishop, Rook, Queen, King
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+DEFAULT_THRESHOLD = 0.2
+
+# A fixed corpus of openings, middlegames and endgames, including the standard perft
+# positions, so that every run measures the same work
+POSITIONS = [
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+    'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+    '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+    'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+    'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+    'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+    'r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4',
+    '2kr2nr/ppp2ppp/1bn5/3qN3/3P4/2P5/PP2QPPP/R1B3KR w - - 1 14',
+    '8/8/4k3/3p4/3P4/4K3/8/8 w - - 0 50',
+    '8/5k2/8/8/8/8/1Q6/4K3 b - - 10 70'
+    ]
+PIECE_TYPES = [Pawn, Knight, Bishop, Rook, Queen, King]
+
+
+def _time(function, repeat, number):
+    """Returns the fastest of several runs of a function, in seconds per run"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = (time.perf_counter() - start) / number
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def benchmarks():
+    """
+    Returns a dict from the name of each benchmark to a tuple of the function to time
+    and the number of Board operations one call performs
+    """
+    boards = [Board(fen) for fen in POSITIONS]
+    pseudo_moves = [
+        [move for square, piece in board.pieces[board.current_player].items()
+         for move in piece.get_moves(square, board)]
+        for board in boards]
+    legal_moves = [board.legal_moves() for board in boards]
+
+    def load():
+        board = Board()
+        for fen in POSITIONS:
+            board.load(fen)
+
+    def is_move_legal():
+        for board, moves in zip(boards, pseudo_moves):
+            for move in moves:
+                board.is_move_legal(move)
+
+    def move_notation():
+        for board, moves in zip(boards, legal_moves):
+            for move in moves:
+                board.move_notation(move)
+
+    suite = {
+        'Board.__init__': (lambda: [Board(fen) for fen in POSITIONS], len(POSITIONS)),
+        'Board.load': (load, len(POSITIONS)),
+        'Board.output_fen': (lambda: [board.output_fen() for board in boards], len(boards)),
+        'Board.is_check': (lambda: [board.is_check() for board in boards], len(boards)),
+        'Board.is_move_legal': (is_move_legal, sum(len(moves) for moves in pseudo_moves)),
+        'Board.can_move': (lambda: [board.can_move() for board in boards], len(boards)),
+        'Board.move_notation': (move_notation, sum(len(moves) for moves in legal_moves)),
+        }
+    for piece_type in PIECE_TYPES:
+        pieces = [
+            (board, square, piece) for board in boards
+            for square, piece in board.squares.items() if type(piece) is piece_type]
+        suite[piece_type.__name__ + '.get_moves'] = (
+            lambda pieces=pieces: [piece.get_moves(square, board) for board, square, piece in pieces],
+            len(pieces))
+
+    # a batch the size evaluate_batch is given by training data rather than by a search
+    batch = bytearray(len(POSITIONS) * 100 * tensors.POSITION_SIZE)
+    tensors.encode_batch(POSITIONS * 100, batch)
+    suite['evaluate'] = (lambda: [evaluation.evaluate(fen) for fen in POSITIONS], len(POSITIONS))
+    suite['evaluate_batch'] = (lambda: evaluation.evaluate_batch(batch), len(POSITIONS) * 100)
+    suite['evaluate_batch (per position)'] = (
+        lambda: evaluation.evaluate_batch(batch, use_numpy=False), len(POSITIONS) * 100)
+    return suite
+
+
+def run(repeat=10, target_time=0.05):
+    """
+    Time every benchmark and measure the memory of a Board.
+
+    Parameters:
+        repeat(int): The number of timed runs of each benchmark, of which the fastest is kept
+
+        target_time(float): The approximate number of seconds each timed run should take
+
+    Returns:
+        (dict): The keys timings (microseconds per operation, by benchmark)
+            and memory (bytes per Board and per Board.copy)
+    """
+    timings = {}
+    for name, (function, operations) in benchmarks().items():
+        number = max(1, int(target_time / max(_time(function, 1, 1), 1e-9)))
+        timings[name] = _time(function, repeat, number) / operations * 1e6
+
+    memory = {}
+    count = 100
+    for name, create in (
+            ('Board', lambda fen: Board(fen)),
+            ('Board.copy', lambda board: board.copy())):
+        sources = POSITIONS if name == 'Board' else [Board(fen) for fen in POSITIONS]
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        kept = [create(source) for source in sources for _ in range(count)]
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+        memory[name] = allocated // len(kept)
+    return {'timings': timings, 'memory': memory}
+
+
+def scaling(workers=None, mode='threads', repeat=3, copies=4):
+    """
+    Time analysing the benchmark positions with parallel.analyse_positions on
+    different numbers of threads or processes. Every thread reads the same Board objects.
+    Threads only speed the analysis up on a free-threaded (no GIL) Python build.
+
+    Parameters:
+        workers(list): The numbers of workers to time (optional, defaults to
+            powers of two up to the number of CPUs)
+
+        mode(str): One of parallel.MODES
+
+        repeat(int): The number of timed runs for each number of workers, of which the fastest is kept
+
+        copies(int): The number of times each position is analysed in a run
+
+    Returns:
+        (dict): The keys mode, gil_enabled, cpus, positions, and timings and speedup,
+            which map each number of workers to seconds per run and to the speedup
+            over the first number of workers
+    """
+    cpus = os.cpu_count() or 1
+    if workers is None:
+        workers = [1]
+        while workers[-1] * 2 <= cpus:
+            workers.append(workers[-1] * 2)
+    boards = [Board(fen) for fen in POSITIONS] * copies
+    timings = {
+        count: _time(lambda: parallel.analyse_positions(boards, count, mode), repeat, 1)
+        for count in workers}
+    return {
+        'mode': mode,
+        'gil_enabled': parallel.gil_enabled(),
+        'cpus': cpus,
+        'positions': len(boards),
+        'timings': timings,
+        'speedup': {count: timings[workers[0]] / timings[count] for count in workers}
+        }
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Find the measurements which have got worse than a baseline by more than a threshold.
+    Timings are only comparable with a baseline recorded on the same machine.
+
+    Parameters:
+        results(dict): Results from run
+
+        baseline(dict): Earlier results from run
+
+        threshold(float): The allowed increase as a fraction e.g. 0.2 for 20%
+
+    Returns:
+        (list): A string describing each regression
+    """
+    regressions = []
+    for section in ('timings', 'memory'):
+        for name, old in baseline.get(section, {}).items():
+            new = results[section].get(name)
+            if new is None or old <= 0:
+                continue
+            if new > old * (1 + threshold):
+                regressions.append(
+                    section + ' ' + name + ': ' + _format(old) + ' -> ' + _format(new) +
+                    ' (+' + str(round((new / old - 1) * 100)) + '%)')
+    return regressions
+
+
+def _format(value):
+    """Returns a measurement rounded for display"""
+    return str(round(value, 3))
+
+
+def main(arguments=None):
+    """
+    Run the benchmarks from the command line, comparing them with the baseline.
+
+    Returns:
+        (int): The exit status, which is 1 when any measurement has regressed
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the core Board operations')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='the baseline JSON file')
+    parser.add_argument(
+        '--save', action='store_true', help='write the results as the new baseline')
+    parser.add_argument(
+        '--threshold', type=float, default=DEFAULT_THRESHOLD,
+        help='the allowed slowdown or memory growth as a fraction (default 0.2)')
+    parser.add_argument(
+        '--scaling', choices=parallel.MODES,
+        help='instead, time the analysis of shared positions on more and more threads or processes')
+    parser.add_argument(
+        '--workers', type=int, nargs='+', help='the numbers of workers to time with --scaling')
+    args = parser.parse_args(arguments)
+
+    if args.scaling is not None:
+        results = scaling(args.workers, args.scaling)
+        print(args.scaling + ' on ' + str(results['cpus']) + ' CPUs, GIL ' +
+              ('enabled' if results['gil_enabled'] else 'disabled') + ', ' +
+              str(results['positions']) + ' positions')
+        for count, seconds in results['timings'].items():
+            print(str(count).rjust(4) + ' workers' + _format(seconds).rjust(12) + ' s' +
+                  _format(results['speedup'][count]).rjust(10) + 'x')
+        return 0
+
+    results = run()
+    for name, value in results['timings'].items():
+        print(name.ljust(24) + _format(value).rjust(12) + ' us')
+    for name, value in results['memory'].items():
+        print((name + ' memory').ljust(24) + str(value).rjust(12) + ' bytes')
+
+    status = 0
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        if len(regressions) > 0:
+            status = 1
+        else:
+            print('No regressions against ' + args.baseline)
+    if args.save:
+        with open(args.baseline, 'w') as file:
+            json.dump(results, file, indent=2)
+            file.write('\n')
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,3 +1,24 @@
+import sys
+import time
+
+start = time.perf_counter()
 from modules.main import App
+imported = time.perf_counter()
+
+
+def startup_bench():
+    """Print how long the program took to import and to run its first command"""
+    import contextlib
+    import io
+    begin = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        App().print_game_state()
+    first_command = time.perf_counter() - begin
+    print("import: " + str(round((imported - start) * 1000, 2)) + " ms")
+    print("first command (print_game_state): " + str(round(first_command * 1000, 2)) + " ms")
+
 
-App().run()
\ No newline at end of file
+if '--startup-bench' in sys.argv[1:]:
+    startup_bench()
+else:
+    App().run(ponder='--ponder' in sys.argv[1:])
@@ -0,0 +1,245 @@
+import argparse
+import functools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from modules import pgn
+from modules.boards import Board
+from modules.search import MATE_SCORE, Search
+
+DEFAULT_DEPTH = 2
+# The centipawns a move must lose, compared with the best move, to be flagged
+MISTAKE_LOSS = 100
+BLUNDER_LOSS = 300
+# Scores are limited to this many centipawns when working out the loss, so that
+# a move which still wins easily is not flagged for missing a faster mate
+SCORE_LIMIT = 1000
+# Numeric annotation glyphs for the PGN output
+NAGS = {'mistake': 2, 'blunder': 4}
+
+
+def evaluate_position(fen, depth=DEFAULT_DEPTH):
+    """
+    Search a position for its best move.
+
+    Parameters:
+        fen(str): The position as a FEN string
+
+        depth(int): The search depth in plies
+
+    Returns:
+        (tuple): The best move in uci format (None if there are no legal moves)
+            and the score in centipawns from the current player's point of view
+    """
+    return Search().best_move(Board(fen), depth)
+
+
+def evaluate_move(fen, move, depth=DEFAULT_DEPTH):
+    """
+    Search a position for its best move and score a played move on the same horizon,
+    by searching the position after it one ply less deeply, as best_move does for each move.
+
+    Parameters:
+        fen(str): The position as a FEN string
+
+        move(str): The move played, in uci format
+
+        depth(int): The search depth in plies
+
+    Returns:
+        (tuple): The best move in uci format, its score and the score of the played move,
+            in centipawns from the current player's point of view
+    """
+    search = Search()
+    board = Board(fen)
+    best_move, best_score = search.best_move(board, depth)
+    if move == best_move:
+        return best_move, best_score, best_score
+    board.make_move(move)
+    return best_move, best_score, -search.alpha_beta(board, depth - 1, -MATE_SCORE, MATE_SCORE, 1)
+
+
+def annotate_game(moves, fen=None, depth=DEFAULT_DEPTH, executor=None):
+    """
+    Evaluate every position of a game and flag the moves which lose a lot compared
+    with the best move. Each played move is scored to the same depth as the best move,
+    as in evaluate_move. Each position is searched independently, so with an executor
+    the whole game takes about as long as its slowest few positions.
+
+    Parameters:
+        moves(list): The moves of the game in uci format
+
+        fen(str): The starting position (optional, defaults to the standard start)
+
+        depth(int): The search depth in plies for each position
+
+        executor(Executor): A pool to search the positions on (optional,
+            by default they are searched in this process)
+
+    Returns:
+        (dict): The keys fen, seconds, plies (a dict per move as described below),
+            and mistakes and blunders (a dict from each color to the number of its moves
+            flagged). Each ply has the keys move (uci), notation, score (centipawns
+            from white's point of view after the move), best_move, best_notation,
+            loss (centipawns lost compared with the best move) and classification
+            (mistake, blunder or None)
+    """
+    start = time.perf_counter()
+    board = Board(fen)
+    fens = [board.output_fen()]
+    notations = []
+    players = []
+    for move in moves:
+        notation = board.move_notation(move)
+        if notation is None:
+            raise ValueError('Illegal move: ' + move)
+        notations.append(notation)
+        players.append(board.current_player)
+        board.make_move(move)
+        fens.append(board.output_fen())
+
+    task = functools.partial(evaluate_move, depth=depth)
+    if executor is None:
+        evaluations = [task(position, move) for position, move in zip(fens, moves)]
+    else:
+        evaluations = list(executor.map(task, fens, moves))
+
+    game = {
+        'fen': fens[0],
+        'plies': [],
+        'mistakes': {'white': 0, 'black': 0},
+        'blunders': {'white': 0, 'black': 0}
+        }
+    for i, move in enumerate(moves):
+        best_move, best_score, played_score = evaluations[i]
+        loss = 0
+        if move != best_move:
+            loss = max(0, _limit(best_score) - _limit(played_score))
+        classification = None
+        if loss >= BLUNDER_LOSS:
+            classification = 'blunder'
+        elif loss >= MISTAKE_LOSS:
+            classification = 'mistake'
+        if classification is not None:
+            game[classification + 's'][players[i]] += 1
+        game['plies'].append({
+            'move': move,
+            'notation': notations[i],
+            'score': played_score if players[i] == 'white' else -played_score,
+            'best_move': best_move,
+            'best_notation': Board(fens[i]).move_notation(best_move) if best_move else None,
+            'loss': loss,
+            'classification': classification
+            })
+    game['seconds'] = round(time.perf_counter() - start, 3)
+    return game
+
+
+def annotated_pgn(game, moves, headers=None, result='*'):
+    """
+    Get the PGN text for a game annotated by annotate_game, with the score after each move
+    as a comment and mistakes and blunders marked with a glyph and the best move.
+
+    Parameters:
+        game(dict): The result of annotate_game
+
+        moves(list): The moves of the game in uci format
+
+        headers(dict): Tag pairs for the game (optional)
+
+        result(str): One of pgn.RESULTS
+
+    Returns:
+        (str): The game in PGN
+    """
+    nags = []
+    comments = []
+    for ply in game['plies']:
+        comment = format_score(ply['score'])
+        if ply['classification'] is not None:
+            comment = (ply['classification'].capitalize() + ', best was ' +
+                       ply['best_notation'] + '. ' + comment)
+        nags.append(NAGS.get(ply['classification']))
+        comments.append(comment)
+    return pgn.write_game(moves, game['fen'], headers, result, nags, comments)
+
+
+def format_score(score):
+    """Returns a score in centipawns as pawns e.g. +1.25, or as a mate e.g. #3 or #-2"""
+    if abs(score) > MATE_SCORE - 1000:
+        moves = (MATE_SCORE - abs(score) + 1) // 2
+        return '#' + ('-' if score < 0 else '') + str(moves)
+    return ('+' if score >= 0 else '-') + '%.2f' % (abs(score) / 100)
+
+
+def _limit(score):
+    """Returns a score limited to SCORE_LIMIT centipawns either way"""
+    return max(-SCORE_LIMIT, min(SCORE_LIMIT, score))
+
+
+def _read_input(path, uci, fen):
+    """Returns a (moves, fen, headers, result) tuple for each game to annotate"""
+    if uci is not None:
+        return [(uci.split(), fen, None, '*')]
+    if path == '-':
+        source = pgn.read_games(sys.stdin)
+    else:
+        with open(path) as file:
+            source = list(pgn.read_games(file))
+    games = []
+    for game in source:
+        start = game['headers'].get('FEN', fen)
+        board = Board(start)
+        moves = []
+        for notation in game['moves']:
+            move = board.parse_notation(notation)
+            if move is None:
+                raise ValueError('Illegal move: ' + notation)
+            moves.append(move)
+            board.make_move(move)
+        games.append((moves, start, game['headers'], game['result']))
+    return games
+
+
+def main(arguments=None):
+    """Annotate games from the command line, reporting how long each took on standard error"""
+    parser = argparse.ArgumentParser(
+        prog='python -m modules.annotate',
+        description='Evaluate every move of a game and flag mistakes and blunders')
+    parser.add_argument(
+        'pgn', nargs='?', default='-', help='PGN file of games (default: standard input)')
+    parser.add_argument('--uci', help='a single game as uci moves separated by spaces')
+    parser.add_argument('--fen', help='the starting position of the --uci game')
+    parser.add_argument('--depth', type=int, default=DEFAULT_DEPTH, help='search depth in plies')
+    parser.add_argument(
+        '--workers', type=int, help='number of processes (default: one per CPU)')
+    parser.add_argument('--format', choices=['pgn', 'json'], default='pgn')
+    args = parser.parse_args(arguments)
+
+    workers = args.workers or os.cpu_count() or 1
+    # one pool is shared by every game, so each game's time is only its own searches
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    annotated = []
+    try:
+        games = _read_input(args.pgn, args.uci, args.fen)
+        for i, (moves, fen, headers, result) in enumerate(games, 1):
+            game = annotate_game(moves, fen, args.depth, executor)
+            print('Game ' + str(i) + ': ' + str(len(moves)) + ' plies in ' +
+                  str(game['seconds']) + ' seconds', file=sys.stderr)
+            if args.format == 'pgn':
+                sys.stdout.write(annotated_pgn(game, moves, headers, result))
+            else:
+                game['headers'] = headers
+                game['result'] = result
+                annotated.append(game)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    if args.format == 'json':
+        print(json.dumps(annotated, indent=2))
+
+if __name__ == '__main__':
+    main()
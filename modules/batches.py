@@ -0,0 +1,185 @@
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from modules.boards import Board, PACKED_SIZE
+from modules.evaluation import evaluate
+
+STATUSES = ['ongoing', 'check', 'checkmate', 'stalemate', 'insufficient_material']
+
+# The shared block starts with the number of positions, followed by every packed
+# position (as Board.pack_into) and then a result slot per position
+_HEADER = struct.Struct('<Q')
+# Result slots hold a flag set once written, the index of the status in STATUSES,
+# the number of legal moves and the static evaluation in centipawns
+_RESULT = struct.Struct('<BBHi')
+
+
+class PositionBatch:
+    """
+    Packed positions and their results in a block of shared memory, so that worker
+    processes can read positions and write results in place. Only the block's name
+    needs to be sent to a worker, which opens it with PositionBatch(name=...).
+    """
+
+    def __init__(self, count=None, name=None):
+        """
+        Creates a new batch, or opens an existing one when a name is given.
+
+        Parameters:
+            count(int): The number of positions to make room for, when creating a batch
+
+            name(str): The name of an existing batch's shared memory
+        """
+        if name is None:
+            size = _HEADER.size + count * (PACKED_SIZE + _RESULT.size)
+            self._memory = shared_memory.SharedMemory(create=True, size=size)
+            _HEADER.pack_into(self._memory.buf, 0, count)
+            self.owner = True
+        else:
+            self._memory = shared_memory.SharedMemory(name=name)
+            count = _HEADER.unpack_from(self._memory.buf, 0)[0]
+            self.owner = False
+        self.count = count
+        self.name = self._memory.name
+        self._closed = False
+        start = _HEADER.size
+        middle = start + count * PACKED_SIZE
+        # views straight onto the shared memory, without copying
+        self.positions = self._memory.buf[start:middle]
+        self.results = self._memory.buf[middle:middle + count * _RESULT.size]
+
+    def __enter__(self):
+        """Returns the batch for use in a with statement"""
+        return self
+
+    def __exit__(self, *exc):
+        """Closes the batch, freeing the shared memory if this process created it"""
+        self.close()
+        if self.owner:
+            self.unlink()
+
+    def __len__(self):
+        """Returns the number of positions"""
+        return self.count
+
+    def put(self, index, position):
+        """
+        Store a position and clear its result.
+
+        Parameters:
+            index(int): The slot to store the position in
+
+            position(Board or str): A Board object or a FEN string
+        """
+        if isinstance(position, str):
+            board = Board()
+            if not board.load(position):
+                raise ValueError('Invalid FEN supplied: ' + position)
+            position = board
+        position.pack_into(self.positions, index * PACKED_SIZE)
+        _RESULT.pack_into(self.results, index * _RESULT.size, 0, 0, 0, 0)
+
+    def board(self, index):
+        """Returns a new Board with the position in a slot"""
+        return Board.from_packed(self.positions, index * PACKED_SIZE)
+
+    def write_result(self, index, legal_moves, status, score):
+        """
+        Store the result for a position.
+
+        Parameters:
+            index(int): The slot of the position
+
+            legal_moves(int): The number of legal moves
+
+            status(str): The game status, one of STATUSES
+
+            score(int): The evaluation in centipawns
+        """
+        _RESULT.pack_into(
+            self.results, index * _RESULT.size, 1, STATUSES.index(status), legal_moves, score)
+
+    def result(self, index):
+        """
+        Get the result for a position.
+
+        Parameters:
+            index(int): The slot of the position
+
+        Returns:
+            (dict): The keys legal_moves, status and score, or None if no result has been written
+        """
+        done, status, legal_moves, score = _RESULT.unpack_from(
+            self.results, index * _RESULT.size)
+        if not done:
+            return None
+        return {'legal_moves': legal_moves, 'status': STATUSES[status], 'score': score}
+
+    def close(self):
+        """Releases this process's access to the shared memory"""
+        if not self._closed:
+            self._closed = True
+            self.positions.release()
+            self.results.release()
+            self._memory.close()
+
+    def unlink(self):
+        """Frees the shared memory. This should be called once, by the process which created it"""
+        self._memory.unlink()
+
+
+def analyse(batch, start=0, stop=None):
+    """
+    Work out the legal move count, game status and static evaluation
+    (from white's point of view) of positions in a batch, writing them to the result slots.
+
+    Parameters:
+        batch(PositionBatch): The batch
+
+        start(int): The first slot to analyse
+
+        stop(int): The slot after the last to analyse (optional, defaults to the end)
+    """
+    if stop is None:
+        stop = batch.count
+    for index in range(start, stop):
+        board = batch.board(index)
+        batch.write_result(
+            index, len(board.legal_moves()), board.game_status(), evaluate(board)['score'])
+
+
+def run_batch(batch, workers=None):
+    """
+    Analyse every position in a batch, split into equal ranges across a pool of processes.
+    Each worker is only sent the batch's name and its range.
+
+    Parameters:
+        batch(PositionBatch): The batch
+
+        workers(int): The number of processes (optional, defaults to one per CPU).
+            With one worker the positions are analysed in this process
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, batch.count))
+    if workers == 1:
+        analyse(batch)
+        return
+    bounds = [batch.count * i // workers for i in range(workers + 1)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        ranges = [
+            executor.submit(_analyse_shared, batch.name, bounds[i], bounds[i + 1])
+            for i in range(workers)]
+        for completed in ranges:
+            completed.result()
+
+
+def _analyse_shared(name, start, stop):
+    """Opens a batch by name in a worker process and analyses a range of it"""
+    batch = PositionBatch(name=name)
+    try:
+        analyse(batch, start, stop)
+    finally:
+        batch.close()
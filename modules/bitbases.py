@@ -0,0 +1,287 @@
+import mmap
+import os
+import sys
+from collections import deque
+
+from modules.tables import KING_ATTACKS, RAYS, SQUARE_INDEX, ORTHOGONALS, DIAGONALS
+
+DEFAULT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bitbases')
+
+# The endings covered, by the strong side's extra piece. Queen and rook endings are
+# generated first because a pawn ending can promote into them.
+PIECES = ['q', 'r', 'p']
+
+# Positions are indexed by side to move (0 when the strong side is to move),
+# strong king, weak king and strong piece, with squares numbered as in tables.SQUARES.
+# The strong side always plays up the board; positions where black is the strong side
+# are mirrored before probing. Each bit records whether the strong side wins.
+SIZE = 2 * 64 * 64 * 64
+STRONG = 0
+WEAK = 1
+
+_DIRECTIONS = {'q': ORTHOGONALS + DIAGONALS, 'r': ORTHOGONALS}
+
+
+def index(side, strong_king, weak_king, piece):
+    """Returns the position index of a side to move and three squares"""
+    return ((side * 64 + strong_king) * 64 + weak_king) * 64 + piece
+
+
+def generate(directory=DEFAULT_DIRECTORY, pieces=PIECES):
+    """
+    Build the KQK, KRK and KPK bitbases by retrograde analysis and write them to
+    bit-packed files of 64KB each.
+
+    Parameters:
+        directory(str): The directory to write kqk.bin, krk.bin and kpk.bin to
+
+        pieces(list): The endings to build, by the strong side's extra piece.
+            Building the pawn ending also builds the queen and rook endings
+
+    Returns:
+        (dict): The generated tables as bytearrays, by piece symbol
+    """
+    if 'p' in pieces:
+        pieces = PIECES
+    os.makedirs(directory, exist_ok=True)
+    generated = {}
+    for piece in PIECES:
+        if piece not in pieces:
+            continue
+        wins = _Generator(piece, generated).run()
+        packed = bytearray(SIZE // 8)
+        for i in range(SIZE):
+            if wins[i]:
+                packed[i >> 3] |= 1 << (i & 7)
+        with open(_path(directory, piece), 'wb') as file:
+            file.write(packed)
+        generated[piece] = wins
+    return generated
+
+
+class Bitbases:
+    """Lazily memory-mapped bitbase files, probed in constant time"""
+
+    def __init__(self, directory=DEFAULT_DIRECTORY):
+        """
+        Initializes the bitbases. Files are only opened when first needed.
+
+        Parameters:
+            directory(str): The directory containing the files written by generate
+        """
+        self.directory = directory
+        self._maps = {}
+
+    def probe(self, board):
+        """
+        Look up the result of a position with perfect play.
+
+        Parameters:
+            board(Board): The position to look up
+
+        Returns:
+            (str): 'win', 'draw' or 'loss' for the current player, or None if the
+                position is not a KQK, KRK or KPK ending (without castling rights)
+                or its bitbase has not been generated
+        """
+        signature = board.material_signature()
+        if signature in ('KQvK', 'KRvK', 'KPvK'):
+            strong = 'white'
+        elif signature in ('KvKQ', 'KvKR', 'KvKP'):
+            strong = 'black'
+        else:
+            return None
+        if board.castling_wk or board.castling_wq or board.castling_bk or board.castling_bq:
+            return None
+
+        piece = signature.replace('K', '').replace('v', '').lower()
+        data = self._load(piece)
+        if data is None:
+            return None
+
+        weak = board.opponents[strong]
+        squares = [board.kings[strong], board.kings[weak]]
+        for square in board.pieces[strong]:
+            if square != board.kings[strong]:
+                squares.append(square)
+        # mirror the board vertically so that the strong side plays up the board
+        flip = 56 if strong == 'black' else 0
+        strong_king, weak_king, piece_square = (SQUARE_INDEX[s] ^ flip for s in squares)
+        side = STRONG if board.current_player == strong else WEAK
+
+        i = index(side, strong_king, weak_king, piece_square)
+        if not data[i >> 3] >> (i & 7) & 1:
+            return 'draw'
+        if side == STRONG:
+            return 'win'
+        return 'loss'
+
+    def close(self):
+        """Closes any open files"""
+        for data in self._maps.values():
+            if data is not None:
+                data.close()
+        self._maps = {}
+
+    def _load(self, piece):
+        """Returns the memory-mapped table for a piece, or None if it has not been generated"""
+        if piece not in self._maps:
+            path = _path(self.directory, piece)
+            if not os.path.exists(path):
+                return None
+            with open(path, 'rb') as file:
+                self._maps[piece] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._maps[piece]
+
+
+# The bitbases in the default directory, shared by every Board
+DEFAULT_BITBASES = Bitbases()
+
+
+def _path(directory, piece):
+    """Returns the file path of a bitbase"""
+    return os.path.join(directory, 'k' + piece + 'k.bin')
+
+
+def _adjacent(a, b):
+    """Returns a bool indicating whether two squares are a king's move apart"""
+    return abs((a >> 3) - (b >> 3)) <= 1 and abs((a & 7) - (b & 7)) <= 1
+
+
+class _Generator:
+    """Retrograde analysis of one ending"""
+
+    def __init__(self, piece, generated):
+        """
+        Parameters:
+            piece(str): The strong side's extra piece: q, r or p
+
+            generated(dict): Already generated tables, used for pawn promotions
+        """
+        self.piece = piece
+        self.generated = generated
+
+    def run(self):
+        """Returns a bytearray with 1 for each position the strong side wins"""
+        wins = bytearray(SIZE)
+        legal = bytearray(SIZE)
+        # the number of weak king moves not yet known to lose, for each weak to move position
+        remaining = [0] * (SIZE // 2)
+        queue = deque()
+
+        for strong_king in range(64):
+            for weak_king in range(64):
+                if strong_king == weak_king or _adjacent(strong_king, weak_king):
+                    continue
+                for piece in range(64):
+                    if piece == strong_king or piece == weak_king:
+                        continue
+                    if self.piece == 'p' and (piece < 8 or piece >= 56):
+                        continue
+                    check = self._attacks(piece, weak_king, strong_king)
+
+                    i = index(WEAK, strong_king, weak_king, piece)
+                    legal[i] = 1
+                    moves = len(self._weak_moves(strong_king, weak_king, piece))
+                    remaining[i - SIZE // 2] = moves
+                    if moves == 0 and check:
+                        wins[i] = 1
+                        queue.append(i)
+
+                    if check:
+                        continue
+                    i = index(STRONG, strong_king, weak_king, piece)
+                    legal[i] = 1
+                    if self._promotion_wins(strong_king, weak_king, piece):
+                        wins[i] = 1
+                        queue.append(i)
+
+        while queue:
+            i = queue.popleft()
+            rest, piece = divmod(i, 64)
+            rest, weak_king = divmod(rest, 64)
+            side, strong_king = divmod(rest, 64)
+            if side == WEAK:
+                # any strong move into this position wins
+                for previous in self._strong_unmoves(strong_king, weak_king, piece):
+                    if legal[previous] and not wins[previous]:
+                        wins[previous] = 1
+                        queue.append(previous)
+            else:
+                # a weak position loses once every weak king move loses
+                for square in KING_ATTACKS[weak_king]:
+                    if (square == strong_king or square == piece or
+                            _adjacent(square, strong_king)):
+                        continue
+                    previous = index(WEAK, strong_king, square, piece)
+                    if not legal[previous] or wins[previous]:
+                        continue
+                    remaining[previous - SIZE // 2] -= 1
+                    if remaining[previous - SIZE // 2] == 0:
+                        wins[previous] = 1
+                        queue.append(previous)
+        return wins
+
+    def _attacks(self, piece, target, blocker):
+        """Returns a bool indicating whether the strong piece attacks a square"""
+        if self.piece == 'p':
+            return target >> 3 == (piece >> 3) - 1 and abs((target & 7) - (piece & 7)) == 1
+        for direction in _DIRECTIONS[self.piece]:
+            for square in RAYS[direction][piece]:
+                if square == target:
+                    return True
+                if square == blocker:
+                    break
+        return False
+
+    def _weak_moves(self, strong_king, weak_king, piece):
+        """Returns the squares the weak king can legally move to, including capturing the piece"""
+        moves = []
+        for square in KING_ATTACKS[weak_king]:
+            if square == strong_king or _adjacent(square, strong_king):
+                continue
+            if square != piece and self._attacks(piece, square, strong_king):
+                continue
+            moves.append(square)
+        return moves
+
+    def _promotion_wins(self, strong_king, weak_king, piece):
+        """Returns a bool indicating whether a pawn can promote into a won ending"""
+        if self.piece != 'p' or piece >= 16:
+            return False
+        square = piece - 8
+        if square == strong_king or square == weak_king:
+            return False
+        for promoted in ('q', 'r'):
+            if self.generated[promoted][index(WEAK, strong_king, weak_king, square)]:
+                return True
+        return False
+
+    def _strong_unmoves(self, strong_king, weak_king, piece):
+        """Returns the strong to move positions which lead to a weak to move position"""
+        previous = []
+        for square in KING_ATTACKS[strong_king]:
+            if square != weak_king and square != piece and not _adjacent(square, weak_king):
+                previous.append(index(STRONG, square, weak_king, piece))
+
+        if self.piece == 'p':
+            # pawns only move forward, so they came from behind, and never from the back rank
+            if piece + 8 < 56 and piece + 8 not in (strong_king, weak_king):
+                previous.append(index(STRONG, strong_king, weak_king, piece + 8))
+                if piece >> 3 == 4 and piece + 16 not in (strong_king, weak_king):
+                    previous.append(index(STRONG, strong_king, weak_king, piece + 16))
+            return previous
+
+        for direction in _DIRECTIONS[self.piece]:
+            for square in RAYS[direction][piece]:
+                if square == strong_king or square == weak_king:
+                    break
+                previous.append(index(STRONG, strong_king, weak_king, square))
+        return previous
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        generate(sys.argv[1])
+    else:
+        generate()
@@ -1,8 +1,25 @@
 import re
 
 from modules.pieces import Pawn, Knight, Bishop, Rook, Queen, King
+from modules.tables import (
+    PAWN_KEYS, KNIGHT_SQUARES, KING_SQUARES, PAWN_SQUARES, RAY_SQUARES, DIRECTION_BETWEEN, SQUARE_INDEX)
+
+# Packed positions are a byte per square in the order of Board.square_list holding
+# the index of the piece in PACKED_PIECES (0 for empty), then the side to move
+# (0 for white), the castling rights (1, 2, 4 and 8 for K, Q, k and q), the
+# en passant square's index plus one (or 0), a zero byte, and the half move
+# and full move counters as little-endian unsigned shorts
+PACKED_SIZE = 72
+PACKED_PIECES = ' PNBRQKpnbrqk'
+_CASTLING_BITS = (('K', 1), ('Q', 2), ('k', 4), ('q', 8))
 
 class Board:
+    """
+    A chess position. Methods which only read the position, such as legal_moves,
+    is_move_legal, move_notation, is_check and game_status, change neither the board
+    nor its pieces (which copies share), so a Board can be read from several threads
+    at once as long as no thread moves or loads a position on it meanwhile.
+    """
     current_player = 'white'
     ghost_pawn = None
     half_moves = 0
@@ -12,6 +29,10 @@ class Board:
     castling_wk = False
     castling_wq = False
     king_location = None
+    checkers = []
+    pawn_key = 0
+
+    opponents = {'white': 'black', 'black': 'white'}
 
     types = {
         Pawn: 'p', 
@@ -49,10 +70,8 @@ class Board:
         """
         self.squares = {}
         if fen is None:
-            self.fen = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
-        else:
-            self.fen = fen
-        self.load(self.fen)
+            fen = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+        self.load(fen)
 
     def __str__(self):
         """
@@ -87,15 +106,11 @@ class Board:
         if not self.is_fen_parseable(fen):
             return False
 
-        self.squares = {}
-        color = self.fen.split(' ')[1]
-        if color == 'w': 
-            self.current_player = 'white'
-        else: self.current_player = 'black'
-
+        fen_parts = fen.split(' ')
+        placements = []
         col = 97 # start at chr(col) = 'a'
         row = 8
-        pieces_string = self.fen.split(' ')[0]
+        pieces_string = fen_parts[0]
         for c in pieces_string:
             if c.isnumeric():
                 col += int(c)
@@ -105,28 +120,89 @@ class Board:
             else:
                 if c.isupper(): color = 'white'
                 else: color = 'black'
-                piece = self.types[c.lower()](color)
-                self.squares[chr(col) + str(row)] = piece                
-                if self.current_player == 'black' and c == 'k':
-                    self.king_location = chr(col) + str(row)
-                if self.current_player == 'white' and c == 'K':
-                    self.king_location = chr(col) + str(row)
+                placements.append((chr(col) + str(row), self.types[c.lower()](color)))
                 col += 1
 
-        castling_string = self.fen.split(' ')[2]
-        self.castling_bk = 'k' in castling_string
-        self.castling_bq = 'q' in castling_string
-        self.castling_wk = 'K' in castling_string
-        self.castling_wq = 'Q' in castling_string
-
-        if not self.fen.split(' ')[2] == '-': 
-            self.ghost_pawn = self.fen.split(' ')[3]
-        self.half_moves = int(self.fen.split(' ')[4])
-        self.turn = int(self.fen.split(' ')[5])
+        ghost_pawn = None
+        if not fen_parts[3] == '-': 
+            ghost_pawn = fen_parts[3]
+        self._setup(
+            placements, 'white' if fen_parts[1] == 'w' else 'black', fen_parts[2],
+            ghost_pawn, int(fen_parts[4]), int(fen_parts[5]))
 
         return True
 
 
+    def load_packed(self, buffer, offset=0):
+        """
+        Load a chess position packed by pack_into, without parsing a FEN.
+
+        Parameters:
+            buffer: Any bytes-like object, such as a memoryview of shared memory
+
+            offset(int): The position of the packed position in the buffer
+        """
+        placements = []
+        for i in range(64):
+            code = buffer[offset + i]
+            if code:
+                symbol = PACKED_PIECES[code]
+                color = 'white' if symbol.isupper() else 'black'
+                placements.append((self.square_list[i], self.types[symbol.lower()](color)))
+        castling = ''
+        for right, bit in _CASTLING_BITS:
+            if buffer[offset + 65] & bit:
+                castling += right
+        ghost_pawn = None
+        if buffer[offset + 66]:
+            ghost_pawn = self.square_list[buffer[offset + 66] - 1]
+        self._setup(
+            placements, 'black' if buffer[offset + 64] else 'white', castling, ghost_pawn,
+            buffer[offset + 68] | buffer[offset + 69] << 8,
+            buffer[offset + 70] | buffer[offset + 71] << 8)
+
+    @staticmethod
+    def from_packed(buffer, offset=0):
+        """
+        Returns a new Board with a position packed by pack_into.
+
+        Parameters:
+            buffer: Any bytes-like object, such as a memoryview of shared memory
+
+            offset(int): The position of the packed position in the buffer
+        """
+        board = Board.__new__(Board)
+        board.load_packed(buffer, offset)
+        return board
+
+    def pack_into(self, buffer, offset=0):
+        """
+        Write the position into PACKED_SIZE bytes of a writable buffer.
+
+        Parameters:
+            buffer: Any writable bytes-like object, such as a bytearray or a memoryview
+
+            offset(int): Where to write the packed position in the buffer
+        """
+        packed = bytearray(PACKED_SIZE)
+        for square, piece in self.squares.items():
+            symbol = piece.symbol.upper() if piece.color == 'white' else piece.symbol
+            packed[SQUARE_INDEX[square]] = PACKED_PIECES.index(symbol)
+        packed[64] = self.current_player == 'black'
+        packed[65] = (
+            self.castling_wk * 1 | self.castling_wq * 2 |
+            self.castling_bk * 4 | self.castling_bq * 8)
+        if self.ghost_pawn is not None:
+            packed[66] = SQUARE_INDEX[self.ghost_pawn] + 1
+        packed[68:70] = min(self.half_moves, 0xffff).to_bytes(2, 'little')
+        packed[70:72] = min(self.turn, 0xffff).to_bytes(2, 'little')
+        buffer[offset:offset + PACKED_SIZE] = packed
+
+    @property
+    def fen(self):
+        """The FEN string for the current position"""
+        return self.output_fen()
+
     def output_fen(self):
         """Returns the FEN string for the current position"""
         fen = []
@@ -176,59 +252,7 @@ class Board:
 
     def is_check(self):
         """Returns a bool indicating whether the current player is in check"""
-        check = False
-        # From the king's location, consider every legal move
-        # as if the king were each other type of piece.
-        # If you encounter that type of piece, it could capture the king.
-        knight_moves = (
-            Knight(self.current_player)
-            .get_moves(self.king_location, self, True)
-            )
-        bishop_moves = (
-            Bishop(self.current_player)
-            .get_moves(self.king_location, self, True)
-            )
-        rook_moves = (
-            Rook(self.current_player)
-            .get_moves(self.king_location, self, True)
-            )
-        pawn_moves = (
-            Pawn(self.current_player)
-            .get_moves(self.king_location, self, True)
-            )
-        king_moves = (
-            King(self.current_player)
-            .get_moves(self.king_location, self, True)
-            )
-        for move in knight_moves:
-            piece = self.squares.get(move[2:4])
-            if isinstance(piece, Knight):
-                check = True
-        for move in bishop_moves:
-            if check:
-                break
-            piece = self.squares.get(move[2:4])
-            if isinstance(piece, (Bishop, Queen)):
-                check = True
-        for move in rook_moves:
-            if check:
-                break
-            piece = self.squares.get(move[2:4])
-            if isinstance(piece, (Rook, Queen)):
-                check = True
-        for move in pawn_moves:
-            if check:
-                break
-            piece = self.squares.get(move[2:4])
-            if isinstance(piece, Pawn):
-                check = True
-        for move in king_moves:
-            if check:
-                break
-            piece = self.squares.get(move[2:4])
-            if isinstance(piece, King):
-                check = True
-        return check
+        return len(self.checkers) > 0
 
     def is_checkmate(self):
         """Returns a bool indicating whether the current player is in checkmate."""
@@ -246,40 +270,72 @@ class Board:
         Situations where checkmate is possible but highly unlikely,
         such as Kknn (king vs king and two knights), will return false.
         """
-        symbols = []
-        insufficient = False
-        light_bishop = False
-        dark_bishop = False
+        white = self.material['white']
+        black = self.material['black']
+        for symbol in 'prq':
+            if white[symbol] > 0 or black[symbol] > 0:
+                return False
+
+        minor_pieces = white['n'] + white['b'] + black['n'] + black['b']
+        if minor_pieces <= 1:
+            return True
+        if minor_pieces > 2 or white['b'] != 1 or black['b'] != 1:
+            return False
 
-        for square, piece in self.squares.items():
-            symbol = piece.symbol
-            x = ord(square[0])
-            y = int(square[1])
-            dark_square = x-y % 2 == 0
-            if piece.color == 'white':
-                symbol = symbol.upper()
-            symbols.append(symbol)
-            if isinstance(piece, Bishop) and dark_square:
-                dark_bishop = True
-            elif isinstance(piece, Bishop) and not dark_square:
-                light_bishop = True
-
-        symbols.sort()        
-        if symbols == ['K', 'k']:
-            insufficient = True
-        elif symbols == ['B', 'K', 'k']:
-            insufficient = True
-        elif symbols == ['K', 'b', 'k']:
-            insufficient = True
-        elif symbols == ['K', 'N', 'k']:
-            insufficient = True
-        elif symbols == ['K', 'k', 'n']:
-            insufficient = True
-        elif symbols == ['B', 'K', 'b', 'k'] and not light_bishop:
-            insufficient = True
-        elif symbols == ['B', 'K', 'b', 'k'] and not dark_bishop:
-            insufficient = True
-        return insufficient
+        # one bishop each, which is a draw when both are on the same color
+        dark_squares = []
+        for color in ('white', 'black'):
+            for square, piece in self.pieces[color].items():
+                if isinstance(piece, Bishop):
+                    x = ord(square[0])
+                    y = int(square[1])
+                    dark_squares.append((x - y) % 2 == 0)
+        return dark_squares[0] == dark_squares[1]
+
+    def game_status(self):
+        """
+        Returns the state of the game for the current player: 'checkmate', 'stalemate',
+        'insufficient_material', 'check' or 'ongoing'. The move counters are not considered
+        """
+        if not self.can_move():
+            if self.is_check():
+                return 'checkmate'
+            return 'stalemate'
+        if self.insufficient_material():
+            return 'insufficient_material'
+        if self.is_check():
+            return 'check'
+        return 'ongoing'
+
+    def bitbase_result(self, bitbases=None):
+        """
+        Look up the result of a KQK, KRK or KPK ending with perfect play.
+        This is a constant time lookup in the endgame bitbases.
+
+        Parameters:
+            bitbases(Bitbases): The bitbases to probe
+                (optional, defaults to those generated in modules/bitbases)
+
+        Returns:
+            (str): 'win', 'draw' or 'loss' for the current player,
+                or None if the position is not covered by the bitbases
+        """
+        if bitbases is None:
+            # imported here so that importing Board does not load the bitbase reader
+            from modules.bitbases import DEFAULT_BITBASES
+            bitbases = DEFAULT_BITBASES
+        return bitbases.probe(self)
+
+    def material_signature(self):
+        """
+        Returns a string describing the material on the board,
+        white's pieces then black's e.g. KRPvKR
+        """
+        sides = []
+        for color in ('white', 'black'):
+            counts = self.material[color]
+            sides.append(''.join(symbol.upper() * counts[symbol] for symbol in 'kqrbnp'))
+        return 'v'.join(sides)
 
     def make_move(self, uci_move):
         """
@@ -297,19 +353,28 @@ class Board:
 
         origin = uci_move[0:2]
         destination = uci_move[2:4]
-        king_move = self.king_location == origin
-        rook_move = isinstance(self.squares[origin], Rook)
+        piece = self.squares[origin]
+        king_move = isinstance(piece, King)
         castle_long = king_move and ord(destination[0]) - ord(origin[0]) == -2
         castle_short = king_move and ord(destination[0]) - ord(origin[0]) == 2
-        pawn_move = isinstance(self.squares[origin], Pawn)
+        pawn_move = isinstance(piece, Pawn)
         final_rank = destination[1] == '1' or destination[1] == '8'
         double_move = abs(int(origin[1]) - int(destination[1])) == 2
         promotion = pawn_move and final_rank        
-        capture = self.squares.get(destination) is not None        
+        en_passant = pawn_move and destination == self.ghost_pawn
+
+        # an en passant capture takes the pawn beside the origin, not on the destination
+        captured_square = destination
+        if en_passant:
+            captured_square = destination[0] + origin[1]
+        capture = self.squares.get(captured_square) is not None
+        if capture:
+            self._remove_piece(captured_square)
 
         if promotion:
             new_piece = self.types[uci_move[4]]
-            self.squares[origin] = new_piece(self.current_player)
+            self._remove_piece(origin)
+            self._add_piece(origin, new_piece(self.current_player))
 
         self.ghost_pawn = None
         if pawn_move and double_move:
@@ -323,27 +388,16 @@ class Board:
             self.castling_bk = False
             self.castling_bq = False
 
-        if rook_move and origin == 'a1':
+        # a rook leaving or being captured on its starting square loses its castling right
+        if 'a1' in (origin, destination):
             self.castling_wq = False
-        if rook_move and origin == 'h1':
+        if 'h1' in (origin, destination):
             self.castling_wk = False
-        if rook_move and origin == 'a8':
+        if 'a8' in (origin, destination):
             self.castling_bq = False
-        if rook_move and origin == 'h8':
+        if 'h8' in (origin, destination):
             self.castling_bk = False
 
-        if self.current_player == 'white':
-            self.current_player = 'black'
-        elif  self.current_player == 'black':
-            self.current_player = 'white'
-            self.turn += 1
-
-        for square, sq_piece in self.squares.items():
-            if (isinstance(sq_piece, King) and 
-                sq_piece.color == self.current_player):
-                self.king_location = square
-                break
-
         if pawn_move or capture:
             self.half_moves = 0
         else:
@@ -355,13 +409,21 @@ class Board:
         if castle_short:
             rook_dest = chr(ord(destination[0]) - 1) + destination[1]
             rook_origin = 'h' + destination[1]
+        vacated = [origin, captured_square]
+        arrived = [destination]
         if castle_long or castle_short:
-            self.squares[rook_dest] = self.squares[rook_origin]
-            del self.squares[rook_origin]
+            self._move_piece(rook_origin, rook_dest)
+            arrived.append(rook_dest)
+
+        self._move_piece(origin, destination)
 
-        self.squares[destination] = self.squares[origin]
-        del self.squares[origin]
-        self.fen = self.output_fen()
+        if self.current_player == 'white':
+            self.current_player = 'black'
+        elif  self.current_player == 'black':
+            self.current_player = 'white'
+            self.turn += 1
+        self.king_location = self.kings.get(self.current_player)
+        self.checkers = self._checkers_after_move(vacated, arrived)
 
         return True
 
@@ -374,45 +436,27 @@ class Board:
             uci_move(str): The move in uci format 
                 e.g. e2e4 not e4, b2c3 not Nxc3, d7d8q not d8=Q
         """
-        piece = self.squares.get(uci_move[0:2])
-        if piece is None:
+        # check validity of string
+        if re.fullmatch("[a-h]{1}[1-8]{1}[a-h]{1}[1-8]{1}[bnrq]?", uci_move) is None:
             return False
-
-        legal = True
         origin = uci_move[0:2]
-        destination = uci_move[2:4]        
+        destination = uci_move[2:4]
+        piece = self.squares.get(origin)
+        if piece is None or piece.color != self.current_player:
+            return False
+
         pawn_move = isinstance(piece, Pawn)
         final_rank = destination[1] == '1' or destination[1] == '8'
         promotion = final_rank and pawn_move
-        plausible_moves = piece.get_moves(origin, self)
-
-        # check validity of string
-        if re.fullmatch("[a-h]{1}[1-8]{1}[a-h]{1}[1-8]{1}[bnrq]?", uci_move) is None:
-            legal = False
-        if self.squares.get(origin) is None:
-            legal = False
         if promotion and len(uci_move) != 5:
-            legal = False
+            return False
         if not promotion and len(uci_move) != 4:
-            legal = False
-
-        if self.squares[origin].color != self.current_player:
-            legal = False
-        if not uci_move[0:4] in plausible_moves:
-            legal = False
-
-        ## try making the move and see if you are left in check
-        #board_clone = Board(self.fen)
-        #board_clone.squares[destination] = board_clone.squares[origin]
-        #del board_clone.squares[origin]
-        #if origin == board_clone.king_location:
-        #    board_clone.king_location = destination
-        #if board_clone.is_check():
-        #    legal = False
-        if self._move_puts_self_in_check(uci_move):
-            legal = False
+            return False
+        if not uci_move[0:4] in piece.get_moves(origin, self):
+            return False
 
-        return legal
+        # try making the move and see if you are left in check
+        return not self._move_puts_self_in_check(uci_move)
 
 
     def move_notation(self, uci_move):
@@ -431,6 +475,244 @@ class Board:
         if not self.is_move_legal(uci_move):
             return None
 
+        notation = self._notation(uci_move)
+
+        board_clone = self.copy()
+        board_clone.make_move(uci_move)
+
+        if board_clone.is_checkmate():
+            notation += '#'
+        elif board_clone.is_check():
+            notation += '+'
+
+        return notation
+
+    def parse_notation(self, notation):
+        """
+        Get the uci format of a move provided in algebraic notation.
+        Check and annotation symbols (+, #, !, ?) are ignored.
+
+        Parameters:
+            notation(str): The move in algebraic notation e.g. Nxc3, O-O, d8=Q
+
+        Returns:
+            (str) The move in uci format, or None if no legal move matches the notation.
+        """
+        notation = notation.strip().rstrip('+#!?').replace('0', 'O')
+        for move in self.legal_moves():
+            # the destination is in the notation of every move except castling
+            if move[2:4] in notation or notation.startswith('O-O'):
+                if self._notation(move) == notation:
+                    return move
+        return None
+
+    @staticmethod
+    def is_fen_parseable(fen):
+        """
+        Returns a bool indicating whether the fen can safely be parsed.
+        Does not check whether the position is actually legal.
+
+        Parameters:
+            fen(str): The FEN to be tested
+        """
+        parseable = True
+        if fen is None or  len(fen.split(" ")) != 6:
+            return False
+
+        fen_parts = fen.split(" ")
+        if re.fullmatch("(?i)[\/pbnrkq1-8]{17,71}", fen_parts[0]) is None:
+            parseable = False
+        if re.fullmatch("[wb]{1}", fen_parts[1]) is None:
+            parseable = False
+        if re.fullmatch("-{1}|K?Q?k?q?", fen_parts[2]) is None:
+            parseable = False
+        if re.fullmatch("-{1}|[a-h]{1}[1-8]{1}", fen_parts[3]) is None:
+            parseable = False
+        if not fen_parts[4].isnumeric():
+            parseable = False
+        if not fen_parts[5].isnumeric():
+            parseable = False
+
+        rows = fen_parts[0].split("/")
+        if len(rows) != 8:
+            parseable = False
+        for row in rows:
+            squares_in_row = 0
+            for char in row:
+                if char.isnumeric():
+                    squares_in_row += int(char)
+                else:
+                    squares_in_row += 1
+            if squares_in_row != 8:
+                parseable = False
+
+        return parseable
+
+    def can_move(self):
+        """Returns a bool indicating whether the current player has any legal moves"""
+        can_move = False
+        for square, piece in list(self.pieces[self.current_player].items()):
+            for move in piece.get_moves(square, self):
+                if self.is_move_legal(move):
+                    can_move = True
+                    break
+        return can_move
+
+    def legal_moves(self, captures_only=False):
+        """
+        Get every legal move for the current player.
+
+        Parameters:
+            captures_only(bool): Whether to only include captures and promotions
+
+        Returns:
+            (list): A list of moves in uci format, with promotions given for every piece type
+        """
+        moves = []
+        for square, piece in list(self.pieces[self.current_player].items()):
+            for move in piece.get_moves(square, self, captures_only):
+                if isinstance(piece, Pawn) and move[3] in '18':
+                    candidates = [move + symbol for symbol in 'qrbn']
+                else:
+                    candidates = [move]
+                # the generated moves are already valid for the piece,
+                # so only the check test of is_move_legal is needed
+                for candidate in candidates:
+                    if not self._move_puts_self_in_check(candidate):
+                        moves.append(candidate)
+        return moves
+
+    def perft(self, depth):
+        """
+        Count the move sequences of a given length from this position,
+        which is the standard way to verify move generation against known totals.
+
+        Parameters:
+            depth(int): The number of plies to play
+
+        Returns:
+            (int): The number of positions reached at that depth
+        """
+        if depth == 0:
+            return 1
+        moves = self.legal_moves()
+        if depth == 1:
+            return len(moves)
+        nodes = 0
+        for move in moves:
+            child = self.copy()
+            child.make_move(move)
+            nodes += child.perft(depth - 1)
+        return nodes
+
+    def copy(self):
+        """Returns a new Board with the same position, which can be changed independently"""
+        board = Board.__new__(Board)
+        board.__dict__.update(self.__dict__)
+        board.squares = dict(self.squares)
+        board.pieces = {color: dict(pieces) for color, pieces in self.pieces.items()}
+        board.material = {color: dict(counts) for color, counts in self.material.items()}
+        board.kings = dict(self.kings)
+        board.checkers = list(self.checkers)
+        return board
+
+    def see(self, uci_move):
+        """
+        Static exchange evaluation: the material the current player can expect to win
+        by making a move, assuming both sides keep recapturing on the destination square
+        with their least valuable piece for as long as it pays to do so.
+
+        Parameters:
+            uci_move(str): The move in uci format 
+                e.g. e2e4 not e4, b2c3 not Nxc3, d7d8q not d8=Q
+
+        Returns:
+            (int): The expected material gain in centipawns, which is negative for a losing move
+        """
+        origin = uci_move[0:2]
+        destination = uci_move[2:4]
+        squares = dict(self.squares)
+        piece = squares.pop(origin)
+        captured = squares.get(destination)
+        gain = [0]
+        if captured is not None:
+            gain[0] = captured.value
+        if isinstance(piece, Pawn) and destination == self.ghost_pawn:
+            gain[0] = squares.pop(destination[0] + origin[1]).value
+        if len(uci_move) == 5:
+            piece = self.types[uci_move[4]](piece.color)
+            gain[0] += piece.value - Pawn.value
+        squares[destination] = piece
+
+        # play out the recaptures, then let each side stop capturing when it is better off
+        color = self.opponents[piece.color]
+        while True:
+            attackers = self._attackers(squares, destination, color)
+            if len(attackers) == 0:
+                break
+            attackers.sort(key=lambda square: self._exchange_value(squares[square]))
+            attacker = squares[attackers[0]]
+            if isinstance(attacker, King):
+                del squares[attackers[0]]
+                if self._attackers(squares, destination, self.opponents[color]):
+                    break
+            gain.append(self._exchange_value(piece) - gain[-1])
+            squares.pop(attackers[0], None)
+            squares[destination] = attacker
+            piece = attacker
+            color = self.opponents[color]
+
+        for depth in range(len(gain) - 1, 0, -1):
+            gain[depth - 1] = -max(-gain[depth - 1], gain[depth])
+        return gain[0]
+
+    def attackers(self, square, color):
+        """
+        Finds the pieces of one color which attack a square.
+        A piece defending one of its own side's pieces counts as attacking its square.
+
+        Parameters:
+            square(str): The square being attacked e.g. e4
+
+            color(str): The color of the attacking pieces ("black" or "white")
+
+        Returns:
+            (list): The squares of the attacking pieces
+        """
+        return self._attackers(self.squares, square, color)
+
+    def attack_map(self):
+        """
+        Finds the attackers of every square for both sides in one sweep over the pieces.
+
+        Returns:
+            (dict): For each color, a dict from every square name to
+                a list of the squares of that color's pieces attacking it
+        """
+        attack_map = {}
+        for color in ('white', 'black'):
+            attacked = {square: [] for square in self.square_list}
+            for origin, piece in self.pieces[color].items():
+                if isinstance(piece, Knight):
+                    targets = KNIGHT_SQUARES[origin]
+                elif isinstance(piece, King):
+                    targets = KING_SQUARES[origin]
+                elif isinstance(piece, Pawn):
+                    targets = PAWN_SQUARES[color][origin]
+                else:
+                    targets = []
+                    for direction in piece.directions:
+                        for target in RAY_SQUARES[direction][origin]:
+                            targets.append(target)
+                            if target in self.squares:
+                                break
+                for target in targets:
+                    attacked[target].append(origin)
+            attack_map[color] = attacked
+        return attack_map
+
+    def _notation(self, uci_move):
+        """Returns the algebraic notation for a legal move, without any check symbol"""
         notation = ''
         row = uci_move[0:1]
         col = uci_move[1:2]
@@ -451,12 +733,10 @@ class Board:
                 raise ValueError
             promote_to = uci_move[4].upper()
 
-        # check if other pieces of same type and color can reach destination square
-        next_player = 'white'
-        if self.current_player == 'white':
-            next_player = 'black'
-        piece.color = next_player
-        moves = piece.get_moves(destination, self)
+        # check if other pieces of same type and color can reach destination square,
+        # using a new piece of the other color so that the board's pieces are not changed
+        probe = type(piece)(self.opponents[self.current_player])
+        moves = probe.get_moves(destination, self)
         for move in moves:
             move_origin = move[0:2]
             move_destination = move[2:4]
@@ -469,7 +749,6 @@ class Board:
                 specify_row = True
             if same_type and same_col:
                 specify_col = True
-        piece.color = self.current_player
 
         if origin == self.king_location and ord(destination[0]) - ord(row) == 2:
             castle_short = True
@@ -503,76 +782,220 @@ class Board:
         if not promote_to is None:
             notation += '=' + promote_to
 
-        board_clone = Board(self.fen)
-        board_clone.make_move(uci_move)
-
-        if board_clone.is_checkmate():
-            notation += '#'
-        elif board_clone.is_check():
-            notation += '+'
-
         return notation
 
-    def is_fen_parseable(self, fen):
+    def _move_puts_self_in_check(self, move):
+        """Returns a bool indicating whether a move would put the current_player into check"""
+        origin = move[0:2]
+        destination = move[2:4]
+        piece = self.squares[origin]
+        king_location = self.king_location
+        en_passant = isinstance(piece, Pawn) and destination == self.ghost_pawn
+        if origin != king_location and len(self.checkers) == 0 and not en_passant:
+            # when not in check, only moving a pinned piece off its line can expose the king
+            return self._breaks_pin(origin, destination)
+
+        squares = dict(self.squares)
+        del squares[origin]
+        squares[destination] = piece
+        if en_passant:
+            squares.pop(destination[0] + origin[1], None)
+        if origin == king_location:
+            king_location = destination
+        attackers = self._attackers(
+            squares, king_location, self.opponents[self.current_player])
+        return len(attackers) > 0
+
+    def _breaks_pin(self, origin, destination):
         """
-        Returns a bool indicating whether the fen can safely be parsed.
-        Does not check whether the position is actually legal.
+        Returns a bool indicating whether moving a piece other than the king
+        leaves the current player's king open to a bishop, rook or queen
+        """
+        king_location = self.king_location
+        direction = DIRECTION_BETWEEN.get((king_location, origin))
+        if direction is None or DIRECTION_BETWEEN.get((king_location, destination)) == direction:
+            return False
+        if self._first_piece(king_location, direction) != origin:
+            return False
+        pinner = self.squares.get(self._first_piece(origin, direction))
+        return (pinner is not None and
+                pinner.color != self.current_player and
+                isinstance(pinner, (Bishop, Rook, Queen)) and
+                direction in pinner.directions)
+
+    @staticmethod
+    def _attackers(squares, square, color):
+        """
+        Finds the pieces of one color which attack a square.
 
         Parameters:
-            fen(str): The FEN to be tested
+            squares(dict): A dictionary of squares containing pieces, as in Board.squares
+
+            square(str): The square being attacked e.g. e4
+
+            color(str): The color of the attacking pieces ("black" or "white")
+
+        Returns:
+            (list): The squares of the attacking pieces
         """
-        parseable = True
-        if fen is None or  len(fen.split(" ")) != 6:
-            return False
+        attackers = []
+        for origin in KNIGHT_SQUARES[square]:
+            piece = squares.get(origin)
+            if isinstance(piece, Knight) and piece.color == color:
+                attackers.append(origin)
+        for origin in KING_SQUARES[square]:
+            piece = squares.get(origin)
+            if isinstance(piece, King) and piece.color == color:
+                attackers.append(origin)
+        # a pawn attacks this square from where an opposing pawn here would capture
+        for origin in PAWN_SQUARES[Board.opponents[color]][square]:
+            piece = squares.get(origin)
+            if isinstance(piece, Pawn) and piece.color == color:
+                attackers.append(origin)
+        for direction, ray in RAY_SQUARES.items():
+            for origin in ray[square]:
+                piece = squares.get(origin)
+                if piece is None:
+                    continue
+                if (piece.color == color and
+                        isinstance(piece, (Bishop, Rook, Queen)) and
+                        direction in piece.directions):
+                    attackers.append(origin)
+                break
+        return attackers
 
-        fen_parts = fen.split(" ")
-        if re.fullmatch("(?i)[\/pbnrkq1-8]{17,71}", fen_parts[0]) is None:
-            parseable = False
-        if re.fullmatch("[wb]{1}", fen_parts[1]) is None:
-            parseable = False
-        if re.fullmatch("-{1}|K?Q?k?q?", fen_parts[2]) is None:
-            parseable = False
-        if re.fullmatch("-{1}|[a-h]{1}[1-8]{1}", fen_parts[3]) is None:
-            parseable = False
-        if not fen_parts[4].isnumeric():
-            parseable = False
-        if not fen_parts[5].isnumeric():
-            parseable = False
+    def _checkers_after_move(self, vacated, arrived):
+        """
+        Finds the pieces giving check to the current player after a move.
+        Only the pieces that moved can give a direct check, and only a line through
+        a vacated square can have opened a discovered check.
 
-        rows = fen_parts[0].split("/")
-        if len(rows) != 8:
-            parseable = False
-        for row in rows:
-            squares_in_row = 0
-            for char in row:
-                if char.isnumeric():
-                    squares_in_row += int(char)
-                else:
-                    squares_in_row += 1
-            if squares_in_row != 8:
-                parseable = False
+        Parameters:
+            vacated(list): The squares emptied by the move
 
-        return parseable
+            arrived(list): The squares the moving pieces arrived on
 
-    def can_move(self):
-        """Returns a bool indicating whether the current player has any legal moves"""
-        can_move = False
-        for square, piece in self.squares.items():
-            if piece.color != self.current_player:
+        Returns:
+            (list): The squares of the checking pieces
+        """
+        king_location = self.king_location
+        if king_location is None:
+            return []
+        checkers = []
+        for square in arrived:
+            piece = self.squares[square]
+            if isinstance(piece, Knight):
+                attacks = king_location in KNIGHT_SQUARES[square]
+            elif isinstance(piece, Pawn):
+                attacks = king_location in PAWN_SQUARES[piece.color][square]
+            elif isinstance(piece, King):
+                attacks = king_location in KING_SQUARES[square]
+            else:
+                direction = DIRECTION_BETWEEN.get((square, king_location))
+                attacks = (direction in piece.directions and
+                           self._first_piece(square, direction) == king_location)
+            if attacks:
+                checkers.append(square)
+
+        color = self.opponents[self.current_player]
+        for square in vacated:
+            direction = DIRECTION_BETWEEN.get((king_location, square))
+            if direction is None:
                 continue
-            for move in piece.get_moves(square, self):
-                if self.is_move_legal(move):
-                    can_move = True
-                    break
-        return can_move
+            origin = self._first_piece(king_location, direction)
+            piece = self.squares.get(origin)
+            if (piece is not None and
+                    piece.color == color and
+                    isinstance(piece, (Bishop, Rook, Queen)) and
+                    direction in piece.directions and
+                    origin not in checkers):
+                checkers.append(origin)
+        return checkers
+
+    @staticmethod
+    def _exchange_value(piece):
+        """Returns the value of a piece in an exchange, where the king is worth the most"""
+        if isinstance(piece, King):
+            return Queen.value * 10
+        return piece.value
+
+    def _first_piece(self, square, direction):
+        """Returns the square of the first piece in a direction from a square, or None"""
+        for target in RAY_SQUARES[direction][square]:
+            if target in self.squares:
+                return target
+        return None
+
+    def _setup(self, placements, current_player, castling, ghost_pawn, half_moves, turn):
+        """
+        Sets up a position from its parts, as given by the fields of a FEN.
 
-    def _move_puts_self_in_check(self, move):
-        """Returns a bool indicating whether a move would put the current_player into check"""
-        origin = move[0:2]
-        destination = move[2:4]
-        board_clone = Board(self.fen)
-        board_clone.squares[destination] = board_clone.squares[origin]
-        del board_clone.squares[origin]
-        if origin == board_clone.king_location:
-            board_clone.king_location = destination
-        return board_clone.is_check()
\ No newline at end of file
+        Parameters:
+            placements(list): (square, piece) pairs for every piece
+
+            current_player(str): Either "black" or "white"
+
+            castling(str): The castling rights as in a FEN e.g. KQk or -
+
+            ghost_pawn(str): The en passant square, or None
+
+            half_moves(int): The number of half moves since a capture or pawn move
+
+            turn(int): The full move number
+        """
+        self.squares = {}
+        self.pieces = {'white': {}, 'black': {}}
+        self.material = {
+            'white': dict.fromkeys('pnbrqk', 0),
+            'black': dict.fromkeys('pnbrqk', 0)
+            }
+        self.kings = {}
+        self.pawn_key = 0
+        for square, piece in placements:
+            self._add_piece(square, piece)
+        self.current_player = current_player
+        self.king_location = self.kings.get(self.current_player)
+        self.checkers = []
+        if self.king_location is not None:
+            self.checkers = self._attackers(
+                self.squares, self.king_location, self.opponents[self.current_player])
+
+        self.castling_bk = 'k' in castling
+        self.castling_bq = 'q' in castling
+        self.castling_wk = 'K' in castling
+        self.castling_wq = 'Q' in castling
+        self.ghost_pawn = ghost_pawn
+        self.half_moves = half_moves
+        self.turn = turn
+
+    def _add_piece(self, square, piece):
+        """Places a piece on an empty square, updating the piece lists and material"""
+        self.squares[square] = piece
+        self.pieces[piece.color][square] = piece
+        self.material[piece.color][piece.symbol] += 1
+        if isinstance(piece, King):
+            self.kings[piece.color] = square
+        elif isinstance(piece, Pawn):
+            self.pawn_key ^= PAWN_KEYS[(piece.color, square)]
+
+    def _remove_piece(self, square):
+        """Removes the piece on a square, updating the piece lists and material"""
+        piece = self.squares.pop(square)
+        del self.pieces[piece.color][square]
+        self.material[piece.color][piece.symbol] -= 1
+        if self.kings.get(piece.color) == square:
+            del self.kings[piece.color]
+        elif isinstance(piece, Pawn):
+            self.pawn_key ^= PAWN_KEYS[(piece.color, square)]
+        return piece
+
+    def _move_piece(self, origin, destination):
+        """Moves a piece to an empty square, updating the piece lists"""
+        piece = self.squares.pop(origin)
+        self.squares[destination] = piece
+        del self.pieces[piece.color][origin]
+        self.pieces[piece.color][destination] = piece
+        if isinstance(piece, King):
+            self.kings[piece.color] = destination
+        elif isinstance(piece, Pawn):
+            self.pawn_key ^= PAWN_KEYS[(piece.color, origin)] ^ PAWN_KEYS[(piece.color, destination)]
@@ -0,0 +1,138 @@
+import threading
+from collections import OrderedDict
+
+from modules.polyglot import zobrist_key
+
+DEFAULT_SIZE = 4096
+
+
+class PositionCache:
+    """
+    A bounded cache of the legal moves, move notation and game status of positions,
+    keyed by their Polyglot hash. The least recently used positions are evicted first.
+    Entries are filled in lazily, so notation is only worked out for moves asked about.
+    """
+
+    def __init__(self, size=DEFAULT_SIZE):
+        """
+        Initializes an empty cache.
+
+        Parameters:
+            size(int): The maximum number of positions to hold
+        """
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def legal_moves(self, board):
+        """
+        Get every legal move for the current player.
+
+        Parameters:
+            board(Board): The position
+
+        Returns:
+            (frozenset): The moves in uci format
+        """
+        return self._legal_moves(self._entry(board), board)
+
+    def move_notation(self, board, uci_move):
+        """
+        Get the algebraic notation for a move, as Board.move_notation does.
+
+        Parameters:
+            board(Board): The position
+
+            uci_move(str): The move in uci format
+
+        Returns:
+            (str): The algebraic notation, or None if the move is not legal
+        """
+        entry = self._entry(board)
+        notation = entry['notation']
+        if uci_move not in notation:
+            if uci_move in self._legal_moves(entry, board):
+                notation[uci_move] = board.move_notation(uci_move)
+            else:
+                notation[uci_move] = None
+        return notation[uci_move]
+
+    def game_status(self, board):
+        """
+        Get the status of the game, as Board.game_status does.
+
+        Parameters:
+            board(Board): The position
+
+        Returns:
+            (str): The status
+        """
+        entry = self._entry(board)
+        if entry['status'] is None:
+            entry['status'] = board.game_status()
+        return entry['status']
+
+    def resize(self, size):
+        """
+        Change the maximum number of positions held, evicting any over the new size.
+
+        Parameters:
+            size(int): The new maximum
+        """
+        with self._lock:
+            self.size = size
+            self._evict()
+
+    def clear(self):
+        """Removes every position and resets the statistics"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        Returns a dict of the keys size, entries, hits, misses and hit_rate
+        (the fraction of lookups which found their position, or None before any lookup)
+        """
+        lookups = self.hits + self.misses
+        return {
+            'size': self.size,
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else None
+            }
+
+    def _entry(self, board):
+        """Returns the entry for a position, creating it and evicting the oldest if needed"""
+        key = zobrist_key(board)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry
+            self.misses += 1
+            entry = {'legal_moves': None, 'notation': {}, 'status': None}
+            self._entries[key] = entry
+            self._evict()
+            return entry
+
+    @staticmethod
+    def _legal_moves(entry, board):
+        """Returns the legal moves of an entry, generating them the first time"""
+        if entry['legal_moves'] is None:
+            entry['legal_moves'] = frozenset(board.legal_moves())
+        return entry['legal_moves']
+
+    def _evict(self):
+        """Removes the least recently used positions until the cache is within its size"""
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+
+# The cache shared by every Board in the process
+POSITION_CACHE = PositionCache()
@@ -0,0 +1,267 @@
+import argparse
+import heapq
+import json
+import os
+import struct
+import sys
+import tempfile
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from modules.boards import Board, PACKED_SIZE
+from modules.polyglot import zobrist_key
+
+DEFAULT_CHUNK_SIZE = 100000
+DEFAULT_FAN_IN = 64
+
+# Sorted runs hold one record per distinct position: its Polyglot key, the position
+# packed as Board.pack_into and the number of times it was seen, all big-endian so that
+# comparing records as bytes orders them by key. Positions which share a key are still
+# told apart by their packed bytes.
+_RECORD = struct.Struct('>Q' + str(PACKED_SIZE) + 'sI')
+_KEY_SIZE = _RECORD.size - 4
+_READ_RECORDS = 4096
+
+
+def normalise(fen, ignore_clocks=False):
+    """
+    Get the key by which a position is deduplicated.
+
+    Parameters:
+        fen(str): A FEN string
+
+        ignore_clocks(bool): Whether positions differing only in their
+            half move clock and move number count as the same
+
+    Returns:
+        (bytes): The sort key of the position, or None if the FEN is invalid
+    """
+    board = Board()
+    if not board.load(fen.strip()):
+        return None
+    if ignore_clocks:
+        board.half_moves = 0
+        board.turn = 1
+    # an en passant square only makes a position different when it can be captured on
+    if board.ghost_pawn is not None and not _can_capture_en_passant(board):
+        board.ghost_pawn = None
+    key = bytearray(_KEY_SIZE)
+    struct.pack_into('>Q', key, 0, zobrist_key(board))
+    board.pack_into(key, 8)
+    return bytes(key)
+
+
+def position_fen(key):
+    """Returns the FEN string of a position from its key, as given by normalise"""
+    return Board.from_packed(key, 8).output_fen()
+
+
+def sort_chunk(lines, directory, ignore_clocks=False):
+    """
+    Count the positions in a chunk of FEN strings and write them to a sorted run file.
+
+    Parameters:
+        lines(list): The FEN strings. Blank lines are skipped
+
+        directory(str): The directory to create the run file in
+
+        ignore_clocks(bool): Whether to ignore the move clocks, as in normalise
+
+    Returns:
+        (tuple): The path of the run file, the number of valid positions
+            and the number of invalid FEN strings
+    """
+    counts = Counter()
+    invalid = 0
+    for line in lines:
+        if line.strip() == '':
+            continue
+        key = normalise(line, ignore_clocks)
+        if key is None:
+            invalid += 1
+        else:
+            counts[key] += 1
+    descriptor, path = tempfile.mkstemp(suffix='.run', dir=directory)
+    with os.fdopen(descriptor, 'wb') as file:
+        for key in sorted(counts):
+            file.write(key + counts[key].to_bytes(4, 'big'))
+    return path, sum(counts.values()), invalid
+
+
+def merge_runs(paths):
+    """
+    Merge sorted run files, adding up the counts of positions found in more than one.
+    Only a block of records from each file is held in memory at a time.
+
+    Parameters:
+        paths(list): The paths of the run files
+
+    Returns:
+        (generator): The key and count of each distinct position, in key order
+    """
+    current = None
+    total = 0
+    for key, count in heapq.merge(*[_read_run(path) for path in paths]):
+        if key != current:
+            if current is not None:
+                yield current, total
+            current = key
+            total = 0
+        total += count
+    if current is not None:
+        yield current, total
+
+
+def deduplicate(lines, output, ignore_clocks=False, chunk_size=DEFAULT_CHUNK_SIZE,
+                workers=None, directory=None, fan_in=DEFAULT_FAN_IN):
+    """
+    Write each distinct position in a stream of FEN strings with the number of times it
+    appears, using an external merge sort so that memory use depends on the chunk size
+    rather than the number of positions. Chunks are sorted in parallel across a pool of
+    processes, with at most two chunks per worker waiting at a time.
+
+    Parameters:
+        lines(iterable): The FEN strings, one per item
+
+        output(file): A text file to write each distinct position to, as its count
+            and FEN string separated by a space
+
+        ignore_clocks(bool): Whether to ignore the move clocks, as in normalise.
+            The positions are then written with a half move clock of 0 and move number 1
+
+        chunk_size(int): The number of FEN strings sorted in memory at once
+
+        workers(int): The number of processes (optional, defaults to one per CPU).
+            With one worker the chunks are sorted in this process
+
+        directory(str): Where to put the temporary run files (optional)
+
+        fan_in(int): The most run files merged at once. More runs are merged in passes
+
+    Returns:
+        (dict): The keys positions, unique, invalid, runs and seconds
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    start = time.perf_counter()
+    summary = {'positions': 0, 'unique': 0, 'invalid': 0, 'runs': 0}
+    with tempfile.TemporaryDirectory(dir=directory) as temporary:
+        paths = []
+
+        def collect(result):
+            path, positions, invalid = result
+            paths.append(path)
+            summary['positions'] += positions
+            summary['invalid'] += invalid
+
+        if workers == 1:
+            for chunk in _chunks(lines, chunk_size):
+                collect(sort_chunk(chunk, temporary, ignore_clocks))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                pending = deque()
+                for chunk in _chunks(lines, chunk_size):
+                    pending.append(executor.submit(sort_chunk, chunk, temporary, ignore_clocks))
+                    if len(pending) >= 2 * workers:
+                        collect(pending.popleft().result())
+                while pending:
+                    collect(pending.popleft().result())
+        summary['runs'] = len(paths)
+
+        while len(paths) > fan_in:
+            merged = []
+            for i in range(0, len(paths), fan_in):
+                descriptor, path = tempfile.mkstemp(suffix='.run', dir=temporary)
+                with os.fdopen(descriptor, 'wb') as file:
+                    for key, count in merge_runs(paths[i:i + fan_in]):
+                        file.write(key + count.to_bytes(4, 'big'))
+                for old in paths[i:i + fan_in]:
+                    os.remove(old)
+                merged.append(path)
+            paths = merged
+
+        for key, count in merge_runs(paths):
+            output.write(str(count) + ' ' + position_fen(key) + '\n')
+            summary['unique'] += 1
+    summary['seconds'] = round(time.perf_counter() - start, 3)
+    return summary
+
+
+def _can_capture_en_passant(board):
+    """Returns a bool indicating whether a pawn of the side to move stands beside the en passant square"""
+    file = ord(board.ghost_pawn[0])
+    rank = '5' if board.current_player == 'white' else '4'
+    for adjacent in (chr(file - 1) + rank, chr(file + 1) + rank):
+        piece = board.squares.get(adjacent)
+        if piece is not None and piece.symbol == 'p' and piece.color == board.current_player:
+            return True
+    return False
+
+
+def _chunks(lines, chunk_size):
+    """Yields lists of up to chunk_size items from an iterable"""
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+
+def _read_run(path):
+    """Yields the key and count of each record in a run file, reading a block at a time"""
+    with open(path, 'rb') as file:
+        while True:
+            block = file.read(_RECORD.size * _READ_RECORDS)
+            if not block:
+                return
+            for offset in range(0, len(block), _RECORD.size):
+                record = block[offset:offset + _RECORD.size]
+                yield record[:_KEY_SIZE], int.from_bytes(record[_KEY_SIZE:], 'big')
+
+
+def _input_lines(paths):
+    """Yields the lines of each input file in turn, with - meaning standard input"""
+    for path in paths:
+        if path == '-':
+            yield from sys.stdin
+        else:
+            with open(path) as file:
+                yield from file
+
+
+def main(arguments=None):
+    """Deduplicate FEN files from the command line and print the JSON summary"""
+    parser = argparse.ArgumentParser(
+        prog='python -m modules.dedup',
+        description='Count the distinct positions in files of FEN strings, one per line')
+    parser.add_argument(
+        'inputs', nargs='*', default=['-'], help='FEN files (default: standard input)')
+    parser.add_argument('--output', help='file to write the positions to (default: standard output)')
+    parser.add_argument(
+        '--ignore-clocks', action='store_true',
+        help='treat positions differing only in their move clocks as the same')
+    parser.add_argument(
+        '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+        help='positions sorted in memory at once')
+    parser.add_argument(
+        '--workers', type=int, help='number of processes (default: one per CPU)')
+    parser.add_argument('--temp-dir', help='directory for the temporary sorted runs')
+    args = parser.parse_args(arguments)
+
+    lines = _input_lines(args.inputs)
+    if args.output is None:
+        summary = deduplicate(
+            lines, sys.stdout, args.ignore_clocks, args.chunk_size, args.workers, args.temp_dir)
+    else:
+        with open(args.output, 'w') as file:
+            summary = deduplicate(
+                lines, file, args.ignore_clocks, args.chunk_size, args.workers, args.temp_dir)
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,303 @@
+import argparse
+import functools
+import json
+import os
+import shlex
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from modules.boards import Board
+from modules.mate import MateSolver
+from modules.search import Search
+
+ANALYSES = ['perft', 'search', 'mate']
+DEFAULT_SEARCH_DEPTH = 3
+
+
+def parse_epd(line):
+    """
+    Parse one EPD record: the first four fields of a FEN followed by operations
+    separated by semicolons e.g. r1b1k2r/... w KQkq - bm Qd1+; id "WAC.001";
+    A full six field FEN, as used by perft suites, is also accepted.
+
+    Parameters:
+        line(str): The record
+
+    Returns:
+        (dict): The keys fen (a complete FEN, with the move counters taken from the
+            hmvc and fmvn operations when present) and operations (a dict from each
+            opcode to its list of operands), or None if the record is not valid
+    """
+    fields = line.strip().split(None, 4)
+    if len(fields) < 4:
+        return None
+    rest = ''
+    if len(fields) == 5:
+        rest = fields[4]
+
+    clocks = ['0', '1']
+    parts = rest.split(None, 2)
+    if len(parts) >= 2 and parts[0].isnumeric() and parts[1].isnumeric():
+        clocks = parts[0:2]
+        rest = ''
+        if len(parts) == 3:
+            rest = parts[2]
+
+    operations = {}
+    for operation in rest.split(';'):
+        try:
+            tokens = shlex.split(operation)
+        except ValueError:
+            return None
+        if len(tokens) > 0:
+            operations[tokens[0]] = tokens[1:]
+    for i, opcode in enumerate(('hmvc', 'fmvn')):
+        operands = operations.get(opcode)
+        if operands and operands[0].isnumeric():
+            clocks[i] = operands[0]
+
+    fen = ' '.join(fields[0:4] + clocks)
+    if not Board.is_fen_parseable(fen):
+        return None
+    return {'fen': fen, 'operations': operations}
+
+
+def read_epd(path):
+    """
+    Read every record of an EPD file. Blank lines and lines starting with # are skipped.
+
+    Parameters:
+        path(str): The location of the file
+
+    Returns:
+        (list): A dict per record as returned by parse_epd, with the extra keys
+            line (the line number) and id (the id operation, or the file name and line).
+            Invalid records are included with a fen of None so they are reported
+    """
+    records = []
+    name = os.path.basename(path)
+    with open(path) as file:
+        for number, line in enumerate(file, 1):
+            if line.strip() == '' or line.lstrip().startswith('#'):
+                continue
+            record = parse_epd(line)
+            if record is None:
+                record = {'fen': None, 'operations': {}}
+            record['line'] = number
+            record['id'] = ' '.join(
+                record['operations'].get('id', [name + ':' + str(number)]))
+            records.append(record)
+    return records
+
+
+def analyse(record, analysis, depth=None, time_limit=None):
+    """
+    Run one analysis on an EPD record and compare it with the record's operations.
+
+    perft counts the positions at a depth and compares them with the matching
+    D<depth> operation (by default the deepest one given).
+    search finds the best move to a depth and checks it against bm and am.
+    mate looks for a forced mate within depth moves (by default the dm operation)
+    and checks its length against dm and its first move against bm.
+
+    Parameters:
+        record(dict): A record as returned by read_epd
+
+        analysis(str): One of perft, search or mate
+
+        depth(int): The perft depth, search depth in plies or mate length in moves (optional)
+
+        time_limit(float): The maximum number of seconds for a mate search (optional)
+
+    Returns:
+        (dict): The result, with the keys id, fen, passed (None when the record has
+            nothing to compare the analysis with), time in seconds and nodes,
+            plus either the perft count, the move found or an error
+    """
+    result = {'id': record['id'], 'fen': record['fen'], 'passed': False, 'nodes': 0}
+    start = time.perf_counter()
+    if record['fen'] is None:
+        result['error'] = 'Invalid EPD record'
+    else:
+        board = Board(record['fen'])
+        operations = record['operations']
+        if analysis == 'perft':
+            _analyse_perft(board, operations, depth, result)
+        elif analysis == 'search':
+            _analyse_search(board, operations, depth, result)
+        else:
+            _analyse_mate(board, operations, depth, time_limit, result)
+    result['time'] = time.perf_counter() - start
+    return result
+
+
+def run_suite(records, analysis, depth=None, workers=None, time_limit=None):
+    """
+    Analyse every record, spread across a pool of processes.
+
+    Parameters:
+        records(list): Records as returned by read_epd
+
+        analysis(str): One of perft, search or mate
+
+        depth(int): Passed on to analyse (optional)
+
+        workers(int): The number of processes (optional, defaults to one per CPU).
+            With one worker the records are analysed in this process
+
+        time_limit(float): The maximum number of seconds per mate search (optional)
+
+    Returns:
+        (dict): The report, with the pass rate over the records that could be scored,
+            aggregate throughput and a result per record as returned by analyse
+    """
+    if analysis not in ANALYSES:
+        raise ValueError('Unknown analysis: ' + str(analysis))
+    if workers is None:
+        workers = os.cpu_count() or 1
+    task = functools.partial(analyse, analysis=analysis, depth=depth, time_limit=time_limit)
+
+    start = time.perf_counter()
+    if workers == 1:
+        results = [task(record) for record in records]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(task, records))
+    elapsed = time.perf_counter() - start
+
+    scored = [result for result in results if result['passed'] is not None]
+    passed = sum(1 for result in scored if result['passed'])
+    nodes = sum(result['nodes'] for result in results)
+    return {
+        'analysis': analysis,
+        'depth': depth,
+        'workers': workers,
+        'positions': len(results),
+        'scored': len(scored),
+        'passed': passed,
+        'pass_rate': passed / len(scored) if scored else None,
+        'time': elapsed,
+        'positions_per_second': len(results) / elapsed if elapsed else None,
+        'nodes': nodes,
+        'nodes_per_second': nodes / elapsed if elapsed else None,
+        'results': results
+        }
+
+
+def _moves_from_operands(board, operations, opcode):
+    """Returns the uci moves for the algebraic notation operands of an operation, or None"""
+    if opcode not in operations:
+        return None
+    return [board.parse_notation(notation) for notation in operations[opcode]]
+
+
+def _score_move(board, operations, move, result):
+    """Records the move found and whether it satisfies the bm and am operations"""
+    result['move'] = None
+    if move is not None:
+        result['move'] = board.move_notation(move)
+    best_moves = _moves_from_operands(board, operations, 'bm')
+    avoid_moves = _moves_from_operands(board, operations, 'am')
+    if best_moves is None and avoid_moves is None:
+        result['passed'] = None
+        return
+    result['passed'] = (
+        move is not None and
+        (best_moves is None or move in best_moves) and
+        (avoid_moves is None or move not in avoid_moves))
+
+
+def _analyse_perft(board, operations, depth, result):
+    """Counts the positions at a depth and compares them with the D<depth> operation"""
+    if depth is None:
+        depths = [int(opcode[1:]) for opcode in operations
+                  if opcode[0] == 'D' and opcode[1:].isnumeric()]
+        if len(depths) == 0:
+            result['error'] = 'No perft depth given'
+            return
+        depth = max(depths)
+    result['depth'] = depth
+    result['perft'] = board.perft(depth)
+    result['nodes'] = result['perft']
+    expected = operations.get('D' + str(depth))
+    if expected is None:
+        result['passed'] = None
+    else:
+        result['passed'] = str(result['perft']) == expected[0]
+
+
+def _analyse_search(board, operations, depth, result):
+    """Searches for the best move and compares it with the bm and am operations"""
+    if depth is None:
+        depth = DEFAULT_SEARCH_DEPTH
+    search = Search()
+    move, score = search.best_move(board, depth)
+    result['depth'] = depth
+    result['score'] = score
+    result['nodes'] = search.nodes
+    _score_move(board, operations, move, result)
+
+
+def _analyse_mate(board, operations, depth, time_limit, result):
+    """Searches for a forced mate and compares it with the dm and bm operations"""
+    mate_in = operations.get('dm')
+    if depth is None:
+        if mate_in is None or not mate_in[0].isnumeric():
+            result['error'] = 'No mate length given'
+            return
+        depth = int(mate_in[0])
+    solver = MateSolver(time_limit)
+    found = solver.find_mate(board, depth)
+    result['depth'] = depth
+    result['nodes'] = solver.nodes
+    result['timed_out'] = solver.timed_out
+    move = None
+    result['mate_in'] = None
+    if found is not None:
+        move, result['mate_in'] = found
+    _score_move(board, operations, move, result)
+    if result['passed'] is None:
+        result['passed'] = found is not None
+    if mate_in is not None and str(result['mate_in']) != mate_in[0]:
+        result['passed'] = False
+
+
+def main(arguments=None):
+    """
+    Run an EPD suite from the command line and print or write the JSON report.
+
+    Returns:
+        (int): The exit status, which is 1 when any scored position failed
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m modules.epd', description='Run an EPD test suite')
+    parser.add_argument('path', help='the EPD file')
+    parser.add_argument('--analysis', choices=ANALYSES, default='search')
+    parser.add_argument(
+        '--depth', type=int,
+        help='perft depth, search depth in plies or mate length in moves')
+    parser.add_argument(
+        '--workers', type=int, help='number of processes (default: one per CPU)')
+    parser.add_argument(
+        '--time-limit', type=float, help='maximum seconds per mate search')
+    parser.add_argument('--output', help='file to write the JSON report to')
+    args = parser.parse_args(arguments)
+
+    report = run_suite(
+        read_epd(args.path), args.analysis, args.depth, args.workers, args.time_limit)
+    text = json.dumps(report, indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, 'w') as file:
+            file.write(text + '\n')
+        print(str(report['passed']) + '/' + str(report['scored']) + ' passed in ' +
+              '%.2f' % report['time'] + 's')
+    if report['passed'] < report['scored']:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
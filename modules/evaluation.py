@@ -0,0 +1,296 @@
+from modules import tensors
+from modules.pieces import Pawn, Knight, Bishop, Rook, Queen, King
+from modules.tables import KNIGHT_ATTACKS, KING_ATTACKS, RAYS, ORTHOGONALS, DIAGONALS
+
+PIECE_VALUES = {piece.symbol: piece.value for piece in (Pawn, Knight, Bishop, Rook, Queen, King)}
+MOBILITY_WEIGHT = 2
+
+# Piece-square tables from white's point of view, in the order of Board.square_list
+# (a8 first). Black pieces read the table vertically mirrored.
+PIECE_SQUARE_TABLES = {
+    'p': [
+          0,   0,   0,   0,   0,   0,   0,   0,
+         50,  50,  50,  50,  50,  50,  50,  50,
+         10,  10,  20,  30,  30,  20,  10,  10,
+          5,   5,  10,  25,  25,  10,   5,   5,
+          0,   0,   0,  20,  20,   0,   0,   0,
+          5,  -5, -10,   0,   0, -10,  -5,   5,
+          5,  10,  10, -20, -20,  10,  10,   5,
+          0,   0,   0,   0,   0,   0,   0,   0],
+    'n': [
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20,   0,   0,   0,   0, -20, -40,
+        -30,   0,  10,  15,  15,  10,   0, -30,
+        -30,   5,  15,  20,  20,  15,   5, -30,
+        -30,   0,  15,  20,  20,  15,   0, -30,
+        -30,   5,  10,  15,  15,  10,   5, -30,
+        -40, -20,   0,   5,   5,   0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50],
+    'b': [
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10,   0,   0,   0,   0,   0,   0, -10,
+        -10,   0,   5,  10,  10,   5,   0, -10,
+        -10,   5,   5,  10,  10,   5,   5, -10,
+        -10,   0,  10,  10,  10,  10,   0, -10,
+        -10,  10,  10,  10,  10,  10,  10, -10,
+        -10,   5,   0,   0,   0,   0,   5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20],
+    'r': [
+          0,   0,   0,   0,   0,   0,   0,   0,
+          5,  10,  10,  10,  10,  10,  10,   5,
+         -5,   0,   0,   0,   0,   0,   0,  -5,
+         -5,   0,   0,   0,   0,   0,   0,  -5,
+         -5,   0,   0,   0,   0,   0,   0,  -5,
+         -5,   0,   0,   0,   0,   0,   0,  -5,
+         -5,   0,   0,   0,   0,   0,   0,  -5,
+          0,   0,   0,   5,   5,   0,   0,   0],
+    'q': [
+        -20, -10, -10,  -5,  -5, -10, -10, -20,
+        -10,   0,   0,   0,   0,   0,   0, -10,
+        -10,   0,   5,   5,   5,   5,   0, -10,
+         -5,   0,   5,   5,   5,   5,   0,  -5,
+          0,   0,   5,   5,   5,   5,   0,  -5,
+        -10,   5,   5,   5,   5,   5,   0, -10,
+        -10,   0,   5,   0,   0,   0,   0, -10,
+        -20, -10, -10,  -5,  -5, -10, -10, -20],
+    'k': [
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+         20,  20,   0,   0,   0,   0,  20,  20,
+         20,  30,  10,   0,   0,  10,  30,  20]
+    }
+
+# Per plane (in tensors.PLANE_ORDER) lookups so the inner loops avoid string handling
+_PLANE_SIGN = [1] * 6 + [-1] * 6
+_PLANE_VALUES = [PIECE_VALUES[symbol.lower()] for symbol in tensors.PLANE_ORDER]
+_PLANE_TABLES = [
+    PIECE_SQUARE_TABLES[symbol.lower()] if symbol.isupper()
+    else [PIECE_SQUARE_TABLES[symbol][i ^ 56] for i in range(64)]
+    for symbol in tensors.PLANE_ORDER]
+_PLANE_RAYS = {
+    2: DIAGONALS, 3: ORTHOGONALS, 4: ORTHOGONALS + DIAGONALS,
+    8: DIAGONALS, 9: ORTHOGONALS, 10: ORTHOGONALS + DIAGONALS}
+_PLANE_STEPS = {1: KNIGHT_ATTACKS, 5: KING_ATTACKS, 7: KNIGHT_ATTACKS, 11: KING_ATTACKS}
+
+
+def evaluate(position):
+    """
+    Statically evaluate a single position.
+
+    Parameters:
+        position(Board or str): A Board object or a FEN string
+
+    Returns:
+        (dict): The evaluation, as described in evaluate_batch
+    """
+    planes = bytearray(tensors.POSITION_SIZE)
+    tensors.encode_board(position, planes)
+    return _evaluate_planes(bytes(planes))
+
+
+def evaluate_batch(positions, use_numpy=True):
+    """
+    Statically evaluate many positions. Scores are in centipawns from white's point of view.
+    When NumPy is installed the whole batch is evaluated at once with array operations,
+    otherwise each position is evaluated in turn.
+
+    Parameters:
+        positions: Either a stacked plane tensor as produced by modules.tensors
+            (any buffer of n x 12 x 8 x 8 bytes, such as the view returned by open_npy
+            or a numpy array), or an iterable of Board objects and/or FEN strings
+
+        use_numpy(bool): Whether to use NumPy if it is installed
+
+    Returns:
+        (list): A dict per position with the keys
+            score: The combined evaluation
+            material: Material balance
+            piece_square: Sum of the piece-square table values
+            mobility: Difference in squares attacked by knights, bishops, rooks, queens and kings
+            insufficient_material: Whether neither side can possibly deliver checkmate
+    """
+    try:
+        view = memoryview(positions)
+    except TypeError:
+        positions = list(positions)
+        view = memoryview(bytearray(len(positions) * tensors.POSITION_SIZE))
+        tensors.encode_batch(positions, view)
+
+    if view.format != 'B' or view.ndim != 1:
+        view = view.cast('B')
+    size = tensors.POSITION_SIZE
+    count = len(view) // size
+    numpy = _numpy() if use_numpy else None
+    if numpy is not None and count > 0:
+        return _evaluate_stacked(numpy, numpy.frombuffer(view, numpy.uint8, count * size))
+    return [
+        _evaluate_planes(view[offset:offset + size].tobytes())
+        for offset in range(0, count * size, size)]
+
+
+def _evaluate_planes(planes):
+    """Evaluates a single position from its 768 bytes of piece planes"""
+    pieces = []
+    occupied = bytearray(64)
+    counts = []
+    for plane in range(12):
+        start = plane * 64
+        end = start + 64
+        count = 0
+        square = planes.find(1, start, end)
+        while square != -1:
+            pieces.append((plane, square - start))
+            occupied[square - start] = 1
+            count += 1
+            square = planes.find(1, square + 1, end)
+        counts.append(count)
+
+    material = 0
+    piece_square = 0
+    mobility = 0
+    for plane, square in pieces:
+        sign = _PLANE_SIGN[plane]
+        material += sign * _PLANE_VALUES[plane]
+        piece_square += sign * _PLANE_TABLES[plane][square]
+        if plane in _PLANE_STEPS:
+            mobility += sign * len(_PLANE_STEPS[plane][square])
+        elif plane in _PLANE_RAYS:
+            for direction in _PLANE_RAYS[plane]:
+                for target in RAYS[direction][square]:
+                    mobility += sign
+                    if occupied[target]:
+                        break
+
+    return {
+        'score': material + piece_square + MOBILITY_WEIGHT * mobility,
+        'material': material,
+        'piece_square': piece_square,
+        'mobility': mobility,
+        'insufficient_material': _insufficient_material(counts, pieces)
+        }
+
+
+def _insufficient_material(counts, pieces):
+    """
+    Classifies material from per plane piece counts, using the same rules as
+    Board.insufficient_material
+    """
+    pawns, knights, bishops, rooks, queens = (
+        counts[i] + counts[i + 6] for i in range(5))
+    if pawns or rooks or queens:
+        return False
+    if knights + bishops <= 1:
+        return True
+    if knights == 0 and counts[2] == 1 and counts[8] == 1:
+        colors = set()
+        for plane, square in pieces:
+            if plane == 2 or plane == 8:
+                row, col = divmod(square, 8)
+                colors.add((row + col) % 2)
+        return len(colors) == 1
+    return False
+
+
+_NUMPY = []
+_KERNEL_TABLES = {}
+
+
+def _numpy():
+    """Returns the numpy module, or None if it is not installed. It is only imported when first needed"""
+    if len(_NUMPY) == 0:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _NUMPY.append(numpy)
+    return _NUMPY[0]
+
+
+def _kernel_tables(numpy):
+    """
+    Returns the lookup tables of _evaluate_stacked as arrays, building them the first time.
+    Per piece tables are indexed by plane * 64 + square, and signed for the color of the plane
+    """
+    if len(_KERNEL_TABLES) == 0:
+        signs = numpy.repeat(_PLANE_SIGN, 64)
+        steps = [0] * tensors.POSITION_SIZE
+        for plane, attacks in _PLANE_STEPS.items():
+            for square, squares in enumerate(attacks):
+                steps[plane * 64 + square] = len(squares)
+        _KERNEL_TABLES.update({
+            'values': signs * numpy.repeat(_PLANE_VALUES, 64),
+            'tables': signs * numpy.array(_PLANE_TABLES).ravel(),
+            'steps': signs * numpy.array(steps),
+            'signs': signs,
+            'dark': numpy.array([(square // 8 + square % 8) % 2 for square in range(64)])
+            })
+        for name, directions in (('orthogonal', ORTHOGONALS), ('diagonal', DIAGONALS)):
+            # each ray as 8 square indices, padded with 64 (always occupied) past its end,
+            # so that every ray stops at an occupied square
+            rays = numpy.array([
+                [ray + [64] * (8 - len(ray)) for ray in RAYS[direction]]
+                for direction in directions]).transpose(1, 0, 2)
+            planes = [plane for plane, names in _PLANE_RAYS.items() if directions[0] in names]
+            _KERNEL_TABLES[name] = (numpy.isin(numpy.arange(12), planes), rays, (rays < 64).sum(axis=2))
+    return _KERNEL_TABLES
+
+
+def _evaluate_stacked(numpy, planes):
+    """
+    Evaluates every position in a flat uint8 array of stacked 768 byte piece planes at once,
+    giving the same results as _evaluate_planes
+    """
+    tables = _kernel_tables(numpy)
+    count = len(planes) // tensors.POSITION_SIZE
+    # one entry per piece, by position and index within the position
+    position, index = numpy.divmod(numpy.flatnonzero(planes.view(bool)), tensors.POSITION_SIZE)
+    plane = index >> 6
+    square = index & 63
+
+    def total(weights):
+        return numpy.bincount(position, weights, count).round().astype(numpy.int64)
+
+    material = total(tables['values'][index])
+    piece_square = total(tables['tables'][index])
+
+    # sliders reach along each ray up to and including the first occupied square
+    occupied = numpy.zeros((count, 65), bool)
+    occupied[:, 64] = True
+    occupied.ravel()[position * 65 + square] = True
+    moves = tables['steps'][index]
+    for name in ('orthogonal', 'diagonal'):
+        sliding, rays, lengths = tables[name]
+        sliders = numpy.flatnonzero(sliding[plane])
+        targets = rays[square[sliders]]
+        blocked = occupied.ravel()[(position[sliders] * 65)[:, None, None] + targets]
+        first = blocked.argmax(axis=2)
+        reach = (first + (first < lengths[square[sliders]])).sum(axis=1)
+        moves[sliders] += tables['signs'][index[sliders]] * reach
+    mobility = total(moves)
+
+    counts = numpy.bincount(position * 12 + plane, minlength=count * 12).reshape(count, 12)
+    pawns, knights, bishops, rooks, queens = (counts[:, i] + counts[:, i + 6] for i in range(5))
+    # the bishop ending needs the color of each side's bishop
+    dark = [
+        numpy.bincount(position[plane == bishop], tables['dark'][square[plane == bishop]], count)
+        for bishop in (2, 8)]
+    insufficient = (pawns + rooks + queens == 0) & (
+        (knights + bishops <= 1) |
+        ((knights == 0) & (counts[:, 2] == 1) & (counts[:, 8] == 1) & (dark[0] == dark[1])))
+
+    score = material + piece_square + MOBILITY_WEIGHT * mobility
+    return [
+        {
+            'score': values[0],
+            'material': values[1],
+            'piece_square': values[2],
+            'mobility': values[3],
+            'insufficient_material': values[4]
+        }
+        for values in zip(
+            score.tolist(), material.tolist(), piece_square.tolist(), mobility.tolist(),
+            insufficient.tolist())]
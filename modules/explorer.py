@@ -0,0 +1,325 @@
+import argparse
+import heapq
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from modules import pgn
+from modules.boards import Board
+from modules.polyglot import zobrist_key
+from modules.tables import pack_move, unpack_move
+
+DEFAULT_MAX_PLY = 20
+DEFAULT_MAX_ENTRIES = 200000
+DEFAULT_FAN_IN = 64
+
+# Tables hold one record per position and move: the Polyglot key of the position,
+# the move packed by tables.pack_move and the number of games it won for white,
+# drew and won for black. Records are big-endian and sorted by key and move,
+# so the moves of a position can be found by binary search.
+_RECORD = struct.Struct('>QHIII')
+# The index in a record's counts for each result
+_RESULT_INDEX = {'1-0': 0, '1/2-1/2': 1, '0-1': 2}
+
+
+class Explorer:
+    """
+    An opening explorer table built by build. The file is memory-mapped and searched
+    in place like a Polyglot book, so looking up a position takes well under a millisecond
+    whatever the size of the table.
+    """
+
+    def __init__(self, path):
+        """
+        Opens a table.
+
+        Parameters:
+            path(str): The path to the table file
+        """
+        with open(path, 'rb') as file:
+            size = os.fstat(file.fileno()).st_size
+            if size % _RECORD.size != 0:
+                raise ValueError('Not an opening explorer table: ' + path)
+            # an empty file cannot be mapped, but is a valid table of no games
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self.size = size // _RECORD.size
+
+    def __enter__(self):
+        """Returns the table for use in a with statement"""
+        return self
+
+    def __exit__(self, *args):
+        """Closes the table at the end of a with statement"""
+        self.close()
+
+    def close(self):
+        """Closes the underlying file"""
+        if self.size:
+            self._map.close()
+
+    def moves(self, board):
+        """
+        Finds the moves played from a position.
+
+        Parameters:
+            board(Board): The position to look up
+
+        Returns:
+            (list): A (move, white, draws, black) tuple for each move, with the move in uci
+                format followed by the number of games won by white, drawn and won by black.
+                Sorted by descending number of games
+        """
+        key = zobrist_key(board)
+        # binary search for the first record with this key
+        low = 0
+        high = self.size
+        while low < high:
+            middle = (low + high) // 2
+            if struct.unpack_from('>Q', self._map, middle * _RECORD.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        moves = []
+        index = low
+        while index < self.size:
+            record_key, move, white, draws, black = _RECORD.unpack_from(
+                self._map, index * _RECORD.size)
+            if record_key != key:
+                break
+            moves.append((unpack_move(move), white, draws, black))
+            index += 1
+        moves.sort(key=lambda move: move[1] + move[2] + move[3], reverse=True)
+        return moves
+
+
+def build(paths, output, max_ply=DEFAULT_MAX_PLY, workers=None,
+          max_entries=DEFAULT_MAX_ENTRIES, directory=None, fan_in=DEFAULT_FAN_IN):
+    """
+    Build an opening explorer table from PGN files. Each file is split into shards
+    at game boundaries, and a pool of processes replays the games of each shard,
+    counting the results of every move played up to max_ply. Workers write their counts
+    as sorted partial tables, which are then merged into the table, at most fan_in at a time.
+    Games without a result are skipped, and a game is only followed up to any illegal move.
+
+    Parameters:
+        paths(list): The PGN files
+
+        output(str): The file to write the table to
+
+        max_ply(int): The number of plies from the start of each game to count
+
+        workers(int): The number of processes (optional, defaults to one per CPU).
+            With one worker the games are replayed in this process
+
+        max_entries(int): The number of moves a worker counts in memory before
+            writing them to a partial table
+
+        directory(str): Where to put the temporary partial tables (optional)
+
+        fan_in(int): The most partial tables merged at once. More are merged in passes
+
+    Returns:
+        (dict): The keys games, skipped, moves (the number of records in the table),
+            partial_tables and seconds
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    start = time.perf_counter()
+    summary = {'games': 0, 'skipped': 0, 'moves': 0, 'partial_tables': 0}
+    with tempfile.TemporaryDirectory(dir=directory) as temporary:
+        shards = [
+            (path, begin, end, max_ply, temporary, max_entries)
+            for path in paths for begin, end in _split(path, workers)]
+        if workers == 1:
+            results = [map_shard(*shard) for shard in shards]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(map_shard, *zip(*shards)))
+
+        runs = []
+        for shard_runs, games, skipped in results:
+            runs.extend(shard_runs)
+            summary['games'] += games
+            summary['skipped'] += skipped
+        summary['partial_tables'] = len(runs)
+
+        while len(runs) > fan_in:
+            merged = []
+            for i in range(0, len(runs), fan_in):
+                descriptor, path = tempfile.mkstemp(suffix='.run', dir=temporary)
+                with os.fdopen(descriptor, 'wb') as file:
+                    for key, move, counts in _merge(runs[i:i + fan_in]):
+                        file.write(_RECORD.pack(key, move, *counts))
+                for old in runs[i:i + fan_in]:
+                    os.remove(old)
+                merged.append(path)
+            runs = merged
+
+        with open(output, 'wb') as file:
+            for key, move, counts in _merge(runs):
+                file.write(_RECORD.pack(key, move, *counts))
+                summary['moves'] += 1
+    summary['seconds'] = round(time.perf_counter() - start, 3)
+    return summary
+
+
+def map_shard(path, begin, end, max_ply, directory, max_entries=DEFAULT_MAX_ENTRIES):
+    """
+    Count the moves played in the games starting within part of a PGN file,
+    writing them to sorted partial tables.
+
+    Parameters:
+        path(str): The PGN file
+
+        begin(int): The byte offset of the first game
+
+        end(int): The byte offset after the last game
+
+        max_ply(int): The number of plies from the start of each game to count
+
+        directory(str): The directory to create the partial tables in
+
+        max_entries(int): The number of moves to count in memory before writing a partial table
+
+    Returns:
+        (tuple): The paths of the partial tables, the number of games counted
+            and the number of games skipped
+    """
+    counts = {}
+    runs = []
+    games = 0
+    skipped = 0
+    for game in pgn.read_games(_shard_lines(path, begin, end)):
+        result = _RESULT_INDEX.get(game['result'])
+        board = Board()
+        if result is None or not board.load(game['headers'].get('FEN', pgn.START_FEN)):
+            skipped += 1
+            continue
+        games += 1
+        for notation in game['moves'][:max_ply]:
+            move = board.parse_notation(notation)
+            if move is None:
+                break
+            entry = (zobrist_key(board), pack_move(move))
+            if entry not in counts:
+                counts[entry] = [0, 0, 0]
+            counts[entry][result] += 1
+            board.make_move(move)
+        if len(counts) >= max_entries:
+            runs.append(_write_run(counts, directory))
+            counts = {}
+    if len(counts) > 0:
+        runs.append(_write_run(counts, directory))
+    return runs, games, skipped
+
+
+def _split(path, parts):
+    """
+    Returns (begin, end) byte offsets dividing a PGN file into up to a number of parts,
+    each starting at the tags of a game
+    """
+    size = os.path.getsize(path)
+    offsets = [0]
+    with open(path, 'rb') as file:
+        for i in range(1, parts):
+            file.seek(size * i // parts)
+            file.readline()
+            # a game starts with a tag line which does not follow another tag line
+            after_tag = True
+            while True:
+                offset = file.tell()
+                line = file.readline()
+                if not line:
+                    offset = size
+                    break
+                line = line.strip()
+                if line.startswith(b'[') and not after_tag:
+                    break
+                if line:
+                    after_tag = line.startswith(b'[')
+            if offset > offsets[-1]:
+                offsets.append(offset)
+    if offsets[-1] < size:
+        offsets.append(size)
+    return list(zip(offsets, offsets[1:]))
+
+
+def _shard_lines(path, begin, end):
+    """Yields the lines of a file between two byte offsets as text"""
+    with open(path, 'rb') as file:
+        file.seek(begin)
+        position = begin
+        while position < end:
+            line = file.readline()
+            if not line:
+                return
+            position += len(line)
+            yield line.decode('utf-8', 'replace')
+
+
+def _write_run(counts, directory):
+    """Writes counted moves to a new partial table, sorted by key and move, and returns its path"""
+    descriptor, path = tempfile.mkstemp(suffix='.run', dir=directory)
+    with os.fdopen(descriptor, 'wb') as file:
+        for entry in sorted(counts):
+            file.write(_RECORD.pack(*entry, *counts[entry]))
+    return path
+
+
+def _read_run(path):
+    """Yields the key, move and counts of each record in a partial table"""
+    with open(path, 'rb') as file:
+        while True:
+            block = file.read(_RECORD.size * 4096)
+            if not block:
+                return
+            for key, move, white, draws, black in _RECORD.iter_unpack(block):
+                yield key, move, (white, draws, black)
+
+
+def _merge(paths):
+    """Yields the key, move and counts of each record in partial tables, adding up repeated moves"""
+    current = None
+    totals = [0, 0, 0]
+    for key, move, counts in heapq.merge(*[_read_run(path) for path in paths]):
+        if (key, move) != current:
+            if current is not None:
+                yield current[0], current[1], totals
+            current = (key, move)
+            totals = [0, 0, 0]
+        for i in range(3):
+            totals[i] += counts[i]
+    if current is not None:
+        yield current[0], current[1], totals
+
+
+def main(arguments=None):
+    """Build an opening explorer table from the command line and print the JSON summary"""
+    parser = argparse.ArgumentParser(
+        prog='python -m modules.explorer',
+        description='Build an opening explorer table from PGN files')
+    parser.add_argument('inputs', nargs='+', help='PGN files')
+    parser.add_argument('--output', required=True, help='file to write the table to')
+    parser.add_argument(
+        '--max-ply', type=int, default=DEFAULT_MAX_PLY,
+        help='plies from the start of each game to count (default 20)')
+    parser.add_argument(
+        '--workers', type=int, help='number of processes (default: one per CPU)')
+    parser.add_argument(
+        '--max-entries', type=int, default=DEFAULT_MAX_ENTRIES,
+        help='moves each worker counts in memory before writing a partial table')
+    parser.add_argument('--temp-dir', help='directory for the temporary partial tables')
+    args = parser.parse_args(arguments)
+
+    summary = build(
+        args.inputs, args.output, args.max_ply, args.workers, args.max_entries, args.temp_dir)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+from array import array
+
+from modules.boards import Board, PACKED_SIZE
+from modules.tables import pack_move, unpack_move
+
+DEFAULT_SNAPSHOT_INTERVAL = 20
+
+
+class Game:
+    """
+    The moves of a game from a starting position, stored as an array of packed moves,
+    with a packed copy of the position every few plies so that any ply can be reached
+    by replaying at most that many moves.
+    """
+
+    def __init__(self, fen=None, snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL):
+        """
+        Initializes a game with no moves. If a FEN string is not provided,
+        the starting position is used.
+
+        Parameters:
+            fen(str): A FEN string for the starting position (optional)
+
+            snapshot_interval(int): The number of plies between stored positions
+        """
+        self.board = Board()
+        if fen is not None and not self.board.load(fen):
+            raise ValueError('Invalid FEN supplied')
+        self.start_fen = self.board.output_fen()
+        self.snapshot_interval = snapshot_interval
+        self.ply = 0
+        self._moves = array('H')
+        self._snapshots = bytearray()
+        self._snapshot()
+
+    def __len__(self):
+        """Returns the number of plies in the game"""
+        return len(self._moves)
+
+    @property
+    def moves(self):
+        """The moves of the game in uci format"""
+        return [unpack_move(move) for move in self._moves]
+
+    def play(self, uci_move):
+        """
+        Make a move in the current position. If the current position is not the last
+        in the game, the later moves are replaced by this one.
+
+        Parameters:
+            uci_move(str): The move in uci format
+                e.g. e2e4 not e4, b2c3 not Nxc3, d7d8q not d8=Q
+
+        Returns:
+            (bool): Indicating whether or not the move was valid
+        """
+        if not self.board.make_move(uci_move):
+            return False
+        del self._moves[self.ply:]
+        snapshots = self.ply // self.snapshot_interval + 1
+        del self._snapshots[snapshots * PACKED_SIZE:]
+
+        self._moves.append(pack_move(uci_move))
+        self.ply += 1
+        if self.ply % self.snapshot_interval == 0:
+            self._snapshot()
+        return True
+
+    def seek(self, ply):
+        """
+        Make the position after a given number of plies the current position.
+        The moves after it are kept, so seeking forward again replays them.
+
+        Parameters:
+            ply(int): The number of plies from the start of the game
+
+        Returns:
+            (bool): Indicating whether or not the ply is within the game
+        """
+        if ply < 0 or ply > len(self._moves):
+            return False
+        # moving forward a few plies is quicker from the current position
+        if self.ply <= ply and ply - self.ply < ply % self.snapshot_interval:
+            for move in self._moves[self.ply:ply]:
+                self.board.make_move(unpack_move(move))
+        else:
+            self.board = self.position_at(ply)
+        self.ply = ply
+        return True
+
+    def position_at(self, ply):
+        """
+        Get the position after a given number of plies, without changing the current position.
+
+        Parameters:
+            ply(int): The number of plies from the start of the game
+
+        Returns:
+            (Board): A new Board with the position, or None if the ply is not within the game
+        """
+        if ply < 0 or ply > len(self._moves):
+            return None
+        start = ply - ply % self.snapshot_interval
+        board = Board.from_packed(self._snapshots, start // self.snapshot_interval * PACKED_SIZE)
+        for move in self._moves[start:ply]:
+            board.make_move(unpack_move(move))
+        return board
+
+    def _snapshot(self):
+        """Stores the current position, which must be at a multiple of the snapshot interval"""
+        self._snapshots.extend(bytes(PACKED_SIZE))
+        self.board.pack_into(self._snapshots, len(self._snapshots) - PACKED_SIZE)
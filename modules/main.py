@@ -1,23 +1,42 @@
 from modules.boards import Board
+from modules.cache import POSITION_CACHE
+from modules.game import Game
+
+# The search, mate solver, opening book, opening explorer and ponderer are imported by the commands
+# which use them, so that starting the program only loads what the board needs
 
 class App:
     """The class containing the functions for user interaction"""
-    board = Board()
+    search_depth = 3
+
+    def __init__(self):
+        """Initializes the app with a new game. Each app has its own game and board"""
+        self.game = Game()
+        self.board = self.game.board
+        self.book = None
+        self.explorer = None
+        self.ponderer = None
 
-    def run(self):
-        """Endlessly prompt the user to input commands"""
+    def run(self, ponder=False):
+        """Endlessly prompt the user to input commands, optionally analysing in the background"""
+        if ponder:
+            from modules.ponder import Ponderer
+            self.ponderer = Ponderer()
         while (True):
+            self._update_ponderer()
             response = input("Enter a command: ").lower()
             if response == "help":
                 for attr_name in App.__dict__:
-                    if attr_name == "run":
+                    if attr_name == "run" or attr_name.startswith("_"):
                         continue
                     attr = getattr(App, attr_name)
                     if callable(attr):
                         print("COMMAND: " + attr_name)
                         print(attr.__doc__)
                         print()
-            elif response in App.__dict__ and callable(getattr(self, response)):
+            elif (response in App.__dict__ and
+                    not response.startswith("_") and
+                    callable(getattr(self, response))):
                 getattr(self, response)()
                 print()
             else:
@@ -26,21 +45,47 @@ class App:
 
     def new_game(self):
         """Start a new game. This happens automatically when the program starts"""
-        self.board = Board()
+        self.game = Game()
+        self.board = self.game.board
 
     def load_position(self):
         """Provide a FEN to load a game from that position"""
-        fen = input("Enter FEN: ").lower()
-        valid = self.board.load(fen)
-        if not valid:
+        fen = input("Enter FEN: ").strip()
+        if not Board.is_fen_parseable(fen):
             print("Invalid FEN supplied")
+            return
+        self.game = Game(fen)
+        self.board = self.game.board
 
     def make_move(self):
         """Make a move. Provide the move in uci format e.g. e2e4 d7d8q"""
         move = input("Enter move: ").lower()
-        valid = self.board.make_move(move)
-        if not valid:
+        if move not in POSITION_CACHE.legal_moves(self.board):
             print("Invalid move supplied")
+            return
+        self.game.play(move)
+
+    def goto(self):
+        """Go to the position after a given number of plies (half moves) from the start of the game. Making a move from there replaces the later moves"""
+        ply = input("Enter ply: ").strip()
+        if not ply.isnumeric() or not self.game.seek(int(ply)):
+            print("Invalid ply supplied. The game has " + str(len(self.game)) + " plies")
+            return
+        self.board = self.game.board
+
+    def back(self):
+        """Take back the last move, which can be replayed with forward"""
+        if not self.game.seek(self.game.ply - 1):
+            print("Already at the start of the game")
+            return
+        self.board = self.game.board
+
+    def forward(self):
+        """Replay the next move after going back"""
+        if not self.game.seek(self.game.ply + 1):
+            print("Already at the end of the game")
+            return
+        self.board = self.game.board
 
     def print_board(self):
         """Print a representation of the board. Dots are empty squares, capital letters are white pieces"""
@@ -53,16 +98,121 @@ class App:
     def print_move_notation(self):
         """Print the algebraic notation for a move in uci format. This does not actually make the move"""
         move = input("Enter move: ").lower()
-        print("\n" + self.board.move_notation(move))
+        notation = POSITION_CACHE.move_notation(self.board, move)
+        if notation is None:
+            print("Invalid move supplied")
+            return
+        print("\n" + notation)
 
     def print_game_state(self):
         """Prints whether the game is checkmate, stalemate, or else which colour is next to move"""
-        if self.board.is_checkmate() and self.board.current_player == "black":
+        status = POSITION_CACHE.game_status(self.board)
+        if status == "checkmate" and self.board.current_player == "black":
             state = "Checkmate - White Wins"
-        elif self.board.is_checkmate() and self.board.current_player == "white":
+        elif status == "checkmate" and self.board.current_player == "white":
             state = "Checkmate - Black Wins"
-        elif self.board.is_stalemate():
+        elif status == "stalemate":
             state = "Draw - Stalemate"
         else:
             state = self.board.current_player + " to move"
-        print("\n" + state)
\ No newline at end of file
+            result = self.board.bitbase_result()
+            if result == 'draw':
+                state += " - Drawn with perfect play"
+            elif result is not None:
+                winner = self.board.current_player
+                if result == 'loss':
+                    winner = self.board.opponents[winner]
+                state += " - " + winner.capitalize() + " wins with perfect play"
+        print("\n" + state)
+
+    def book_moves(self):
+        """Print the moves for the current position from a Polyglot (.bin) opening book. The book's location is asked for the first time"""
+        if self.book is None:
+            from modules.polyglot import Book
+            path = input("Enter book path: ").strip()
+            try:
+                self.book = Book(path)
+            except (OSError, ValueError):
+                print("Could not open book")
+                return
+        moves = self.book.moves(self.board)
+        if len(moves) == 0:
+            print("\nNo book moves for this position")
+        for move, weight in moves:
+            print(self.board.move_notation(move) + " (" + move + ") weight " + str(weight))
+
+    def explorer_moves(self):
+        """Print the moves played from the current position in an opening explorer table, with how many games each won, drew and lost. The table's location is asked for the first time"""
+        if self.explorer is None:
+            from modules.explorer import Explorer
+            path = input("Enter explorer table path: ").strip()
+            try:
+                self.explorer = Explorer(path)
+            except (OSError, ValueError):
+                print("Could not open explorer table")
+                return
+        moves = self.explorer.moves(self.board)
+        if len(moves) == 0:
+            print("\nNo games reached this position")
+        for move, white, draws, black in moves:
+            print(self.board.move_notation(move) + " (" + move + ") " + str(white + draws + black) +
+                  " games: white wins " + str(white) + ", draws " + str(draws) +
+                  ", black wins " + str(black))
+
+    def mate(self):
+        """Search for a forced checkmate for the current player within a number of moves. The search stops after a minute"""
+        moves = input("Enter number of moves: ").strip()
+        if not moves.isnumeric() or int(moves) < 1:
+            print("Invalid number of moves supplied")
+            return
+        from modules.mate import MateSolver
+        solver = MateSolver(time_limit=60)
+        result = solver.find_mate(self.board, int(moves))
+        if result is not None:
+            move, mate_in = result
+            print("\nMate in " + str(mate_in) + ": " + self.board.move_notation(move) + " (" + move + ")")
+        elif solver.timed_out:
+            print("\nSearch stopped after reaching the time limit")
+        else:
+            print("\nNo forced mate in " + moves + " moves")
+        print(str(solver.nodes) + " positions searched")
+
+    def cache_stats(self):
+        """Print the number of positions in the cache of legal moves, notation and game states, and how often it has been hit"""
+        stats = POSITION_CACHE.stats()
+        print("\n" + str(stats["entries"]) + "/" + str(stats["size"]) + " positions cached")
+        print(str(stats["hits"]) + " hits, " + str(stats["misses"]) + " misses")
+        if stats["hit_rate"] is not None:
+            print("Hit rate " + str(round(stats["hit_rate"] * 100, 1)) + "%")
+
+    def ponder(self):
+        """Turn background analysis on or off. While on, the moves, notation, game state and best move for the current position are worked out while waiting for a command"""
+        if self.ponderer is None:
+            from modules.ponder import Ponderer
+            self.ponderer = Ponderer()
+            print("\nPondering on")
+        else:
+            self.ponderer.stop()
+            self.ponderer = None
+            print("\nPondering off")
+
+    def best_move(self):
+        """Print the best move for the current player. When pondering, the deepest search finished so far is used"""
+        result = None
+        if self.ponderer is not None:
+            result = self.ponderer.best_move(self.board)
+        if result is None:
+            from modules.search import Search
+            move, score = Search().best_move(self.board, self.search_depth)
+            result = (move, score, self.search_depth)
+        move, score, depth = result
+        if move is None:
+            print("\nNo legal moves")
+            return
+        print("\n" + POSITION_CACHE.move_notation(self.board, move) + " (" + move + ") score " +
+              str(score) + " at depth " + str(depth))
+
+    def _update_ponderer(self):
+        """Restarts the background analysis when the position has changed"""
+        if self.ponderer is not None and self.ponderer.fen != self.board.output_fen():
+            self.ponderer.start(self.board)
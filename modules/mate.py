@@ -0,0 +1,126 @@
+import time
+
+from modules.search import order_moves
+
+
+class MateSolver:
+    """
+    Proves or refutes a forced checkmate within a number of moves, by iterative deepening
+    over the attacker's moves (checks first) with a cache of already solved positions.
+    """
+
+    def __init__(self, time_limit=None):
+        """
+        Initializes the solver.
+
+        Parameters:
+            time_limit(float): The maximum number of seconds to search for (optional)
+        """
+        self.time_limit = time_limit
+        self.nodes = 0
+        self.timed_out = False
+        self._deadline = None
+        # position key -> (shortest depth proven to mate, longest depth proven not to)
+        self._cache = {}
+
+    def find_mate(self, board, moves):
+        """
+        Find the shortest forced checkmate for the current player.
+
+        Parameters:
+            board(Board): The position to solve. This is not modified
+
+            moves(int): The maximum number of the current player's moves to mate within
+
+        Returns:
+            (tuple): The first move of the mate in uci format and the number of moves
+                it mates in, or None if there is no mate within the given number of moves
+                or the time limit was reached (in which case timed_out is set)
+        """
+        self.nodes = 0
+        self.timed_out = False
+        if self.time_limit is not None:
+            self._deadline = time.monotonic() + self.time_limit
+        try:
+            for depth in range(1, moves + 1):
+                move = self._attack(board, depth)
+                if move is not None:
+                    return move, depth
+        except _Timeout:
+            self.timed_out = True
+        return None
+
+    def _attack(self, board, depth):
+        """Returns a move which forces mate within depth moves, or None"""
+        self.nodes += 1
+        if self._deadline is not None and time.monotonic() > self._deadline:
+            raise _Timeout()
+
+        key = _position_key(board)
+        proven, refuted = self._cache.get(key, (None, 0))
+        if depth <= refuted:
+            return None
+        if proven is not None and proven[0] <= depth:
+            return proven[1]
+
+        children = []
+        for move in order_moves(board, board.legal_moves()):
+            child = board.copy()
+            child.make_move(move)
+            # with one move left only a check can mate, so quiet moves are never searched
+            if child.is_check():
+                children.append((move, child))
+            elif depth > 1:
+                children.append((move, child))
+        # search checks before any other move
+        children.sort(key=lambda child: not child[1].is_check())
+
+        for move, child in children:
+            if self._defend(child, depth):
+                self._cache[key] = ((depth, move), refuted)
+                return move
+        self._cache[key] = (proven, depth)
+        return None
+
+    def _defend(self, board, depth):
+        """Returns a bool indicating whether every reply to the attacker's move is mated in time"""
+        self.nodes += 1
+        replies = board.legal_moves()
+        if len(replies) == 0:
+            return board.is_check()
+        if depth == 1:
+            return False
+        for reply in order_moves(board, replies):
+            child = board.copy()
+            child.make_move(reply)
+            if self._attack(child, depth - 1) is None:
+                return False
+        return True
+
+
+class _Timeout(Exception):
+    """Raised inside the search when the time limit is reached"""
+
+
+def _position_key(board):
+    """Returns a key identifying a position regardless of the move counters"""
+    fen = board.output_fen()
+    return fen[:fen.rindex(' ', 0, fen.rindex(' '))]
+
+
+def find_mate(board, moves, time_limit=None):
+    """
+    Find the shortest forced checkmate for the current player.
+
+    Parameters:
+        board(Board): The position to solve. This is not modified
+
+        moves(int): The maximum number of the current player's moves to mate within
+
+        time_limit(float): The maximum number of seconds to search for (optional)
+
+    Returns:
+        (tuple): The first move of the mate in uci format and the number of moves it mates in,
+            or None if no mate was found
+    """
+    return MateSolver(time_limit).find_mate(board, moves)
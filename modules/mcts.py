@@ -0,0 +1,315 @@
+import argparse
+import json
+import math
+import time
+from array import array
+
+from modules.boards import Board
+from modules.evaluation import evaluate_batch
+from modules.pawns import PAWN_TABLE
+from modules.search import capture_value
+from modules.tables import pack_move, unpack_move
+
+DEFAULT_MEMORY = 16 << 20
+DEFAULT_VISITS = 2000
+DEFAULT_BATCH_SIZE = 16
+DEFAULT_EXPLORATION = 1.5
+# The centipawn advantage which makes a position worth about 0.76 of a win
+VALUE_SCALE = 400
+# Higher values make captures less dominant in the move priors
+PRIOR_TEMPERATURE = 200
+
+# Enough nodes for the root to be expanded in any position
+MIN_NODES = 256
+
+# Node states
+_UNEXPANDED = 0
+_EXPANDED = 1
+_DRAWN = 2
+_LOST = 3
+
+# The typecode of each per-node array. Children of a node are allocated next to
+# each other, so a node only needs the index of its first child and their number.
+_NODE_ARRAYS = {
+    'first_child': 'i',
+    'child_count': 'H',
+    'move': 'H',
+    'state': 'B',
+    'visits': 'I',
+    'virtual_loss': 'H',
+    'value': 'd',
+    'prior': 'f'
+    }
+NODE_SIZE = sum(array(typecode).itemsize for typecode in _NODE_ARRAYS.values())
+
+
+class MCTS:
+    """
+    A Monte Carlo tree search using the PUCT rule over Board positions.
+    The tree is held in preallocated arrays with one entry per node, so it never uses
+    more than its memory budget; once full, leaves are evaluated without being expanded.
+    Positions are not stored but replayed from the root along the selected path.
+    Leaves are selected in batches, with a virtual loss added along each selected path
+    so that the batch spreads over different lines, and each batch is evaluated at once.
+    """
+
+    def __init__(self, memory=DEFAULT_MEMORY, batch_size=DEFAULT_BATCH_SIZE,
+                 exploration=DEFAULT_EXPLORATION, policy=None):
+        """
+        Initializes an empty tree.
+
+        Parameters:
+            memory(int): The number of bytes to use for the tree,
+                which is raised to fit at least MIN_NODES nodes
+
+            batch_size(int): The number of leaves selected and evaluated together
+
+            exploration(float): The weight of the prior and visit count term of PUCT
+
+            policy(function): Takes a Board and its legal moves and returns a prior
+                probability for each move (optional, defaults to favouring captures)
+        """
+        self.max_nodes = max(MIN_NODES, memory // NODE_SIZE)
+        self.batch_size = batch_size
+        self.exploration = exploration
+        self.policy = policy if policy is not None else heuristic_policy
+        for name, typecode in _NODE_ARRAYS.items():
+            size = array(typecode).itemsize
+            setattr(self, '_' + name, array(typecode, bytes(size * self.max_nodes)))
+        self.nodes = 0
+        self.root = None
+        self.seconds = 0
+        self.stopped = False
+
+    def stop(self):
+        """Ask a search running in another thread to finish after its current batch"""
+        self.stopped = True
+
+    def search(self, board, visits=DEFAULT_VISITS, time_limit=None):
+        """
+        Search a position, replacing any earlier tree.
+
+        Parameters:
+            board(Board): The position to search. This is not modified
+
+            visits(int): The number of leaf evaluations to stop after
+
+            time_limit(float): The number of seconds to stop after (optional)
+
+        Returns:
+            (str): The most visited move in uci format, or None if there are no legal moves
+        """
+        start = time.perf_counter()
+        self.root = board.copy()
+        self.stopped = False
+        self.nodes = 1
+        self._reset(0, 0, 1)
+        while self._visits[0] < visits and not self.stopped:
+            self._run_batch(min(self.batch_size, visits - self._visits[0]))
+            if self._state[0] in (_DRAWN, _LOST):
+                break
+            if time_limit is not None and time.perf_counter() - start >= time_limit:
+                break
+        self.seconds = time.perf_counter() - start
+        moves = self.root_moves()
+        if len(moves) == 0:
+            return None
+        return moves[0][0]
+
+    def root_moves(self):
+        """
+        Returns a (move, visits, value, prior) tuple for each move from the root of the last
+        search, sorted by descending visits, where the value is the average result
+        for the player making the move, from -1 (loss) to 1 (win)
+        """
+        moves = []
+        if self._state[0] != _EXPANDED:
+            return moves
+        first = self._first_child[0]
+        for child in range(first, first + self._child_count[0]):
+            visits = self._visits[child]
+            moves.append((
+                unpack_move(self._move[child]), visits,
+                self._value[child] / visits if visits else 0.0, self._prior[child]))
+        moves.sort(key=lambda move: (move[1], move[3]), reverse=True)
+        return moves
+
+    def principal_variation(self):
+        """Returns the line of most visited moves from the root of the last search, in uci format"""
+        line = []
+        node = 0
+        while self._state[node] == _EXPANDED:
+            first = self._first_child[node]
+            node = max(range(first, first + self._child_count[node]),
+                       key=lambda child: self._visits[child])
+            if self._visits[node] == 0:
+                break
+            line.append(unpack_move(self._move[node]))
+        return line
+
+    def stats(self):
+        """
+        Returns a dict of the keys nodes, max_nodes, visits, seconds, visits_per_second,
+        bytes_per_node and memory (the bytes allocated for the tree)
+        """
+        visits = self._visits[0] if self.root is not None else 0
+        return {
+            'nodes': self.nodes,
+            'max_nodes': self.max_nodes,
+            'visits': visits,
+            'seconds': round(self.seconds, 3),
+            'visits_per_second': round(visits / self.seconds) if self.seconds else None,
+            'bytes_per_node': NODE_SIZE,
+            'memory': NODE_SIZE * self.max_nodes
+            }
+
+    def _run_batch(self, size):
+        """Selects up to size leaves, evaluates them together and backs up their values"""
+        pending = []
+        for _ in range(size):
+            path, board = self._select()
+            for node in path:
+                self._virtual_loss[node] += 1
+            state = self._state[path[-1]]
+            if state == _LOST:
+                pending.append((path, -1.0))
+            elif state == _DRAWN:
+                pending.append((path, 0.0))
+            else:
+                pending.append((path, board))
+
+        boards = [leaf for path, leaf in pending if isinstance(leaf, Board)]
+        scores = iter(evaluate_batch(boards))
+        for path, leaf in pending:
+            if isinstance(leaf, Board):
+                value = _value(leaf, next(scores)['score'])
+            else:
+                value = leaf
+            # a node's value is from the point of view of the player who moved into it,
+            # the opponent of the player to move in its position
+            for node in reversed(path):
+                value = -value
+                self._virtual_loss[node] -= 1
+                self._visits[node] += 1
+                self._value[node] += value
+
+    def _select(self):
+        """Follows the PUCT rule from the root to a leaf, expanding it, and returns the path and leaf position"""
+        node = 0
+        board = self.root.copy()
+        path = [0]
+        while self._state[node] == _EXPANDED:
+            node = self._best_child(node)
+            board.make_move(unpack_move(self._move[node]))
+            path.append(node)
+        if self._state[node] == _UNEXPANDED:
+            self._expand(node, board)
+        return path, board
+
+    def _best_child(self, node):
+        """Returns the child of an expanded node with the highest PUCT score"""
+        parent_visits = self._visits[node] + self._virtual_loss[node]
+        scale = self.exploration * math.sqrt(max(1, parent_visits))
+        first = self._first_child[node]
+        best = first
+        best_score = None
+        for child in range(first, first + self._child_count[node]):
+            # virtual losses count as visits which lost
+            visits = self._visits[child] + self._virtual_loss[child]
+            value = 0.0
+            if visits:
+                value = (self._value[child] - self._virtual_loss[child]) / visits
+            score = value + scale * self._prior[child] / (1 + visits)
+            if best_score is None or score > best_score:
+                best = child
+                best_score = score
+        return best
+
+    def _expand(self, node, board):
+        """Marks a leaf as finished, or gives it a child for each legal move if the tree has room"""
+        moves = board.legal_moves()
+        if len(moves) == 0:
+            self._state[node] = _LOST if board.is_check() else _DRAWN
+        elif board.half_moves >= 100 or board.insufficient_material():
+            self._state[node] = _DRAWN
+        elif self.nodes + len(moves) <= self.max_nodes:
+            first = self.nodes
+            for i, (move, prior) in enumerate(zip(moves, self.policy(board, moves))):
+                self._reset(first + i, pack_move(move), prior)
+            self._first_child[node] = first
+            self._child_count[node] = len(moves)
+            self._state[node] = _EXPANDED
+            self.nodes += len(moves)
+
+    def _reset(self, node, move, prior):
+        """Clears a node for reuse"""
+        self._first_child[node] = 0
+        self._child_count[node] = 0
+        self._move[node] = move
+        self._state[node] = _UNEXPANDED
+        self._visits[node] = 0
+        self._virtual_loss[node] = 0
+        self._value[node] = 0.0
+        self._prior[node] = prior
+
+
+def heuristic_policy(board, moves):
+    """
+    Prior probabilities for moves which favour winning the most material,
+    as a softmax over the value each move captures or promotes to.
+
+    Parameters:
+        board(Board): The position
+
+        moves(list): Its legal moves in uci format
+
+    Returns:
+        (list): The prior of each move, adding up to 1
+    """
+    weights = [math.exp((capture_value(board, move) or 0) / PRIOR_TEMPERATURE) for move in moves]
+    total = sum(weights)
+    return [weight / total for weight in weights]
+
+
+def _value(board, score):
+    """
+    Returns a static evaluation from white's point of view, plus the pawn structure,
+    as an expected result from -1 to 1 for the player to move
+    """
+    score += PAWN_TABLE.score(board)
+    if board.current_player == 'black':
+        score = -score
+    return 2 / (1 + 10 ** (-score / VALUE_SCALE)) - 1
+
+
+def main(arguments=None):
+    """Search a position from the command line and print the result as JSON"""
+    parser = argparse.ArgumentParser(
+        prog='python -m modules.mcts', description='Search a position with Monte Carlo tree search')
+    parser.add_argument('--fen', help='the position (default: the starting position)')
+    parser.add_argument('--visits', type=int, default=DEFAULT_VISITS)
+    parser.add_argument('--time', type=float, help='seconds to stop after')
+    parser.add_argument(
+        '--memory', type=int, default=DEFAULT_MEMORY >> 20, help='tree size in megabytes')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args(arguments)
+
+    board = Board()
+    if args.fen is not None and not board.load(args.fen):
+        parser.error('invalid FEN')
+    search = MCTS(args.memory << 20, args.batch_size)
+    move = search.search(board, args.visits, args.time)
+    report = {
+        'best_move': move,
+        'notation': board.move_notation(move) if move else None,
+        'principal_variation': search.principal_variation(),
+        'moves': [
+            {'move': move, 'visits': visits, 'value': round(value, 3), 'prior': round(prior, 3)}
+            for move, visits, value, prior in search.root_moves()[:10]],
+        'stats': search.stats()
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
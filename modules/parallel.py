@@ -0,0 +1,63 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from modules.evaluation import evaluate
+
+MODES = ['threads', 'processes']
+
+
+def gil_enabled():
+    """Returns a bool indicating whether the global interpreter lock is on, as it always is before Python 3.13"""
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return True if is_gil_enabled is None else is_gil_enabled()
+
+
+def analyse_position(board):
+    """
+    Work out the legal moves, their notation, the game status and the static evaluation
+    of a position. Only read operations are used, so the same Board can be analysed
+    by several threads at once.
+
+    Parameters:
+        board(Board): The position
+
+    Returns:
+        (dict): The keys fen, moves (a dict from each legal move in uci format
+            to its algebraic notation), status (as Board.game_status)
+            and score (in centipawns from white's point of view)
+    """
+    return {
+        'fen': board.output_fen(),
+        'moves': {move: board.move_notation(move) for move in board.legal_moves()},
+        'status': board.game_status(),
+        'score': evaluate(board)['score']
+        }
+
+
+def analyse_positions(boards, workers=None, mode='threads'):
+    """
+    Analyse many positions with analyse_position on a pool of threads or processes.
+    Threads share the Board objects without copying them, while processes are sent
+    a pickled copy of each. Threads only run in parallel on a free-threaded Python build.
+
+    Parameters:
+        boards(list): The positions
+
+        workers(int): The number of threads or processes (optional, defaults to one per CPU).
+            With one worker the positions are analysed in this thread
+
+        mode(str): One of MODES
+
+    Returns:
+        (list): The result of analyse_position for each position, in order
+    """
+    if mode not in MODES:
+        raise ValueError('Unknown mode: ' + str(mode))
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1:
+        return [analyse_position(board) for board in boards]
+    pool = ThreadPoolExecutor if mode == 'threads' else ProcessPoolExecutor
+    with pool(max_workers=workers) as executor:
+        return list(executor.map(analyse_position, boards))
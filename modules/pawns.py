@@ -0,0 +1,141 @@
+from array import array
+
+DEFAULT_MEMORY = 1 << 20
+
+# Each slot of a PawnTable is one 64 bit entry: the high 32 bits of the pawn key
+# it was stored for and the score as a 32 bit two's complement number
+_SCORE_BITS = 32
+_SCORE_MASK = (1 << _SCORE_BITS) - 1
+_SIGN_BIT = 1 << (_SCORE_BITS - 1)
+
+DOUBLED_PENALTY = 10
+ISOLATED_PENALTY = 15
+BACKWARD_PENALTY = 8
+# The bonus for a passed pawn by rank, counted from its own side
+PASSED_BONUS = [0, 0, 10, 15, 25, 40, 70, 110, 0]
+
+
+def evaluate_pawns(board):
+    """
+    Evaluate the pawn structure of a position. Only the pawns are considered,
+    so the result can be shared by every position with the same Board.pawn_key.
+
+    Parameters:
+        board(Board): The position
+
+    Returns:
+        (dict): The key score (in centipawns from white's point of view) and,
+            for each of passed, isolated, doubled and backward, a dict from
+            each color to a sorted list of the squares of its pawns of that kind
+    """
+    files = {'white': {}, 'black': {}}
+    for color in files:
+        for square, piece in board.pieces[color].items():
+            if piece.symbol == 'p':
+                files[color].setdefault(ord(square[0]) - 97, []).append(int(square[1]))
+
+    result = {kind: {'white': [], 'black': []}
+              for kind in ('passed', 'isolated', 'doubled', 'backward')}
+    score = 0
+    for color, sign, forward in (('white', 1, 1), ('black', -1, -1)):
+        own = files[color]
+        enemy = files[board.opponents[color]]
+        for file, ranks in own.items():
+            adjacent = [rank for f in (file - 1, file + 1) for rank in own.get(f, [])]
+            for rank in ranks:
+                square = chr(file + 97) + str(rank)
+                relative_rank = rank if color == 'white' else 9 - rank
+                if len(ranks) > 1:
+                    result['doubled'][color].append(square)
+                if len(adjacent) == 0:
+                    result['isolated'][color].append(square)
+                elif _backward(rank, forward, adjacent, file, enemy):
+                    result['backward'][color].append(square)
+                if not any((r - rank) * forward > 0
+                           for f in (file - 1, file, file + 1) for r in enemy.get(f, [])):
+                    result['passed'][color].append(square)
+                    score += sign * PASSED_BONUS[relative_rank]
+            score -= sign * DOUBLED_PENALTY * (len(ranks) - 1)
+        score -= sign * ISOLATED_PENALTY * len(result['isolated'][color])
+        score -= sign * BACKWARD_PENALTY * len(result['backward'][color])
+
+    for kind in result:
+        for color in result[kind]:
+            result[kind][color].sort()
+    result['score'] = score
+    return result
+
+
+def _backward(rank, forward, adjacent, file, enemy):
+    """
+    Returns a bool indicating whether a pawn is backward: every pawn of its own side
+    on the neighbouring files is further advanced, and an enemy pawn controls
+    the square in front of it
+    """
+    if any((r - rank) * forward <= 0 for r in adjacent):
+        return False
+    stop = rank + forward
+    return any(r == stop + forward for f in (file - 1, file + 1) for r in enemy.get(f, []))
+
+
+class PawnTable:
+    """
+    A fixed size hash table of pawn structure scores, indexed by Board.pawn_key.
+    Each slot holds part of one key and its score, and a new structure simply replaces
+    whatever was stored in its slot. Both are written together as a single array item,
+    so threads sharing a table never read a key with another structure's score.
+    """
+
+    def __init__(self, memory=DEFAULT_MEMORY):
+        """
+        Initializes an empty table.
+
+        Parameters:
+            memory(int): The number of bytes to use for the table
+        """
+        self.slots = max(1, memory // 8)
+        self.hits = 0
+        self.misses = 0
+        # pawnless positions have a key of 0 and a score of 0,
+        # so the empty slots never give a wrong answer
+        self._entries = array('Q', bytes(8 * self.slots))
+
+    def score(self, board):
+        """
+        Get the pawn structure score of a position, as given by evaluate_pawns.
+
+        Parameters:
+            board(Board): The position
+
+        Returns:
+            (int): The score in centipawns from white's point of view
+        """
+        key = board.pawn_key
+        slot = key % self.slots
+        entry = self._entries[slot]
+        if entry >> _SCORE_BITS == key >> _SCORE_BITS:
+            self.hits += 1
+            score = entry & _SCORE_MASK
+            return score - (score & _SIGN_BIT) * 2
+        self.misses += 1
+        score = evaluate_pawns(board)['score']
+        self._entries[slot] = key >> _SCORE_BITS << _SCORE_BITS | score & _SCORE_MASK
+        return score
+
+    def stats(self):
+        """
+        Returns a dict of the keys slots, memory (in bytes), hits, misses and hit_rate
+        (the fraction of lookups which found their structure, or None before any lookup)
+        """
+        lookups = self.hits + self.misses
+        return {
+            'slots': self.slots,
+            'memory': self._entries.itemsize * self.slots,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else None
+            }
+
+
+# The table used by the search's static evaluation
+PAWN_TABLE = PawnTable()
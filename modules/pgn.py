@@ -0,0 +1,157 @@
+import re
+
+from modules.boards import Board
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+RESULTS = ['1-0', '0-1', '1/2-1/2', '*']
+LINE_LENGTH = 80
+
+_TAG = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+_TOKEN = re.compile(r'\s*([{};()]|[^\s{};()]+)')
+_MOVE_NUMBER = re.compile(r'^\d+\.*')
+
+
+def write_game(moves, fen=None, headers=None, result='*', nags=None, comments=None):
+    """
+    Get the PGN text for a game.
+
+    Parameters:
+        moves(list): The moves of the game in uci format
+
+        fen(str): The starting position (optional, defaults to the standard start)
+
+        headers(dict): Tag pairs to add to or replace the seven tag roster (optional)
+
+        result(str): One of 1-0, 0-1, 1/2-1/2 or *
+
+        nags(list): A numeric annotation glyph for each move e.g. 2 for a mistake,
+            or None for no glyph (optional)
+
+        comments(list): A comment for each move, or None for no comment (optional)
+
+    Returns:
+        (str): The game in PGN, ending with a blank line
+    """
+    tags = {
+        'Event': '?', 'Site': '?', 'Date': '????.??.??', 'Round': '?',
+        'White': '?', 'Black': '?', 'Result': result}
+    if fen is not None and fen != START_FEN:
+        tags['SetUp'] = '1'
+        tags['FEN'] = fen
+    if headers is not None:
+        tags.update(headers)
+
+    lines = []
+    for name, value in tags.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"')
+        lines.append('[' + name + ' "' + value + '"]')
+    lines.append('')
+
+    board = Board(fen)
+    tokens = []
+    for i, move in enumerate(moves):
+        if board.current_player == 'white':
+            tokens.append(str(board.turn) + '.')
+        elif i == 0:
+            tokens.append(str(board.turn) + '...')
+        notation = board.move_notation(move)
+        if notation is None:
+            raise ValueError('Illegal move: ' + move)
+        tokens.append(notation)
+        if nags is not None and nags[i] is not None:
+            tokens.append('$' + str(nags[i]))
+        if comments is not None and comments[i] is not None:
+            tokens.append('{' + comments[i].replace('}', ')') + '}')
+        board.make_move(move)
+    tokens.append(result)
+
+    line = ''
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > LINE_LENGTH:
+            lines.append(line)
+            line = token
+        elif line:
+            line += ' ' + token
+        else:
+            line = token
+    lines.append(line)
+    return '\n'.join(lines) + '\n\n'
+
+
+def read_games(lines):
+    """
+    Read the games from PGN text. Comments, variations and numeric annotation glyphs
+    are skipped.
+
+    Parameters:
+        lines(iterable): The lines of the PGN text, such as an open file
+
+    Returns:
+        (generator): A dict for each game with the keys headers (a dict of its tag pairs),
+            moves (a list of its moves in algebraic notation, as written)
+            and result (one of RESULTS)
+    """
+    game = None
+    comment = False
+    variation = 0
+    for line in lines:
+        if not comment and variation == 0:
+            if line.startswith('%'):
+                continue
+            tag = _TAG.match(line.strip())
+            if tag is not None:
+                # tags after moves start the next game, even without a result
+                if game is not None and len(game['moves']) > 0:
+                    yield _finish(game)
+                    game = None
+                if game is None:
+                    game = {'headers': {}, 'moves': [], 'result': None}
+                game['headers'][tag.group(1)] = re.sub(r'\\(.)', r'\1', tag.group(2))
+                continue
+
+        position = 0
+        while position < len(line):
+            if comment:
+                end = line.find('}', position)
+                if end == -1:
+                    break
+                comment = False
+                position = end + 1
+                continue
+            match = _TOKEN.match(line, position)
+            if match is None:
+                break
+            position = match.end()
+            token = match.group(1)
+            if token == '{':
+                comment = True
+            elif token == ';':
+                break
+            elif token == '(':
+                variation += 1
+            elif token == ')':
+                variation = max(0, variation - 1)
+            elif variation > 0 or token.startswith('$'):
+                continue
+            elif token in RESULTS:
+                if game is None:
+                    game = {'headers': {}, 'moves': [], 'result': None}
+                game['result'] = token
+                yield _finish(game)
+                game = None
+            else:
+                token = _MOVE_NUMBER.sub('', token)
+                if token != '':
+                    if game is None:
+                        game = {'headers': {}, 'moves': [], 'result': None}
+                    game['moves'].append(token)
+    if game is not None:
+        yield _finish(game)
+
+
+def _finish(game):
+    """Returns a game from read_games, taking its result from the Result tag if it had none"""
+    if game['result'] is None:
+        result = game['headers'].get('Result', '*')
+        game['result'] = result if result in RESULTS else '*'
+    return game
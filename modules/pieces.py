@@ -1,3 +1,6 @@
+from modules.tables import RAY_SQUARES
+
+
 class _Piece:
     """The base class for all pieces"""
 
@@ -24,49 +27,15 @@ class _Piece:
             board(Board): The board object upon which this piece exists
 
             captures_only(bool): Whether the returned value should only include capturing moves
-                (useful for considering whether a pawn is giving check)
+                and pawn promotions (useful for quiescence search and exchange evaluation)
 
         Returns:
             (list): A list of moves in uci format.
         """
         return self._moves(location, board, captures_only)
 
-    @staticmethod
-    def _next_sq_in_direction(square, direction):
-        """
-        Finds the name of the next square in a given compass direction.
-
-        Parameters:
-            square(str): The name of the starting square e.g. e2
-
-            direction(str): The compass direction to move in, abbreviated to 1 or 2 letters
-                e.g. n, ne, sw, etc.
-
-        Returns:
-            (str): The name of the next square in the given direction
-                e.g. ne from d2 is e3
-                Can return non-real squares e.g. i9
-        """
-        if 'n' in direction: 
-            vertical = 1
-        elif 's' in direction: 
-            vertical = -1
-        else: 
-            vertical = 0
-
-        if 'e' in direction: 
-            horizontal = 1
-        elif 'w' in direction: 
-            horizontal = -1
-        else: 
-            horizontal = 0
-
-        x = ord(square[0]) + horizontal - 96
-        y = int(square[1]) + vertical
-        return x, y
-
     @classmethod
-    def _bqr_moves(cls, current_square, squares, color, directions):
+    def _bqr_moves(cls, current_square, squares, color, directions, captures_only=False):
         """
         Finds all the possible moves, including illegal moves, in a given set of directions
 
@@ -82,6 +51,8 @@ class _Piece:
             directions(list): A list of compass directions, abbreviated to 1 or 2 letters
                 e.g. [ne, se, nw, sw] for a bishop
 
+            captures_only(bool): Whether to only include moves which capture a piece
+
         Returns:
             (str): The name of the next square in the given direction
                 e.g. ne from d2 is e3
@@ -89,27 +60,21 @@ class _Piece:
         """
         moves_list = []
         for dir in directions:
-            previous = current_square
-
-            for i in range(10):
-                x, y = cls._next_sq_in_direction(previous, dir)
-                if x < 1 or y < 1 or x > 8 or y > 8: 
+            for destination in RAY_SQUARES[dir][current_square]:
+                piece = squares.get(destination)
+                if piece is not None and piece.color == color: 
                     break
-                destination = chr(x + 96) + str(y)
-                if (squares.get(destination) is not None and
-                   squares.get(destination).color == color): 
+                if piece is not None or not captures_only:
+                    moves_list.append(current_square + destination)
+                if piece is not None:
                     break
-                move = current_square + destination
-                moves_list.append(move)
-                if (squares.get(destination) is not None):
-                    break
-                previous = destination
         return moves_list
 
 
 class Pawn(_Piece):
     """A pawn"""
     symbol = 'p'
+    value = 100
 
     def _moves(self, square, board, captures_only):
         """
@@ -122,6 +87,7 @@ class Pawn(_Piece):
             board(Board): The board object upon which this piece exists
 
             captures_only(bool): Whether the returned value should only include capturing moves
+                and pawn promotions
 
         Returns:
             (list): A list of moves in uci format.
@@ -144,7 +110,7 @@ class Pawn(_Piece):
             chr(ord(square[0]) - 1) + str(int(square[1]) + y)]
 
         if (board.squares.get(single) is None and
-            not captures_only):
+            (not captures_only or single[1] in '18')):
             move = square + single
             move_list.append(move)
 
@@ -171,6 +137,7 @@ class Pawn(_Piece):
 class Knight(_Piece):
     """A Knight"""
     symbol = 'n'
+    value = 320
 
     def _moves(self, current_square, board, captures_only):
         """
@@ -183,6 +150,7 @@ class Knight(_Piece):
             board(Board): The board object upon which this piece exists
 
             captures_only(bool): Whether the returned value should only include capturing moves
+                and pawn promotions
 
         Returns:
             (list): A list of moves in uci format.
@@ -206,6 +174,8 @@ class Knight(_Piece):
                 continue
             if not piece is None and piece.color == self.color:
                 continue
+            if piece is None and captures_only:
+                continue
             move = current_square + destination
             moves_list.append(move)
 
@@ -215,6 +185,8 @@ class Knight(_Piece):
 class Bishop(_Piece):
     """A Bishop"""
     symbol = 'b'
+    value = 330
+    directions = ['ne', 'nw', 'se', 'sw']
 
     def _moves(self, square, board, captures_only):
         """
@@ -227,18 +199,21 @@ class Bishop(_Piece):
             board(Board): The board object upon which this piece exists
 
             captures_only(bool): Whether the returned value should only include capturing moves
+                and pawn promotions
 
         Returns:
             (list): A list of moves in uci format.
         """
-        move_dir = ['ne', 'nw', 'se', 'sw']
-        moves = self._bqr_moves(square, board.squares, self.color, move_dir)
+        moves = self._bqr_moves(
+            square, board.squares, self.color, self.directions, captures_only)
         return moves
 
 
 class Rook(_Piece):
     """A Rook"""
     symbol = 'r'
+    value = 500
+    directions = ['n', 'e', 's', 'w']
 
     def _moves(self, square, board, captures_only):
         """
@@ -251,18 +226,21 @@ class Rook(_Piece):
             board(Board): The board object upon which this piece exists
 
             captures_only(bool): Whether the returned value should only include capturing moves
+                and pawn promotions
 
         Returns:
             (list): A list of moves in uci format.
         """
-        move_dir = ['n', 'e', 's', 'w']
-        moves = self._bqr_moves(square, board.squares, self.color, move_dir)
+        moves = self._bqr_moves(
+            square, board.squares, self.color, self.directions, captures_only)
         return moves
 
 
 class Queen(_Piece):
     """A Queen"""
     symbol = 'q'
+    value = 900
+    directions = ['n', 'e', 's', 'w', 'ne', 'nw', 'se', 'sw']
 
     def _moves(self, square, board, captures_only):
         """
@@ -275,18 +253,20 @@ class Queen(_Piece):
             board(Board): The board object upon which this piece exists
 
             captures_only(bool): Whether the returned value should only include capturing moves
+                and pawn promotions
 
         Returns:
             (list): A list of moves in uci format.
         """
-        move_dir = ['n', 'e', 's', 'w', 'ne', 'nw', 'se', 'sw']
-        moves = self._bqr_moves(square, board.squares, self.color, move_dir)
+        moves = self._bqr_moves(
+            square, board.squares, self.color, self.directions, captures_only)
         return moves
 
 
 class King(_Piece):
     """A King"""
     symbol = 'k'
+    value = 0
 
     def _moves(self, square, board, captures_only):
         """
@@ -299,6 +279,7 @@ class King(_Piece):
             board(Board): The board object upon which this piece exists
 
             captures_only(bool): Whether the returned value should only include capturing moves
+                and pawn promotions
 
         Returns:
             (list): A list of moves in uci format.
@@ -322,47 +303,54 @@ class King(_Piece):
                 continue
             if not piece is None and piece.color == self.color:
                 continue
+            if piece is None and captures_only:
+                continue
             move = square + destination
             moves_list.append(move)
 
+        # castling is only possible when the king, the square it passes over and the
+        # square it lands on are not attacked
+        opponent = board.opponents[self.color]
         if (self.color == 'black' and
                 not captures_only and
                 board.castling_bk and
-                not board.is_check() and 
                 board.squares.get('f8') is None and
                 board.squares.get('g8') is None and 
-                not board._move_puts_self_in_check('e8f8') and
-                not board._move_puts_self_in_check('e8g8')):
+                not board.attackers('e8', opponent) and
+                not board.attackers('f8', opponent) and
+                not board.attackers('g8', opponent)):
             moves_list.append('e8g8')
 
         if (self.color == 'black' and
                 not captures_only and
                 board.castling_bq and
-                not board.is_check() and 
                 board.squares.get('d8') is None and
+                board.squares.get('c8') is None and
                 board.squares.get('b8') is None and 
-                not board._move_puts_self_in_check('e8d8') and
-                not board._move_puts_self_in_check('e8c8')):
+                not board.attackers('e8', opponent) and
+                not board.attackers('d8', opponent) and
+                not board.attackers('c8', opponent)):
             moves_list.append('e8c8')
 
         if (self.color == 'white' and
                 not captures_only and
                 board.castling_wk and
-                not board.is_check() and 
                 board.squares.get('f1') is None and
                 board.squares.get('g1') is None and 
-                not board._move_puts_self_in_check('e1f1') and
-                not board._move_puts_self_in_check('e1g1')):
+                not board.attackers('e1', opponent) and
+                not board.attackers('f1', opponent) and
+                not board.attackers('g1', opponent)):
             moves_list.append('e1g1')
 
         if (self.color == 'white' and
                 not captures_only and
                 board.castling_wq and
-                not board.is_check() and 
                 board.squares.get('d1') is None and
+                board.squares.get('c1') is None and
                 board.squares.get('b1') is None and 
-                not board._move_puts_self_in_check('e1d1') and
-                not board._move_puts_self_in_check('e1c1')):
+                not board.attackers('e1', opponent) and
+                not board.attackers('d1', opponent) and
+                not board.attackers('c1', opponent)):
             moves_list.append('e1c1')
 
         return moves_list
\ No newline at end of file
@@ -0,0 +1,178 @@
+import mmap
+import struct
+
+from modules.tables import RANDOM_ARRAY
+
+# Offsets into RANDOM_ARRAY of each part of a key
+_PIECE_OFFSET = 0
+_CASTLE_OFFSET = 768
+_EN_PASSANT_OFFSET = 772
+_TURN_OFFSET = 780
+
+# Polyglot orders pieces as black pawn, white pawn, black knight, white knight, etc.
+_PIECE_KINDS = {
+    (symbol, color): 2 * i + (color == 'white')
+    for i, symbol in enumerate('pnbrqk')
+    for color in ('black', 'white')}
+
+_PROMOTIONS = ['', 'n', 'b', 'r', 'q']
+_CASTLING_MOVES = {'e1h1': 'e1g1', 'e1a1': 'e1c1', 'e8h8': 'e8g8', 'e8a8': 'e8c8'}
+_ENTRY = struct.Struct('>QHHI')
+
+
+def zobrist_key(board):
+    """
+    Returns the Polyglot hash key of a position, as used to index opening books.
+
+    Parameters:
+        board(Board): The position to hash
+    """
+    key = 0
+    for square, piece in board.squares.items():
+        kind = _PIECE_KINDS[(piece.symbol, piece.color)]
+        row = int(square[1]) - 1
+        file = ord(square[0]) - 97
+        key ^= RANDOM_ARRAY[_PIECE_OFFSET + 64 * kind + 8 * row + file]
+
+    if board.castling_wk:
+        key ^= RANDOM_ARRAY[_CASTLE_OFFSET]
+    if board.castling_wq:
+        key ^= RANDOM_ARRAY[_CASTLE_OFFSET + 1]
+    if board.castling_bk:
+        key ^= RANDOM_ARRAY[_CASTLE_OFFSET + 2]
+    if board.castling_bq:
+        key ^= RANDOM_ARRAY[_CASTLE_OFFSET + 3]
+
+    # the en passant file only counts when a pawn is actually able to capture there
+    if board.ghost_pawn is not None:
+        file = ord(board.ghost_pawn[0])
+        rank = '5' if board.current_player == 'white' else '4'
+        for adjacent in (chr(file - 1) + rank, chr(file + 1) + rank):
+            piece = board.squares.get(adjacent)
+            if (piece is not None and
+                    piece.symbol == 'p' and
+                    piece.color == board.current_player):
+                key ^= RANDOM_ARRAY[_EN_PASSANT_OFFSET + file - 97]
+                break
+
+    if board.current_player == 'white':
+        key ^= RANDOM_ARRAY[_TURN_OFFSET]
+    return key
+
+
+class Book:
+    """
+    A Polyglot (.bin) opening book. The file is memory-mapped and searched
+    in place, so books of any size open instantly and use little memory.
+    """
+
+    def __init__(self, path):
+        """
+        Opens a book.
+
+        Parameters:
+            path(str): The path to the .bin file
+        """
+        with open(path, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.size = len(self._map) // _ENTRY.size
+
+    def __enter__(self):
+        """Returns the book for use in a with statement"""
+        return self
+
+    def __exit__(self, *args):
+        """Closes the book at the end of a with statement"""
+        self.close()
+
+    def close(self):
+        """Closes the underlying file"""
+        self._map.close()
+
+    def entries(self, board):
+        """
+        Finds the book entries for a position.
+
+        Parameters:
+            board(Board): The position to look up
+
+        Returns:
+            (list): A (move, weight) tuple for each entry, with the move in uci format,
+                sorted by descending weight
+        """
+        key = zobrist_key(board)
+        # binary search for the first entry with this key
+        low = 0
+        high = self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        entries = []
+        index = low
+        while index < self.size and self._key(index) == key:
+            entry_key, move, weight, learn = _ENTRY.unpack_from(self._map, index * _ENTRY.size)
+            entries.append((self._decode_move(board, move), weight))
+            index += 1
+        entries.sort(key=lambda entry: entry[1], reverse=True)
+        return entries
+
+    def moves(self, board):
+        """
+        Finds the legal book moves for a position.
+
+        Parameters:
+            board(Board): The position to look up
+
+        Returns:
+            (list): A (move, weight) tuple for each legal book move, sorted by descending weight
+        """
+        return [
+            (move, weight) for move, weight in self.entries(board)
+            if board.is_move_legal(move)]
+
+    def _key(self, index):
+        """Returns the key of the entry at an index"""
+        return struct.unpack_from('>Q', self._map, index * _ENTRY.size)[0]
+
+    @staticmethod
+    def _decode_move(board, move):
+        """Converts a Polyglot move to uci format"""
+        to_square = chr(97 + (move & 7)) + str(((move >> 3) & 7) + 1)
+        from_square = chr(97 + ((move >> 6) & 7)) + str(((move >> 9) & 7) + 1)
+        uci_move = from_square + to_square + _PROMOTIONS[(move >> 12) & 7]
+        # castling is stored as the king capturing its own rook
+        piece = board.squares.get(from_square)
+        if piece is not None and piece.symbol == 'k' and uci_move in _CASTLING_MOVES:
+            uci_move = _CASTLING_MOVES[uci_move]
+        return uci_move
+
+
+def encode_entry(key, uci_move, weight, learn=0):
+    """
+    Packs a single 16 byte Polyglot book entry, for building books.
+    Castling moves must already be given as the king capturing its rook e.g. e1h1
+
+    Parameters:
+        key(int): The zobrist_key of the position
+
+        uci_move(str): The move in uci format
+
+        weight(int): The weight of the move, between 0 and 65535
+
+        learn(int): The learning data, which is ignored by this module
+
+    Returns:
+        (bytes): The packed entry
+    """
+    move = (
+        (ord(uci_move[2]) - 97) |
+        (int(uci_move[3]) - 1) << 3 |
+        (ord(uci_move[0]) - 97) << 6 |
+        (int(uci_move[1]) - 1) << 9)
+    if len(uci_move) == 5:
+        move |= _PROMOTIONS.index(uci_move[4]) << 12
+    return _ENTRY.pack(key, move, weight, learn)
@@ -0,0 +1,88 @@
+import threading
+
+from modules.boards import Board
+from modules.cache import POSITION_CACHE
+from modules.search import Search
+
+DEFAULT_MAX_DEPTH = 5
+
+
+class Ponderer:
+    """
+    Analyses a position on a background thread: the legal moves, the notation of
+    every move and the game status go into the position cache, followed by an
+    iteratively deepening search for the best move.
+    """
+
+    def __init__(self, max_depth=DEFAULT_MAX_DEPTH, cache=POSITION_CACHE):
+        """
+        Initializes the ponderer. Nothing is analysed until start is called.
+
+        Parameters:
+            max_depth(int): The deepest search, in plies
+
+            cache(PositionCache): The cache to fill with moves, notation and game status
+        """
+        self.max_depth = max_depth
+        self.cache = cache
+        self.fen = None
+        self.result = None
+        self._search = None
+        self._thread = None
+
+    def start(self, board):
+        """
+        Stop any analysis in progress and start analysing a position.
+
+        Parameters:
+            board(Board): The position. The analysis uses its own copy,
+                so the board can be changed while it runs
+        """
+        self.stop()
+        self.fen = board.output_fen()
+        self.result = None
+        self._search = Search()
+        # a new Board shares no pieces with the one being played on
+        self._thread = threading.Thread(
+            target=self._run, args=(Board(self.fen), self._search), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the analysis in progress, waiting for the thread to finish"""
+        if self._thread is not None:
+            self._search.stop()
+            self._thread.join()
+            self._thread = None
+
+    def is_running(self):
+        """Returns a bool indicating whether the analysis is still in progress"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def best_move(self, board):
+        """
+        Get the result of the deepest search completed so far.
+
+        Parameters:
+            board(Board): The position the result is wanted for
+
+        Returns:
+            (tuple): The best move in uci format, its score in centipawns and the depth searched,
+                or None if no search has finished for this position
+        """
+        if self.fen != board.output_fen():
+            return None
+        return self.result
+
+    def _run(self, board, search):
+        """Analyses a position until everything is done or the search is stopped"""
+        for move in sorted(self.cache.legal_moves(board)):
+            if search.stopped:
+                return
+            self.cache.move_notation(board, move)
+        self.cache.game_status(board)
+
+        for depth in range(1, self.max_depth + 1):
+            move, score = search.best_move(board, depth)
+            if move is None:
+                return
+            self.result = (move, score, depth)
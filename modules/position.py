@@ -0,0 +1,208 @@
+from modules.boards import Board
+
+EMPTY = '.'
+
+# The castling right lost when a piece leaves or arrives on each square
+_CASTLING_SQUARES = {'e1': 'KQ', 'h1': 'K', 'a1': 'Q', 'e8': 'kq', 'h8': 'k', 'a8': 'q'}
+
+
+class Position:
+    """
+    An immutable chess position which can be hashed and shared between threads.
+    The board is a tuple of eight strings, one per rank from the 8th to the 1st,
+    with a FEN symbol or a dot per square. Playing a move only creates new strings
+    for the ranks it changes, so positions in an analysis tree share the rest.
+    """
+    __slots__ = (
+        'ranks', 'current_player', 'castling', 'ghost_pawn', 'half_moves', 'turn',
+        '_hash', '_legal_moves')
+
+    def __init__(self, fen=None):
+        """
+        Initializes a Position. If a FEN string is not provided, the starting position is used.
+
+        Parameters:
+            fen(str): A FEN string representing a chess position (optional)
+        """
+        if fen is None:
+            fen = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+        if not Board.is_fen_parseable(fen):
+            raise ValueError('Invalid FEN supplied')
+        fen_parts = fen.split(' ')
+        ranks = []
+        for row in fen_parts[0].split('/'):
+            rank = ''
+            for c in row:
+                if c.isnumeric():
+                    rank += EMPTY * int(c)
+                else:
+                    rank += c
+            ranks.append(rank)
+        ghost_pawn = None
+        if fen_parts[3] != '-':
+            ghost_pawn = fen_parts[3]
+        castling = fen_parts[2]
+        if castling == '-':
+            castling = ''
+        self._set(
+            tuple(ranks), 'white' if fen_parts[1] == 'w' else 'black', castling,
+            ghost_pawn, int(fen_parts[4]), int(fen_parts[5]))
+
+    @classmethod
+    def from_board(cls, board):
+        """
+        Get the position of a Board.
+
+        Parameters:
+            board(Board): The board. Later changes to it do not affect the position
+
+        Returns:
+            (Position): The position
+        """
+        return cls(board.output_fen())
+
+    def __setattr__(self, name, value):
+        """Positions cannot be changed once created"""
+        raise AttributeError('Position objects are immutable')
+
+    def __reduce__(self):
+        """Pickles and copies a position as its FEN, since __setattr__ cannot restore its slots"""
+        return Position, (self.fen,)
+
+    def __eq__(self, other):
+        """Returns a bool indicating whether two positions are identical, including the move counters"""
+        if not isinstance(other, Position):
+            return NotImplemented
+        return self._state() == other._state()
+
+    def __hash__(self):
+        """Returns a hash of the position, computed once"""
+        return self._hash
+
+    def __repr__(self):
+        """Returns the FEN of the position"""
+        return '<Position ' + self.fen + '>'
+
+    def __str__(self):
+        """
+        Returns an ASCII representation of the board, as Board does.
+        Empty squares are dots, white pieces are capital letters.
+        """
+        return '\n'.join(' '.join(rank) + ' ' for rank in self.ranks)
+
+    @property
+    def fen(self):
+        """The FEN string for the position"""
+        rows = []
+        for rank in self.ranks:
+            row = ''
+            empty_squares = 0
+            for symbol in rank:
+                if symbol == EMPTY:
+                    empty_squares += 1
+                    continue
+                if empty_squares > 0:
+                    row += str(empty_squares)
+                    empty_squares = 0
+                row += symbol
+            if empty_squares > 0:
+                row += str(empty_squares)
+            rows.append(row)
+        return ' '.join([
+            '/'.join(rows), self.current_player[0], self.castling or '-',
+            self.ghost_pawn or '-', str(self.half_moves), str(self.turn)])
+
+    def piece_at(self, square):
+        """
+        Get the piece on a square.
+
+        Parameters:
+            square(str): The name of the square e.g. e4
+
+        Returns:
+            (str): The FEN symbol of the piece, capital for white, or None if the square is empty
+        """
+        symbol = self.ranks[8 - int(square[1])][ord(square[0]) - 97]
+        if symbol == EMPTY:
+            return None
+        return symbol
+
+    def board(self):
+        """Returns a new Board with this position, for the queries Position does not provide"""
+        return Board(self.fen)
+
+    def legal_moves(self):
+        """Returns a tuple of the legal moves in uci format, computed once"""
+        if self._legal_moves is None:
+            object.__setattr__(self, '_legal_moves', tuple(self.board().legal_moves()))
+        return self._legal_moves
+
+    def play(self, uci_move):
+        """
+        Get the position after a move. This position is not changed.
+
+        Parameters:
+            uci_move(str): The move in uci format
+                e.g. e2e4 not e4, b2c3 not Nxc3, d7d8q not d8=Q
+
+        Returns:
+            (Position): The new position, or None if the move is not legal
+        """
+        if uci_move not in self.legal_moves():
+            return None
+        origin = uci_move[0:2]
+        destination = uci_move[2:4]
+        symbol = self.piece_at(origin)
+        pawn_move = symbol in 'Pp'
+        capture = self.piece_at(destination) is not None
+        changes = {origin: EMPTY, destination: symbol}
+
+        if len(uci_move) == 5:
+            promoted = uci_move[4]
+            changes[destination] = promoted.upper() if symbol.isupper() else promoted
+        if pawn_move and destination == self.ghost_pawn:
+            changes[destination[0] + origin[1]] = EMPTY
+            capture = True
+        if symbol in 'Kk' and abs(ord(destination[0]) - ord(origin[0])) == 2:
+            if destination[0] == 'g':
+                changes['h' + origin[1]] = EMPTY
+                changes['f' + origin[1]] = 'R' if symbol == 'K' else 'r'
+            else:
+                changes['a' + origin[1]] = EMPTY
+                changes['d' + origin[1]] = 'R' if symbol == 'K' else 'r'
+
+        ranks = list(self.ranks)
+        for square, new_symbol in changes.items():
+            row = 8 - int(square[1])
+            col = ord(square[0]) - 97
+            ranks[row] = ranks[row][:col] + new_symbol + ranks[row][col + 1:]
+
+        castling = self.castling
+        for square in (origin, destination):
+            for right in _CASTLING_SQUARES.get(square, ''):
+                castling = castling.replace(right, '')
+
+        ghost_pawn = None
+        if pawn_move and abs(int(destination[1]) - int(origin[1])) == 2:
+            ghost_pawn = origin[0] + str((int(origin[1]) + int(destination[1])) // 2)
+
+        position = Position.__new__(Position)
+        position._set(
+            tuple(ranks), Board.opponents[self.current_player], castling, ghost_pawn,
+            0 if pawn_move or capture else self.half_moves + 1,
+            self.turn + 1 if self.current_player == 'black' else self.turn)
+        return position
+
+    def _set(self, ranks, current_player, castling, ghost_pawn, half_moves, turn):
+        """Sets every attribute of a newly created position"""
+        for name, value in (
+                ('ranks', ranks), ('current_player', current_player), ('castling', castling),
+                ('ghost_pawn', ghost_pawn), ('half_moves', half_moves), ('turn', turn),
+                ('_legal_moves', None)):
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, '_hash', hash(self._state()))
+
+    def _state(self):
+        """Returns a tuple of everything that identifies the position"""
+        return (self.ranks, self.current_player, self.castling, self.ghost_pawn,
+                self.half_moves, self.turn)
@@ -0,0 +1,214 @@
+from modules.evaluation import evaluate
+from modules.pawns import PAWN_TABLE
+from modules.pieces import Pawn
+
+MATE_SCORE = 100000
+
+
+def order_moves(board, moves, use_see=False):
+    """
+    Sort moves so that the most promising are searched first.
+    Captures and promotions come first, ordered by the most valuable victim
+    then the least valuable attacker (MVV-LVA) or by static exchange evaluation,
+    followed by the remaining moves in their original order.
+
+    Parameters:
+        board(Board): The board the moves are played on
+
+        moves(list): Moves in uci format
+
+        use_see(bool): Whether to order captures by Board.see instead of MVV-LVA
+
+    Returns:
+        (list): The sorted moves
+    """
+    def key(move):
+        victim_value = capture_value(board, move)
+        if victim_value is None:
+            return (0, 0)
+        if use_see:
+            return (1, board.see(move))
+        attacker = board.squares[move[0:2]]
+        return (1, victim_value * 10 - attacker.value)
+    return sorted(moves, key=key, reverse=True)
+
+
+def capture_value(board, move):
+    """
+    Returns the material a move captures plus any promotion gain,
+    or None if the move is neither a capture nor a promotion.
+
+    Parameters:
+        board(Board): The board the move is played on
+
+        move(str): The move in uci format
+    """
+    piece = board.squares[move[0:2]]
+    captured = board.squares.get(move[2:4])
+    value = None
+    if captured is not None:
+        value = captured.value
+    elif isinstance(piece, Pawn) and move[2:4] == board.ghost_pawn:
+        value = Pawn.value
+    if len(move) == 5:
+        value = (value or 0) + board.types[move[4]].value - Pawn.value
+    return value
+
+
+class Search:
+    """A negamax alpha-beta search with quiescence over Board positions"""
+
+    def __init__(self, book=None):
+        """
+        Initializes the search with an empty node counter.
+
+        Parameters:
+            book(Book): A Polyglot opening book to consult before searching (optional)
+        """
+        self.nodes = 0
+        self.book = book
+        self.stopped = False
+
+    def stop(self):
+        """
+        Ask a search running in another thread to finish early, after which
+        best_move returns (None, None). A stopped search cannot be restarted.
+        """
+        self.stopped = True
+
+    def best_move(self, board, depth):
+        """
+        Find the best move for the current player.
+
+        Parameters:
+            board(Board): The position to search. This is not modified
+
+            depth(int): The number of plies to search before quiescence
+
+        Returns:
+            (tuple): The best move in uci format (or None if there are no legal moves)
+                and its score in centipawns from the current player's point of view.
+                Without legal moves the score is -MATE_SCORE for checkmate and 0 for stalemate.
+                The score is None when the move comes from the opening book
+        """
+        if self.book is not None:
+            book_moves = self.book.moves(board)
+            if len(book_moves) > 0:
+                return book_moves[0][0], None
+
+        best = None
+        alpha = -MATE_SCORE
+        try:
+            for move in order_moves(board, board.legal_moves()):
+                child = board.copy()
+                child.make_move(move)
+                score = -self.alpha_beta(child, depth - 1, -MATE_SCORE, -alpha, 1)
+                if best is None or score > alpha:
+                    best = move
+                    alpha = score
+            if best is None:
+                # checkmate or stalemate
+                return None, -MATE_SCORE if board.is_check() else 0
+        except _Stopped:
+            return None, None
+        return best, alpha
+
+    def alpha_beta(self, board, depth, alpha, beta, ply=0):
+        """
+        Score a position by searching every move to a fixed depth.
+
+        Parameters:
+            board(Board): The position to search
+
+            depth(int): The remaining plies to search before quiescence
+
+            alpha(int): The score the current player is already guaranteed
+
+            beta(int): The score the opponent is already guaranteed
+
+            ply(int): The distance from the root, used to prefer faster mates
+
+        Returns:
+            (int): The score in centipawns from the current player's point of view
+        """
+        if depth <= 0:
+            return self.quiescence(board, alpha, beta, ply)
+        self.nodes += 1
+        if self.stopped:
+            raise _Stopped()
+        moves = board.legal_moves()
+        if len(moves) == 0:
+            if board.is_check():
+                return -MATE_SCORE + ply
+            return 0
+        for move in order_moves(board, moves):
+            child = board.copy()
+            child.make_move(move)
+            score = -self.alpha_beta(child, depth - 1, -beta, -alpha, ply + 1)
+            if score >= beta:
+                return beta
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def quiescence(self, board, alpha, beta, ply=0):
+        """
+        Score a position by searching only captures and promotions until it is quiet,
+        so that the static evaluation is never taken in the middle of an exchange.
+        Captures which lose material according to Board.see are skipped.
+        When in check every evasion is searched instead.
+
+        Parameters:
+            board(Board): The position to search
+
+            alpha(int): The score the current player is already guaranteed
+
+            beta(int): The score the opponent is already guaranteed
+
+            ply(int): The distance from the root, used to prefer faster mates
+
+        Returns:
+            (int): The score in centipawns from the current player's point of view
+        """
+        self.nodes += 1
+        if self.stopped:
+            raise _Stopped()
+        in_check = board.is_check()
+        if in_check:
+            moves = board.legal_moves()
+            if len(moves) == 0:
+                return -MATE_SCORE + ply
+        else:
+            stand_pat = static_score(board)
+            if stand_pat >= beta:
+                return beta
+            if stand_pat > alpha:
+                alpha = stand_pat
+            moves = [
+                move for move in board.legal_moves(True)
+                if board.see(move) >= 0]
+
+        for move in order_moves(board, moves):
+            child = board.copy()
+            child.make_move(move)
+            score = -self.quiescence(child, -beta, -alpha, ply + 1)
+            if score >= beta:
+                return beta
+            if score > alpha:
+                alpha = score
+        return alpha
+
+
+class _Stopped(Exception):
+    """Raised inside the search when stop has been called"""
+
+
+def static_score(board):
+    """
+    Returns the static evaluation of a position, including the pawn structure,
+    from the current player's point of view
+    """
+    score = evaluate(board)['score'] + PAWN_TABLE.score(board)
+    if board.current_player == 'black':
+        score = -score
+    return score
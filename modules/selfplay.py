@@ -0,0 +1,273 @@
+import argparse
+import json
+import os
+import random
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from modules import pgn
+from modules.boards import Board
+from modules.search import capture_value
+from modules.tables import pack_move, unpack_move
+
+DEFAULT_MAX_PLIES = 500
+
+# Packed game files hold one record per game: the number of plies and the result
+# (an index into pgn.RESULTS) as a little-endian unsigned short and byte,
+# followed by each move as an unsigned short from tables.pack_move
+_GAME_HEADER = struct.Struct('<HB')
+
+
+def play_game(rng, fen=None, max_plies=DEFAULT_MAX_PLIES, weighted=False):
+    """
+    Play a game of random legal moves until the game is over.
+
+    Parameters:
+        rng(random.Random): The source of randomness
+
+        fen(str): The starting position (optional, defaults to the standard start)
+
+        max_plies(int): The number of plies after which the game is abandoned
+
+        weighted(bool): Whether to prefer captures and promotions,
+            in proportion to the material they win
+
+    Returns:
+        (dict): The keys moves (in uci format), result (as in PGN) and termination
+            (checkmate, stalemate, insufficient_material, fifty_moves, repetition or max_plies)
+    """
+    board = Board(fen)
+    moves = []
+    repetitions = {}
+    while True:
+        # the move counters are left out so that repeated positions compare equal
+        key = board.output_fen().rsplit(' ', 2)[0]
+        repetitions[key] = repetitions.get(key, 0) + 1
+        legal_moves = board.legal_moves()
+        if len(legal_moves) == 0:
+            if board.is_check():
+                result = '0-1' if board.current_player == 'white' else '1-0'
+                return _game(moves, result, 'checkmate')
+            return _game(moves, '1/2-1/2', 'stalemate')
+        if board.insufficient_material():
+            return _game(moves, '1/2-1/2', 'insufficient_material')
+        if board.half_moves >= 100:
+            return _game(moves, '1/2-1/2', 'fifty_moves')
+        if repetitions[key] >= 3:
+            return _game(moves, '1/2-1/2', 'repetition')
+        if len(moves) >= max_plies:
+            return _game(moves, '*', 'max_plies')
+
+        if weighted:
+            weights = [1 + (capture_value(board, move) or 0) / 100 for move in legal_moves]
+            move = rng.choices(legal_moves, weights)[0]
+        else:
+            move = rng.choice(legal_moves)
+        board.make_move(move)
+        moves.append(move)
+
+
+def play_games(count, seed, fen=None, max_plies=DEFAULT_MAX_PLIES, weighted=False, first=0):
+    """
+    Play a number of random games, each with its own source of randomness seeded by
+    game_rng, so that the same seed always produces the same games.
+
+    Parameters:
+        count(int): The number of games
+
+        seed(int): The seed for the games' random moves
+
+        fen(str): The starting position (optional)
+
+        max_plies(int): The number of plies after which a game is abandoned
+
+        weighted(bool): Whether to prefer captures and promotions
+
+        first(int): The index of the first game within the whole run
+
+    Returns:
+        (list): A dict per game as returned by play_game
+    """
+    return [
+        play_game(game_rng(seed, index), fen, max_plies, weighted)
+        for index in range(first, first + count)]
+
+
+def game_rng(seed, index):
+    """
+    Returns the source of randomness for one game of a run. The seed and the game's index
+    are hashed together, so every game gets an independent stream: different seeds do not
+    share games, and the games of a seed do not depend on how they are split between workers.
+
+    Parameters:
+        seed(int): The seed of the run
+
+        index(int): The index of the game within the run
+    """
+    return random.Random(str(seed) + '/' + str(index))
+
+
+def run_selfplay(games, fen=None, workers=None, seed=None,
+                 max_plies=DEFAULT_MAX_PLIES, weighted=False):
+    """
+    Play random games across a pool of processes and summarise the outcomes.
+    Each game is seeded from the base seed and its index, as in game_rng, so the games
+    are the same whatever the number of workers.
+
+    Parameters:
+        games(int): The number of games to play
+
+        fen(str): The starting position (optional, defaults to the standard start)
+
+        workers(int): The number of processes (optional, defaults to one per CPU).
+            With one worker the games are played in this process
+
+        seed(int): The base seed (optional, defaults to a random one)
+
+        max_plies(int): The number of plies after which a game is abandoned
+
+        weighted(bool): Whether to prefer captures and promotions
+
+    Returns:
+        (tuple): The summary (a dict of outcome and length statistics and throughput)
+            and the list of games, as returned by play_game
+    """
+    if fen is not None and not Board.is_fen_parseable(fen):
+        raise ValueError('Invalid FEN supplied')
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    workers = max(1, min(workers, games))
+    counts = [games // workers + (i < games % workers) for i in range(workers)]
+
+    start = time.perf_counter()
+    if workers == 1:
+        played = play_games(games, seed, fen, max_plies, weighted)
+    else:
+        played = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            batches = [
+                executor.submit(
+                    play_games, count, seed, fen, max_plies, weighted, sum(counts[:i]))
+                for i, count in enumerate(counts)]
+            for batch in batches:
+                played.extend(batch.result())
+    elapsed = time.perf_counter() - start
+    return summarise(played, elapsed, seed, workers), played
+
+
+def summarise(games, elapsed, seed=None, workers=1):
+    """
+    Get outcome and length statistics for a list of games.
+
+    Parameters:
+        games(list): Games as returned by play_game
+
+        elapsed(float): The number of seconds taken to play them
+
+        seed(int): The base seed used (optional)
+
+        workers(int): The number of processes used
+
+    Returns:
+        (dict): The summary
+    """
+    lengths = [len(game['moves']) for game in games]
+    results = dict.fromkeys(pgn.RESULTS, 0)
+    terminations = {}
+    for game in games:
+        results[game['result']] += 1
+        terminations[game['termination']] = terminations.get(game['termination'], 0) + 1
+    plies = sum(lengths)
+    return {
+        'games': len(games),
+        'seed': seed,
+        'workers': workers,
+        'results': results,
+        'terminations': terminations,
+        'average_length': plies / len(games) if games else None,
+        'shortest': min(lengths, default=None),
+        'longest': max(lengths, default=None),
+        'plies': plies,
+        'time': elapsed,
+        'games_per_minute': len(games) * 60 / elapsed if elapsed else None,
+        'plies_per_second': plies / elapsed if elapsed else None
+        }
+
+
+def write_packed(games, file):
+    """
+    Write games to a binary file in the packed game format.
+
+    Parameters:
+        games(list): Games as returned by play_game
+
+        file: A file object opened for binary writing
+    """
+    for game in games:
+        file.write(_GAME_HEADER.pack(len(game['moves']), pgn.RESULTS.index(game['result'])))
+        file.write(struct.pack('<' + str(len(game['moves'])) + 'H',
+                               *(pack_move(move) for move in game['moves'])))
+
+
+def read_packed(data):
+    """
+    Read games from the packed game format.
+
+    Parameters:
+        data(bytes): The contents of a packed game file
+
+    Returns:
+        (list): A dict per game with the keys moves and result
+    """
+    games = []
+    offset = 0
+    while offset < len(data):
+        plies, result = _GAME_HEADER.unpack_from(data, offset)
+        offset += _GAME_HEADER.size
+        moves = struct.unpack_from('<' + str(plies) + 'H', data, offset)
+        offset += 2 * plies
+        games.append({
+            'moves': [unpack_move(move) for move in moves],
+            'result': pgn.RESULTS[result]})
+    return games
+
+
+def _game(moves, result, termination):
+    """Returns the record of a finished game"""
+    return {'moves': moves, 'result': result, 'termination': termination}
+
+
+def main(arguments=None):
+    """Play random games from the command line and print the JSON summary"""
+    parser = argparse.ArgumentParser(
+        prog='python -m modules.selfplay', description='Play random games')
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--fen', help='the starting position')
+    parser.add_argument(
+        '--workers', type=int, help='number of processes (default: one per CPU)')
+    parser.add_argument('--seed', type=int, help='base seed for reproducible games')
+    parser.add_argument('--max-plies', type=int, default=DEFAULT_MAX_PLIES)
+    parser.add_argument(
+        '--weighted', action='store_true', help='prefer captures and promotions')
+    parser.add_argument('--pgn', help='file to write the games to as PGN')
+    parser.add_argument('--packed', help='file to write the games to in the packed format')
+    args = parser.parse_args(arguments)
+
+    summary, games = run_selfplay(
+        args.games, args.fen, args.workers, args.seed, args.max_plies, args.weighted)
+    if args.pgn is not None:
+        with open(args.pgn, 'w') as file:
+            for i, game in enumerate(games, 1):
+                headers = {'Event': 'Selfplay', 'Round': i, 'Termination': game['termination']}
+                file.write(pgn.write_game(game['moves'], args.fen, headers, game['result']))
+    if args.packed is not None:
+        with open(args.packed, 'wb') as file:
+            write_packed(games, file)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    main()
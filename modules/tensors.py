@@ -0,0 +1,205 @@
+import ast
+import mmap
+import struct
+
+from modules.boards import Board
+
+# Plane order: white pieces then black pieces, each as P N B R Q K
+PLANE_ORDER = 'PNBRQKpnbrqk'
+PLANES = 12
+POSITION_SIZE = PLANES * 64
+
+# Feature order: side to move (1 = white), castling K Q k q,
+# then a one-hot en passant file a-h
+FEATURES = 13
+
+_PLANE_INDEX = {symbol: i for i, symbol in enumerate(PLANE_ORDER)}
+_SQUARE_INDEX = {square: i for i, square in enumerate(Board.square_list)}
+_EMPTY_POSITION = bytes(POSITION_SIZE)
+_EMPTY_FEATURES = bytes(FEATURES)
+_NPY_MAGIC = b'\x93NUMPY\x01\x00'
+
+
+def encode_board(position, planes, features=None, index=0):
+    """
+    Write a single position into preallocated plane and feature buffers.
+    Rows in each plane follow Board.square_list, so row 0 is the 8th rank.
+
+    Parameters:
+        position(Board or str): A Board object or a FEN string
+
+        planes: A writable uint8 buffer (bytearray, memoryview, numpy array, etc.)
+            with room for at least index + 1 positions of 12x8x8 bytes
+
+        features: A writable uint8 buffer with room for index + 1 rows of 13 bytes (optional)
+
+        index(int): The slot in the buffers to write to
+    """
+    _encode(position, _byte_view(planes), _byte_view(features), index)
+
+
+def encode_batch(positions, planes, features=None, start=0):
+    """
+    Fill preallocated buffers with many positions in place.
+
+    Parameters:
+        positions(iterable): Board objects and/or FEN strings
+
+        planes: A writable uint8 buffer shaped (n, 12, 8, 8) or flat
+
+        features: A writable uint8 buffer shaped (n, 13) or flat (optional)
+
+        start(int): The first slot in the buffers to write to
+
+    Returns:
+        (int): The number of positions written
+    """
+    plane_view = _byte_view(planes)
+    feature_view = _byte_view(features)
+    capacity = len(plane_view) // POSITION_SIZE
+    index = start
+    for position in positions:
+        if index >= capacity:
+            raise ValueError("Buffer is too small for the supplied positions")
+        _encode(position, plane_view, feature_view, index)
+        index += 1
+    return index - start
+
+
+def export_npy(positions, path_prefix, chunk_size=65536):
+    """
+    Stream positions into chunked .npy files which numpy can open with
+    numpy.load(path, mmap_mode='r'). Only one chunk is held in memory at a time.
+    Files are named <path_prefix>_planes_00000.npy and <path_prefix>_features_00000.npy
+
+    Parameters:
+        positions(iterable): Board objects and/or FEN strings
+
+        path_prefix(str): The path and file name prefix for the output files
+
+        chunk_size(int): The maximum number of positions per file
+
+    Returns:
+        (list): A (planes_path, features_path) tuple for each chunk written
+    """
+    planes = bytearray(chunk_size * POSITION_SIZE)
+    features = bytearray(chunk_size * FEATURES)
+    plane_view = memoryview(planes)
+    feature_view = memoryview(features)
+    written = []
+    count = 0
+    for position in positions:
+        _encode(position, plane_view, feature_view, count)
+        count += 1
+        if count == chunk_size:
+            written.append(_write_chunk(path_prefix, len(written),
+                                        plane_view, feature_view, count))
+            count = 0
+    if count > 0:
+        written.append(_write_chunk(path_prefix, len(written),
+                                    plane_view, feature_view, count))
+    return written
+
+
+def write_npy(path, data, shape):
+    """
+    Write a uint8 buffer to a .npy file.
+
+    Parameters:
+        path(str): The file to write
+
+        data: A bytes-like object holding the array contents in C order
+
+        shape(tuple): The shape of the array e.g. (n, 12, 8, 8)
+    """
+    header = "{'descr': '|u1', 'fortran_order': False, 'shape': %r, }" % (tuple(shape),)
+    # the header is padded so that the array data starts on a 64 byte boundary
+    header += ' ' * (-(len(_NPY_MAGIC) + 2 + len(header) + 1) % 64) + '\n'
+    with open(path, 'wb') as file:
+        file.write(_NPY_MAGIC)
+        file.write(struct.pack('<H', len(header)))
+        file.write(header.encode('latin1'))
+        file.write(data)
+
+
+def open_npy(path):
+    """
+    Memory-map a uint8 .npy file written by this module without reading it into memory.
+
+    Parameters:
+        path(str): The file to open
+
+    Returns:
+        (tuple): The shape of the array and a read-only memoryview of its contents
+    """
+    with open(path, 'rb') as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapped[:len(_NPY_MAGIC)] != _NPY_MAGIC:
+        raise ValueError("Not a version 1.0 .npy file: " + path)
+    header_length = struct.unpack('<H', mapped[8:10])[0]
+    header = ast.literal_eval(mapped[10:10 + header_length].decode('latin1'))
+    if header['descr'] != '|u1' or header['fortran_order']:
+        raise ValueError("Only C ordered uint8 arrays are supported: " + path)
+    return header['shape'], memoryview(mapped)[10 + header_length:]
+
+
+def _write_chunk(path_prefix, number, plane_view, feature_view, count):
+    """Writes the first count positions of the buffers to a numbered pair of .npy files"""
+    planes_path = '%s_planes_%05d.npy' % (path_prefix, number)
+    features_path = '%s_features_%05d.npy' % (path_prefix, number)
+    write_npy(planes_path, plane_view[:count * POSITION_SIZE], (count, PLANES, 8, 8))
+    write_npy(features_path, feature_view[:count * FEATURES], (count, FEATURES))
+    return planes_path, features_path
+
+
+def _byte_view(buffer):
+    """Returns a flat unsigned byte memoryview of a writable buffer, or None"""
+    if buffer is None:
+        return None
+    view = memoryview(buffer)
+    if view.format != 'B' or view.ndim != 1:
+        view = view.cast('B')
+    return view
+
+
+def _encode(position, plane_view, feature_view, index):
+    """Writes one Board or FEN into the given slot of flat byte views"""
+    offset = index * POSITION_SIZE
+    plane_view[offset:offset + POSITION_SIZE] = _EMPTY_POSITION
+
+    if isinstance(position, Board):
+        for square, piece in position.squares.items():
+            symbol = piece.symbol
+            if piece.color == 'white':
+                symbol = symbol.upper()
+            plane_view[offset + _PLANE_INDEX[symbol] * 64 + _SQUARE_INDEX[square]] = 1
+        white_to_move = position.current_player == 'white'
+        castling = (position.castling_wk, position.castling_wq,
+                    position.castling_bk, position.castling_bq)
+        ghost_pawn = position.ghost_pawn
+    else:
+        if not Board.is_fen_parseable(position):
+            raise ValueError("Invalid FEN supplied: " + str(position))
+        fen_parts = position.split(' ')
+        square = 0
+        for c in fen_parts[0]:
+            if c == '/':
+                continue
+            if c.isnumeric():
+                square += int(c)
+            else:
+                plane_view[offset + _PLANE_INDEX[c] * 64 + square] = 1
+                square += 1
+        white_to_move = fen_parts[1] == 'w'
+        castling = tuple(c in fen_parts[2] for c in 'KQkq')
+        ghost_pawn = fen_parts[3]
+
+    if feature_view is None:
+        return
+    offset = index * FEATURES
+    feature_view[offset:offset + FEATURES] = _EMPTY_FEATURES
+    feature_view[offset] = white_to_move
+    for i, right in enumerate(castling):
+        feature_view[offset + 1 + i] = right
+    if ghost_pawn is not None and ghost_pawn != '-':
+        feature_view[offset + 5 + ord(ghost_pawn[0]) - 97] = 1
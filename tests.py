@@ -1,7 +1,28 @@
+import copy
+import io
+import os
+import pickle
+import random
+import tempfile
+import time
 import unittest
 
-from modules.boards import Board
+import benchmarks
+
+from modules.boards import Board, PACKED_SIZE
 from modules.pieces import Pawn, Queen
+from modules import annotate, batches, bitbases, dedup, epd, evaluation, explorer, parallel, pgn, selfplay, tensors
+from modules.pawns import PawnTable, evaluate_pawns
+from modules.cache import PositionCache
+from modules.game import Game
+from modules.main import App
+from modules.mate import MateSolver, find_mate
+from modules.mcts import MCTS, MIN_NODES, NODE_SIZE
+from modules.polyglot import Book, encode_entry, zobrist_key
+from modules.ponder import Ponderer
+from modules.position import Position
+from modules.search import MATE_SCORE, Search, order_moves
+from modules.tables import build_tables, load_tables, pack_move, unpack_move, write_tables
 
 class ChessTests(unittest.TestCase):
     def _test_moves_of_square(self, fen, answer, square):
@@ -81,6 +102,30 @@ class ChessTests(unittest.TestCase):
             '2k4r/ppp2pp1/5n1p/8/1b4b1/2N1B3/PP3PPP/3RK1NR b K - 0 15', 
               ['b8'], 'c8')
         
+    def test_attackers_1(self):
+        board = Board('r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4')
+        self.assertEqual(sorted(board.attackers('f7', 'white')), ['c4'])
+        self.assertEqual(sorted(board.attackers('e5', 'white')), ['f3'])
+        self.assertEqual(sorted(board.attackers('e5', 'black')), ['c6'])
+        self.assertEqual(sorted(board.attackers('d4', 'black')), ['c6', 'e5'])
+
+    def test_attack_map_1(self):
+        board = Board('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1')
+        attack_map = board.attack_map()
+        for color in ('white', 'black'):
+            for square in board.square_list:
+                self.assertEqual(
+                    sorted(attack_map[color][square]),
+                    sorted(board.attackers(square, color)))
+
+    def test_king_moves_6(self):
+        board = Board('r1n1k3/8/8/8/8/8/8/4K3 b q - 0 1')
+        moves = board.squares['e8'].get_moves('e8', board)
+        self.assertNotIn('e8c8', moves)
+        board = Board('r3k3/8/8/8/8/8/8/4K3 b q - 0 1')
+        moves = board.squares['e8'].get_moves('e8', board)
+        self.assertIn('e8c8', moves)
+
     def test_pawn_moves_1(self):
         self._test_moves_of_square(
             'rnbqkb1r/pppp1ppp/4p2B/4P3/3P1n2/8/PPP2PPP/RN1QKBNR w KQkq - 3 5', 
@@ -159,6 +204,26 @@ class ChessTests(unittest.TestCase):
         board = Board('r1bqkb1r/pppp1Bpp/2n5/4p1N1/4n3/8/PPPP1PPP/RNBQK2R b KQkq - 0 5')
         self.assertTrue(board.is_check())
 
+    def test_check_3(self):
+        board = Board('4k3/8/8/8/8/8/4N3/4R1K1 w - - 0 1')
+        board.make_move('e2c3')
+        self.assertTrue(board.is_check())
+        self.assertEqual(board.checkers, ['e1'])
+
+    def test_check_4(self):
+        board = Board('3k4/8/8/8/3N4/8/8/3RK3 w - - 0 1')
+        board.make_move('d4e6')
+        self.assertEqual(sorted(board.checkers), ['d1', 'e6'])
+
+    def test_check_5(self):
+        board = Board('5k2/8/8/8/8/8/8/4K2R w K - 0 1')
+        board.make_move('e1g1')
+        self.assertEqual(board.checkers, ['f1'])
+
+    def test_illegal_move_5(self):
+        board = Board('8/8/8/KPp4r/8/8/8/7k w - c6 0 1')
+        self.assertFalse(board.is_move_legal('b5c6'))
+
     def test_checkmate_1(self):
         board = Board('r1bqkb1r/pppp1Qpp/2n2n2/4p3/2B1P3/8/PPPP1PPP/RNB1K1NR b KQkq - 0 4')
         self.assertTrue(board.is_checkmate())
@@ -183,6 +248,59 @@ class ChessTests(unittest.TestCase):
         board = Board('8/8/8/3kn3/8/8/3K4/2R5 w - - 0 1')
         self.assertFalse(board.insufficient_material())
         
+    def test_insufficient_material_3(self):
+        board = Board('8/8/3b4/3k4/8/8/3K4/4B3 w - - 0 1')
+        self.assertTrue(board.insufficient_material())
+
+    def test_insufficient_material_4(self):
+        board = Board('8/8/3b4/3k4/8/8/3K4/3B4 w - - 0 1')
+        self.assertFalse(board.insufficient_material())
+
+    def test_material_signature_1(self):
+        board = Board('8/8/8/3kn3/8/8/3K4/2R5 w - - 0 1')
+        self.assertEqual(board.material_signature(), 'KRvKN')
+        board.make_move('c1c4')
+        board.make_move('e5c4')
+        self.assertEqual(board.material_signature(), 'KvKN')
+        self.assertEqual(list(board.pieces['black']), ['d5', 'c4'])
+        self.assertTrue(board.insufficient_material())
+
+    def test_king_location_3(self):
+        board = Board('8/8/8/3kn3/8/8/3K4/2R5 w - - 0 1')
+        board.make_move('d2e3')
+        self.assertEqual('d5', board.king_location)
+        board.make_move('d5d6')
+        self.assertEqual('e3', board.king_location)
+        self.assertEqual({'white': 'e3', 'black': 'd6'}, board.kings)
+
+    def test_en_passant_1(self):
+        board = Board('rnbqkb1r/pp1p1ppp/5n2/2pPp3/4P3/8/PPP2PPP/RNBQKBNR w KQkq c6 0 1')
+        board.make_move('d5c6')
+        self.assertIsNone(board.squares.get('c5'))
+        self.assertEqual(board.material['black']['p'], 7)
+        self.assertEqual(board.half_moves, 0)
+
+    def test_load_fen_2(self):
+        fen = '8/8/8/3kn3/8/8/3K4/2R5 b - - 3 40'
+        board = Board()
+        self.assertTrue(board.load(fen))
+        self.assertEqual(fen, board.output_fen())
+        self.assertEqual('d5', board.king_location)
+
+    def test_bitbase_1(self):
+        with tempfile.TemporaryDirectory() as directory:
+            bitbases.generate(directory, ['r'])
+            tables = bitbases.Bitbases(directory)
+            board = Board('8/8/8/4k3/8/8/8/R3K3 w - - 0 1')
+            self.assertEqual(board.bitbase_result(tables), 'win')
+            board = Board('8/8/8/8/8/8/3kR3/7K b - - 0 1')
+            self.assertEqual(board.bitbase_result(tables), 'draw')
+            board = Board('4k2r/8/8/8/8/8/8/4K3 w - - 0 1')
+            self.assertEqual(board.bitbase_result(tables), 'loss')
+            board = Board('8/8/8/4k3/8/8/4P3/4K3 w - - 0 1')
+            self.assertIsNone(board.bitbase_result(tables))
+            tables.close()
+
     def test_illegal_move_1(self):
         board = Board('r1bqkbnr/ppp1pppp/2n5/1B1P4/8/8/PPPP1PPP/RNBQK1NR b KQkq - 0 3')
         self.assertFalse(board.is_move_legal('c6d4'))
@@ -199,6 +317,13 @@ class ChessTests(unittest.TestCase):
         board = Board()
         self.assertFalse(board.is_move_legal('d7d5'))
 
+    def test_illegal_move_6(self):
+        board = Board()
+        for move in ('e1e9', 'e1i1', 'e1', 'x'):
+            self.assertFalse(board.is_move_legal(move))
+        self.assertFalse(board.make_move('e1e9'))
+        self.assertEqual(board.output_fen(), Board().output_fen())
+
     def test_legal_move_1(self):
         board = Board('r1b1kbnr/ppp1pppp/2n5/1B2q3/8/2N5/PPPP1PPP/R1BQK1NR w KQkq - 2 5')
         self.assertTrue(board.is_move_legal('g1e2'))
@@ -217,5 +342,656 @@ class ChessTests(unittest.TestCase):
         board.make_move('e8c8')
         self.assertEqual(board.fen, '2kr2nr/ppp2ppp/1bn5/3qN3/3P4/2P5/PP2QPPP/R1B3KR w - - 1 14')
         
+    def test_captures_only_1(self):
+        board = Board('r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4')
+        self.assertEqual(sorted(board.legal_moves(True)), ['c4f7', 'f3e5'])
+
+    def test_captures_only_2(self):
+        board = Board('8/2KP4/5n2/8/8/8/5kp1/8 w - - 0 1')
+        self.assertEqual(
+            sorted(board.legal_moves(True)), ['d7d8b', 'd7d8n', 'd7d8q', 'd7d8r'])
+
+    def test_see_1(self):
+        board = Board('1k1r4/1pp4p/p7/4p3/8/P5P1/1PP4P/2K1R3 w - - 0 1')
+        self.assertEqual(board.see('e1e5'), 100)
+
+    def test_see_2(self):
+        board = Board('1k1r3q/1ppn3p/p4b2/4p3/8/P2N2P1/1PP1R1BP/2K1Q3 w - - 0 1')
+        self.assertEqual(board.see('d3e5'), -220)
+
+    def test_order_moves_1(self):
+        board = Board('4k3/8/8/3q1r2/4P3/8/8/4K3 w - - 0 1')
+        moves = order_moves(board, board.legal_moves())
+        self.assertEqual(moves[0:2], ['e4d5', 'e4f5'])
+
+    def test_search_1(self):
+        board = Board('r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4')
+        move, score = Search().best_move(board, 1)
+        self.assertEqual(move, 'h5f7')
+        self.assertEqual(board.fen, 'r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4')
+
+    def test_search_2(self):
+        board = Board('4k3/8/8/3q4/8/8/3R4/3RK3 w - - 0 1')
+        move, score = Search().best_move(board, 1)
+        self.assertEqual(move, 'd2d5')
+        self.assertGreater(score, 0)
+
+    def test_search_3(self):
+        self.assertEqual(Search().best_move(Board('7k/5Q2/6K1/8/8/8/8/8 b - - 1 1'), 2), (None, 0))
+        self.assertEqual(
+            Search().best_move(Board('7k/6Q1/6K1/8/8/8/8/8 b - - 0 1'), 2), (None, -MATE_SCORE))
+
+    def test_mate_1(self):
+        board = Board('r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4')
+        self.assertEqual(find_mate(board, 3), ('h5f7', 1))
+
+    def test_mate_2(self):
+        board = Board('kbK5/pp6/1P6/8/8/8/8/R7 w - - 0 1')
+        self.assertEqual(find_mate(board, 2), ('a1a6', 2))
+        self.assertEqual(board.fen, 'kbK5/pp6/1P6/8/8/8/8/R7 w - - 0 1')
+
+    def test_mate_3(self):
+        board = Board('r5rk/5p1p/5R2/4B3/8/8/7P/7K w - - 0 1')
+        self.assertIsNone(find_mate(board, 2))
+        self.assertEqual(find_mate(board, 3), ('f6a6', 3))
+
+    def test_mate_4(self):
+        solver = MateSolver(time_limit=0)
+        self.assertIsNone(solver.find_mate(Board(), 2))
+        self.assertTrue(solver.timed_out)
+
+    def test_zobrist_key_1(self):
+        board = Board()
+        self.assertEqual(zobrist_key(board), 0x463b96181691fc9c)
+        board.make_move('e2e4')
+        self.assertEqual(zobrist_key(board), 0x823c9b50fd114196)
+        board.make_move('d7d5')
+        board.make_move('e4e5')
+        board.make_move('f7f5')
+        self.assertEqual(zobrist_key(board), 0x22a48b5a8e47ff78)
+
+    def test_book_1(self):
+        castling = Board('r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1')
+        entries = sorted([
+            encode_entry(zobrist_key(Board()), 'e2e4', 10),
+            encode_entry(zobrist_key(Board()), 'd2d4', 20),
+            encode_entry(zobrist_key(Board()), 'e2e5', 30),
+            encode_entry(zobrist_key(castling), 'e1h1', 1),
+            encode_entry(1, 'a2a3', 1)])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'book.bin')
+            with open(path, 'wb') as file:
+                file.write(b''.join(entries))
+            with Book(path) as book:
+                self.assertEqual(book.moves(Board()), [('d2d4', 20), ('e2e4', 10)])
+                self.assertEqual(book.moves(castling), [('e1g1', 1)])
+                self.assertEqual(book.moves(Board('8/8/8/3kn3/8/8/3K4/8 w - - 0 1')), [])
+                self.assertEqual(Search(book).best_move(Board(), 3), ('d2d4', None))
+
+    def test_tensor_encode_1(self):
+        planes = bytearray(tensors.POSITION_SIZE)
+        features = bytearray(tensors.FEATURES)
+        tensors.encode_board(Board(), planes, features)
+        white_pawns = planes[0:64]
+        self.assertEqual(white_pawns[48:56], bytes([1] * 8))
+        self.assertEqual(white_pawns.count(1), 8)
+        black_king = planes[11 * 64:12 * 64]
+        self.assertEqual(black_king.index(1), 4)
+        self.assertEqual(features, bytearray([1, 1, 1, 1, 1] + [0] * 8))
+
+    def test_tensor_encode_2(self):
+        fens = [
+            'rnbqkb1r/pp1p1ppp/5n2/2pPp3/4P3/8/PPP2PPP/RNBQKBNR w KQkq c6 0 1',
+            '2kr2nr/ppp2ppp/1bn5/3qN3/3P4/2P5/PP2QPPP/R1B3KR w - - 1 14']
+        from_boards = bytearray(2 * tensors.POSITION_SIZE)
+        from_fens = bytearray(2 * tensors.POSITION_SIZE)
+        features = bytearray(2 * tensors.FEATURES)
+        tensors.encode_batch([Board(fen) for fen in fens], from_boards)
+        count = tensors.encode_batch(fens, from_fens, features)
+        self.assertEqual(count, 2)
+        self.assertEqual(from_boards, from_fens)
+        self.assertEqual(features[0:13], bytearray([1, 1, 1, 1, 1, 0, 0, 1, 0, 0, 0, 0, 0]))
+
+    def test_tensor_export_1(self):
+        fens = ['8/8/8/3kn3/8/8/3K4/8 w - - 0 1'] * 5
+        with tempfile.TemporaryDirectory() as directory:
+            written = tensors.export_npy(fens, os.path.join(directory, 'set'), chunk_size=2)
+            self.assertEqual(len(written), 3)
+            shape, data = tensors.open_npy(written[2][0])
+            self.assertEqual(shape, (1, 12, 8, 8))
+            self.assertEqual(data.tobytes().count(1), 3)
+            shape, data = tensors.open_npy(written[0][1])
+            self.assertEqual(shape, (2, 13))
+            data.release()
+
+    def test_evaluate_1(self):
+        result = evaluation.evaluate(Board())
+        self.assertEqual(result['score'], 0)
+        self.assertFalse(result['insufficient_material'])
+
+    def test_evaluate_2(self):
+        result = evaluation.evaluate('8/8/8/3kn3/8/8/3K4/2R5 w - - 0 1')
+        self.assertEqual(result['material'], 180)
+        self.assertFalse(result['insufficient_material'])
+
+    def test_evaluate_batch_1(self):
+        fens = [
+            '8/8/8/3kn3/8/8/3K4/8 w - - 0 1',
+            '8/8/3b4/3k4/8/8/3K4/4B3 w - - 0 1',
+            '8/8/3b4/3k4/8/8/3K4/3B4 w - - 0 1',
+            'r1bqkb1r/pppp1Qpp/2n2n2/4p3/2B1P3/8/PPPP1PPP/RNB1K1NR b KQkq - 0 4']
+        planes = bytearray(len(fens) * tensors.POSITION_SIZE)
+        tensors.encode_batch(fens, planes)
+        results = evaluation.evaluate_batch(planes)
+        self.assertEqual(results, evaluation.evaluate_batch(fens))
+        self.assertEqual(
+            [result['insufficient_material'] for result in results],
+            [True, True, False, False])
+        self.assertEqual(results[3]['material'], 100)
+
+    @unittest.skipUnless(evaluation._numpy(), 'NumPy is not installed')
+    def test_evaluate_batch_2(self):
+        board = Board()
+        rng = random.Random(7)
+        fens = [
+            '8/8/3b4/3k4/8/8/3K4/4B3 w - - 0 1',
+            '8/8/3b4/3k4/8/8/3K4/3B4 w - - 0 1',
+            '4k3/8/8/8/8/8/8/R3K3 w - - 0 1']
+        for _ in range(200):
+            moves = board.legal_moves()
+            if len(moves) == 0:
+                board = Board()
+                continue
+            board.make_move(rng.choice(moves))
+            fens.append(board.output_fen())
+        planes = bytearray(len(fens) * tensors.POSITION_SIZE)
+        tensors.encode_batch(fens, planes)
+        self.assertEqual(
+            evaluation.evaluate_batch(planes), evaluation.evaluate_batch(planes, use_numpy=False))
+        self.assertEqual(evaluation.evaluate_batch(b''), [])
+
+    def test_parse_notation_1(self):
+        board = Board('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1')
+        self.assertEqual(board.parse_notation('O-O'), 'e1g1')
+        self.assertEqual(board.parse_notation('Nxf7'), 'e5f7')
+        self.assertEqual(board.parse_notation('dxe6!?'), 'd5e6')
+        self.assertEqual(board.parse_notation('Nb5'), 'c3b5')
+        self.assertIsNone(board.parse_notation('Qh8'))
+
+    def test_perft_1(self):
+        self.assertEqual(Board().perft(3), 8902)
+        board = Board('8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1')
+        self.assertEqual(board.perft(3), 2812)
+
+    def test_epd_1(self):
+        record = epd.parse_epd('4k3/8/8/8/8/8/8/R3K3 w Q - bm Ra8+; id "test 1"; hmvc 4;')
+        self.assertEqual(record['fen'], '4k3/8/8/8/8/8/8/R3K3 w Q - 4 1')
+        self.assertEqual(record['operations']['bm'], ['Ra8+'])
+        self.assertEqual(record['operations']['id'], ['test 1'])
+        record = epd.parse_epd('8/8/8/8/8/8/8/K1k5 w - - 0 20 ;D1 3 ;D2 9')
+        self.assertEqual(record['fen'], '8/8/8/8/8/8/8/K1k5 w - - 0 20')
+        self.assertEqual(record['operations']['D2'], ['9'])
+        self.assertIsNone(epd.parse_epd('8/8/8 w - - bm Ra8;'))
+
+    def test_epd_2(self):
+        lines = [
+            'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - ;D1 20 ;D2 400',
+            'r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - bm Qxf7#; id "mate";',
+            'not a record']
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'suite.epd')
+            with open(path, 'w') as file:
+                file.write('\n'.join(lines))
+            records = epd.read_epd(path)
+        self.assertEqual([record['id'] for record in records], ['suite.epd:1', 'mate', 'suite.epd:3'])
+
+        report = epd.run_suite(records, 'perft', workers=1)
+        self.assertEqual(report['results'][0]['perft'], 400)
+        self.assertEqual([result['passed'] for result in report['results']], [True, False, False])
+
+        report = epd.run_suite(records[1:2], 'search', depth=1, workers=1)
+        self.assertEqual(report['pass_rate'], 1)
+        self.assertEqual(report['results'][0]['move'], 'Qxf7#')
+
+    def test_pack_move_1(self):
+        for move in ['a8a1', 'h1h8', 'e2e4', 'b7a8q', 'g2g1n']:
+            self.assertEqual(unpack_move(pack_move(move)), move)
+        self.assertLess(pack_move('h2h1q'), 2 ** 15)
+
+    def test_write_pgn_1(self):
+        text = pgn.write_game(['e2e4', 'e7e5', 'd1h5', 'b8c6', 'f1c4', 'g8f6', 'h5f7'], result='1-0')
+        self.assertIn('[Result "1-0"]', text)
+        self.assertNotIn('FEN', text)
+        self.assertTrue(text.endswith('1. e4 e5 2. Qh5 Nc6 3. Bc4 Nf6 4. Qxf7# 1-0\n\n'))
+        text = pgn.write_game(['e8e7'], fen='4k3/8/8/8/8/8/8/4K3 b - - 0 40')
+        self.assertIn('[FEN "4k3/8/8/8/8/8/8/4K3 b - - 0 40"]', text)
+        self.assertIn('40... Ke7 *', text)
+
+    def test_selfplay_1(self):
+        summary, games = selfplay.run_selfplay(5, workers=1, seed=7, max_plies=60)
+        self.assertEqual(summary['games'], 5)
+        self.assertEqual(sum(summary['results'].values()), 5)
+        self.assertEqual(games, selfplay.run_selfplay(5, workers=1, seed=7, max_plies=60)[1])
+        for game in games:
+            board = Board()
+            for move in game['moves']:
+                self.assertTrue(board.make_move(move))
+            self.assertLessEqual(len(game['moves']), 60)
+
+    def test_selfplay_2(self):
+        rng = random.Random(1)
+        game = selfplay.play_game(rng, '7k/8/8/8/8/8/8/K7 w - - 0 1')
+        self.assertEqual(game, {'moves': [], 'result': '1/2-1/2', 'termination': 'insufficient_material'})
+        game = selfplay.play_game(rng, '7k/6Q1/6K1/8/8/8/8/8 b - - 0 1')
+        self.assertEqual(game['termination'], 'checkmate')
+        self.assertEqual(game['result'], '1-0')
+
+        games = selfplay.play_games(3, 11, max_plies=40, weighted=True)
+        with tempfile.TemporaryFile() as file:
+            selfplay.write_packed(games, file)
+            file.seek(0)
+            packed = selfplay.read_packed(file.read())
+        self.assertEqual(packed, [{'moves': game['moves'], 'result': game['result']} for game in games])
+
+    def test_selfplay_3(self):
+        games = selfplay.run_selfplay(8, workers=1, seed=1, max_plies=30)[1]
+        other = selfplay.run_selfplay(8, workers=1, seed=2, max_plies=30)[1]
+        moves = {tuple(game['moves']) for game in games}
+        self.assertTrue(moves.isdisjoint(tuple(game['moves']) for game in other))
+        # the games do not depend on how they are split between workers
+        self.assertEqual(selfplay.run_selfplay(8, workers=2, seed=1, max_plies=30)[1], games)
+
+    def test_position_1(self):
+        position = Position()
+        after = position.play('e2e4')
+        self.assertEqual(position.fen, 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1')
+        self.assertEqual(after.fen, 'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1')
+        self.assertIsNone(position.play('e2e5'))
+        # only the ranks the move changes are new
+        self.assertIs(after.ranks[0], position.ranks[0])
+        self.assertIsNot(after.ranks[4], position.ranks[4])
+        with self.assertRaises(AttributeError):
+            after.turn = 5
+        with self.assertRaises(ValueError):
+            Position('not a fen')
+
+    def test_position_2(self):
+        fen = 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1'
+        position = Position(fen)
+        self.assertEqual(position, Position.from_board(Board(fen)))
+        self.assertEqual(len({position, Position(fen), position.play('e1g1')}), 2)
+        for moves in (['e1g1'], ['a2a4', 'b4a3'], ['e1c1', 'h3g2', 'd5d6', 'g2h1q']):
+            board = Board(fen)
+            after = position
+            for move in moves:
+                board.make_move(move)
+                after = after.play(move)
+            self.assertEqual(after.fen, board.output_fen())
+
+    def test_position_3(self):
+        position = Position().play('e2e4')
+        for copied in (pickle.loads(pickle.dumps(position)), copy.copy(position), copy.deepcopy(position)):
+            self.assertEqual(copied, position)
+            self.assertEqual(hash(copied), hash(position))
+            self.assertEqual(copied.ghost_pawn, 'e3')
+
+    def test_game_status_1(self):
+        self.assertEqual(Board().game_status(), 'ongoing')
+        self.assertEqual(Board('7k/6Q1/6K1/8/8/8/8/8 b - - 0 1').game_status(), 'checkmate')
+        self.assertEqual(Board('7k/5Q2/6K1/8/8/8/8/8 b - - 0 1').game_status(), 'stalemate')
+        self.assertEqual(Board('7k/8/8/8/8/8/8/K6N w - - 0 1').game_status(), 'insufficient_material')
+        self.assertEqual(Board('7k/8/8/8/8/8/8/K6R b - - 0 1').game_status(), 'check')
+
+    def test_position_cache_1(self):
+        cache = PositionCache(size=2)
+        board = Board()
+        self.assertEqual(cache.legal_moves(board), frozenset(board.legal_moves()))
+        self.assertEqual(cache.move_notation(board, 'g1f3'), 'Nf3')
+        self.assertIsNone(cache.move_notation(board, 'g1g3'))
+        self.assertEqual(cache.game_status(Board()), 'ongoing')
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (3, 1, 1))
+        self.assertEqual(stats['hit_rate'], 0.75)
+
+        # the move counters are not part of the key
+        cache.legal_moves(Board('7k/8/8/8/8/8/8/K6R b - - 5 30'))
+        cache.legal_moves(Board('7k/8/8/8/8/8/8/K6R b - - 0 1'))
+        cache.legal_moves(Board('7k/6Q1/6K1/8/8/8/8/8 b - - 0 1'))
+        self.assertEqual(cache.stats()['entries'], 2)
+        cache.legal_moves(Board())
+        self.assertEqual(cache.stats()['misses'], 4)
+
+        cache.resize(1)
+        self.assertEqual(cache.stats()['entries'], 1)
+        cache.clear()
+        self.assertIsNone(cache.stats()['hit_rate'])
+
+    def test_search_stop_1(self):
+        search = Search()
+        search.stop()
+        self.assertEqual(search.best_move(Board(), 3), (None, None))
+        self.assertTrue(search.stopped)
+
+    def test_ponder_1(self):
+        cache = PositionCache()
+        ponderer = Ponderer(max_depth=2, cache=cache)
+        board = Board('r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 0 1')
+        ponderer.start(board)
+        board.make_move('h5f7')
+        self.assertIsNone(ponderer.best_move(board))
+        deadline = time.monotonic() + 30
+        while ponderer.is_running() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        board = Board(ponderer.fen)
+        self.assertEqual(ponderer.best_move(board), ('h5f7', MATE_SCORE - 1, 2))
+        self.assertEqual(cache.stats()['entries'], 1)
+        self.assertEqual(cache.move_notation(board, 'h5f7'), 'Qxf7#')
+        self.assertEqual(cache.stats()['misses'], 1)
+
+        ponderer.start(Board())
+        ponderer.start(board)
+        ponderer.stop()
+        self.assertFalse(ponderer.is_running())
+
+    def test_pawn_key_1(self):
+        board = Board()
+        start_key = board.pawn_key
+        board.make_move('g1f3')
+        self.assertEqual(board.pawn_key, start_key)
+        for move in ['e7e5', 'e2e4', 'd7d5', 'e4d5', 'e5e4', 'd2d4', 'e4d3']:
+            board.make_move(move)
+            self.assertEqual(board.pawn_key, Board(board.output_fen()).pawn_key)
+        self.assertNotEqual(board.pawn_key, start_key)
+        self.assertEqual(Board('8/8/8/3k4/8/8/3K4/8 w - - 0 1').pawn_key, 0)
+
+    def test_evaluate_pawns_1(self):
+        result = evaluate_pawns(Board('4k3/8/1p6/p7/P2P4/1P2P3/5P2/4K3 w - - 0 1'))
+        self.assertEqual(result['passed'], {'white': ['d4', 'e3', 'f2'], 'black': []})
+        self.assertEqual(result['backward'], {'white': ['b3'], 'black': ['b6']})
+        self.assertEqual(result['score'], 50)
+        result = evaluate_pawns(Board('4k3/p7/p7/8/8/2P5/P7/4K3 w - - 0 1'))
+        self.assertEqual(result['doubled'], {'white': [], 'black': ['a6', 'a7']})
+        self.assertEqual(result['isolated'], {'white': ['a2', 'c3'], 'black': ['a6', 'a7']})
+        self.assertEqual(result['passed'], {'white': ['c3'], 'black': []})
+        self.assertEqual(result['score'], 25)
+
+    def test_pawn_table_1(self):
+        table = PawnTable(memory=1200)
+        self.assertEqual(table.stats()['slots'], 150)
+        board = Board('4k3/p7/p7/8/8/2P5/P7/4K3 w - - 0 1')
+        self.assertEqual(table.score(board), 25)
+        board.make_move('e1d1')
+        self.assertEqual(table.score(board), 25)
+        self.assertEqual(table.score(Board('4k3/8/8/8/8/8/8/4K3 w - - 0 1')), 0)
+        stats = table.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 1))
+        self.assertEqual(stats['memory'], 1200)
+        # negative scores survive being packed with the key
+        board = Board('4k3/p7/2p5/8/8/P7/P7/4K3 w - - 0 1')
+        self.assertEqual(table.score(board), -25)
+        self.assertEqual(table.score(board), -25)
+        self.assertEqual(table.stats()['hits'], 3)
+
+    def test_pack_board_1(self):
+        fens = [
+            'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+            'rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w Kq f6 0 3',
+            '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 b - - 37 200']
+        buffer = bytearray(len(fens) * PACKED_SIZE)
+        for i, fen in enumerate(fens):
+            Board(fen).pack_into(buffer, i * PACKED_SIZE)
+        for i, fen in enumerate(fens):
+            board = Board.from_packed(memoryview(buffer), i * PACKED_SIZE)
+            self.assertEqual(board.output_fen(), fen)
+            self.assertEqual(board.pawn_key, Board(fen).pawn_key)
+
+    def test_position_batch_1(self):
+        fens = [
+            '7k/6Q1/6K1/8/8/8/8/8 b - - 0 1',
+            '7k/5Q2/6K1/8/8/8/8/8 b - - 0 1',
+            'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1']
+        with batches.PositionBatch(len(fens)) as batch:
+            for i, fen in enumerate(fens):
+                batch.put(i, fen)
+            self.assertIsNone(batch.result(0))
+            other = batches.PositionBatch(name=batch.name)
+            self.assertEqual(other.board(2).output_fen(), fens[2])
+            other.write_result(0, 0, 'checkmate', -900)
+            other.close()
+            self.assertEqual(batch.result(0), {'legal_moves': 0, 'status': 'checkmate', 'score': -900})
+
+            batches.run_batch(batch, workers=2)
+            self.assertEqual(batch.result(1)['status'], 'stalemate')
+            self.assertEqual(batch.result(2), {'legal_moves': 20, 'status': 'ongoing', 'score': 0})
+
+    def test_game_1(self):
+        moves = ['e2e4', 'e7e5', 'g1f3', 'b8c6', 'f1b5', 'a7a6', 'b5c6', 'd7c6', 'e1g1']
+        game = Game(snapshot_interval=4)
+        board = Board()
+        fens = [board.output_fen()]
+        for move in moves:
+            self.assertTrue(game.play(move))
+            board.make_move(move)
+            fens.append(board.output_fen())
+        self.assertFalse(game.play('e1g1'))
+        self.assertEqual(len(game), 9)
+        self.assertEqual(game.moves, moves)
+        for ply in [3, 9, 0, 8, 5, 6, 7, 4]:
+            self.assertTrue(game.seek(ply))
+            self.assertEqual(game.board.output_fen(), fens[ply])
+            self.assertEqual(game.position_at(9 - ply).output_fen(), fens[9 - ply])
+        self.assertFalse(game.seek(10))
+        self.assertFalse(game.seek(-1))
+        self.assertEqual(game.ply, 4)
+
+    def test_game_2(self):
+        game = Game('4k3/8/8/8/8/8/4P3/4K3 w - - 0 1', snapshot_interval=2)
+        for move in ['e2e4', 'e8d7', 'e1d2', 'd7c6']:
+            game.play(move)
+        game.seek(1)
+        self.assertTrue(game.play('e8f7'))
+        self.assertEqual(game.moves, ['e2e4', 'e8f7'])
+        self.assertFalse(game.seek(3))
+        game.play('e1f2')
+        game.seek(0)
+        game.seek(3)
+        self.assertEqual(game.board.output_fen(), '8/5k2/8/8/4P3/8/5K2/8 b - - 2 2')
+        with self.assertRaises(ValueError):
+            Game('not a fen')
+
+    def test_benchmarks_1(self):
+        results = benchmarks.run(repeat=1, target_time=0.001)
+        self.assertIn('Board.move_notation', results['timings'])
+        self.assertIn('King.get_moves', results['timings'])
+        self.assertGreater(results['memory']['Board'], results['memory']['Board.copy'])
+        self.assertEqual(benchmarks.compare(results, results), [])
+
+        baseline = {'timings': {'Board.load': 10.0, 'Board.is_check': 1.0}, 'memory': {'Board': 1000}}
+        current = {'timings': {'Board.load': 11.0, 'Board.is_check': 1.5}, 'memory': {'Board': 1300}}
+        self.assertEqual(benchmarks.compare(current, baseline, 0.2), [
+            'timings Board.is_check: 1.0 -> 1.5 (+50%)', 'memory Board: 1000 -> 1300 (+30%)'])
+        self.assertEqual(benchmarks.compare(current, baseline, 0.5), [])
+
+    def test_deduplicate_1(self):
+        start = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+        after_e4 = 'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1'
+        # no black pawn can take on e3, so the en passant square is dropped
+        self.assertEqual(dedup.position_fen(dedup.normalise(after_e4)),
+                         'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1')
+        self.assertIsNone(dedup.normalise('not a fen'))
+
+        lines = [start, after_e4, start, '', 'not a fen', start.replace('0 1', '3 7'), after_e4]
+        for workers in (1, 2):
+            with tempfile.TemporaryDirectory() as directory:
+                output = io.StringIO()
+                summary = dedup.deduplicate(
+                    lines, output, chunk_size=2, workers=workers, directory=directory, fan_in=2)
+                self.assertEqual(os.listdir(directory), [])
+            self.assertEqual(summary['positions'], 5)
+            self.assertEqual(summary['unique'], 3)
+            self.assertEqual(summary['invalid'], 1)
+            self.assertEqual(summary['runs'], 4)
+            counts = {line.split(' ', 1)[1]: int(line.split(' ', 1)[0])
+                      for line in output.getvalue().splitlines()}
+            self.assertEqual(counts[start], 2)
+            self.assertEqual(counts[start.replace('0 1', '3 7')], 1)
+            self.assertEqual(sum(counts.values()), 5)
+
+        output = io.StringIO()
+        summary = dedup.deduplicate(lines, output, ignore_clocks=True, workers=1)
+        self.assertEqual(summary['unique'], 2)
+        self.assertIn('3 ' + start + '\n', output.getvalue())
+
+    def test_read_games_1(self):
+        text = pgn.write_game(['e2e4', 'e7e5'], headers={'White': 'A "B" C'}, result='1-0') + (
+            '[Event "Second"]\n[Result "1/2-1/2"]\n\n'
+            '1. d4 {a comment\nover two lines} d5 (1... Nf6 2. c4) 2.c4 $1 e6; the rest\n'
+            '3... Nf6\n\n[Event "Third"]\n\n1. e4\n')
+        games = list(pgn.read_games(io.StringIO(text)))
+        self.assertEqual(len(games), 3)
+        self.assertEqual(games[0]['headers']['White'], 'A "B" C')
+        self.assertEqual(games[0]['moves'], ['e4', 'e5'])
+        self.assertEqual(games[0]['result'], '1-0')
+        self.assertEqual(games[1]['moves'], ['d4', 'd5', 'c4', 'e6', 'Nf6'])
+        self.assertEqual(games[1]['result'], '1/2-1/2')
+        self.assertEqual(games[2]['headers'], {'Event': 'Third'})
+        self.assertEqual(games[2]['result'], '*')
+
+    def test_explorer_1(self):
+        games = [
+            (['e2e4', 'e7e5', 'g1f3'], '1-0'),
+            (['e2e4', 'c7c5'], '0-1'),
+            (['d2d4', 'd7d5'], '1/2-1/2'),
+            (['e2e4', 'e7e5', 'f1c4'], '1/2-1/2'),
+            (['e2e4'], '*')] * 3
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'games.pgn')
+            with open(path, 'w') as file:
+                for moves, result in games:
+                    file.write(pgn.write_game(moves, result=result))
+            tables = []
+            for workers, fan_in in ((1, explorer.DEFAULT_FAN_IN), (2, explorer.DEFAULT_FAN_IN), (1, 2)):
+                table = os.path.join(directory, 'explorer' + str(len(tables)) + '.bin')
+                summary = explorer.build(
+                    [path], table, max_ply=2, workers=workers, max_entries=2,
+                    directory=directory, fan_in=fan_in)
+                self.assertGreater(summary['partial_tables'], 2)
+                self.assertEqual(summary['games'], 12)
+                self.assertEqual(summary['skipped'], 3)
+                self.assertEqual(summary['moves'], 5)
+                with open(table, 'rb') as file:
+                    tables.append(file.read())
+            self.assertEqual(tables[0], tables[1])
+            self.assertEqual(tables[0], tables[2])
+
+            with explorer.Explorer(table) as opening:
+                self.assertEqual(opening.moves(Board()), [('e2e4', 3, 3, 3), ('d2d4', 0, 3, 0)])
+                after_e4 = Board()
+                after_e4.make_move('e2e4')
+                self.assertEqual(opening.moves(after_e4), [('e7e5', 3, 3, 0), ('c7c5', 0, 0, 3)])
+                after_e4.make_move('e7e5')
+                self.assertEqual(opening.moves(after_e4), [])
+
+    def test_annotate_1(self):
+        moves = ['f2f3', 'e7e5', 'g2g4', 'd8h4']
+        game = annotate.annotate_game(moves, depth=2)
+        self.assertEqual([ply['notation'] for ply in game['plies']], ['f3', 'e5', 'g4', 'Qh4#'])
+        self.assertEqual(game['plies'][2]['classification'], 'blunder')
+        self.assertEqual(game['plies'][3]['classification'], None)
+        self.assertEqual(game['plies'][3]['best_move'], 'd8h4')
+        self.assertEqual(game['plies'][3]['score'], -(MATE_SCORE - 1))
+        self.assertEqual(game['blunders'], {'white': 1, 'black': 0})
+
+        text = annotate.annotated_pgn(game, moves, result='0-1')
+        self.assertIn('2. g4 $4 {Blunder, best was ', text)
+        self.assertIn('Qh4# {#-1} 0-1', text)
+        self.assertEqual(next(pgn.read_games(io.StringIO(text)))['moves'], ['f3', 'e5', 'g4', 'Qh4#'])
+        self.assertEqual(annotate.format_score(-125), '-1.25')
+        self.assertEqual(annotate.format_score(MATE_SCORE - 3), '#2')
+
+    def test_annotate_2(self):
+        # stalemating instead of mating
+        game = annotate.annotate_game(['f1f7'], '7k/8/6K1/8/8/8/8/5Q2 w - - 0 1')
+        ply = game['plies'][0]
+        self.assertEqual(ply['score'], 0)
+        self.assertEqual(ply['best_notation'], 'Qf8#')
+        self.assertEqual(ply['classification'], 'blunder')
+        self.assertEqual(annotate.format_score(ply['score']), '+0.00')
+
+    def test_annotate_3(self):
+        # played and best moves are scored on the same horizon, so book moves are not flagged
+        for line in ('e2e4 e7e5 g1f3 b8c6 f1c4 f8c5 c2c3 g8f6 d2d3 d7d6 e1g1 e8g8',
+                     'd2d4 d7d5 c2c4 e7e6 b1c3 g8f6 c1g5 f8e7 e2e3 e8g8 g1f3 h7h6'):
+            game = annotate.annotate_game(line.split())
+            self.assertEqual([ply['classification'] for ply in game['plies']], [None] * 12)
+
+    def test_mcts_1(self):
+        search = MCTS(batch_size=8)
+        board = Board('r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4')
+        self.assertEqual(search.search(board, visits=300), 'h5f7')
+        self.assertEqual(search.principal_variation(), ['h5f7'])
+        self.assertEqual(search.root_moves()[0][2], 1.0)
+        self.assertEqual(board.output_fen(),
+                         'r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4')
+        stats = search.stats()
+        self.assertEqual(stats['visits'], 300)
+        self.assertEqual(stats['bytes_per_node'], NODE_SIZE)
+        # the first visit evaluates the root itself
+        self.assertEqual(sum(move[1] for move in search.root_moves()), 299)
+
+        self.assertIsNone(search.search(Board('7k/5Q2/6K1/8/8/8/8/8 b - - 0 1'), visits=50))
+        self.assertEqual(search.root_moves(), [])
+
+    def test_mcts_2(self):
+        search = MCTS(memory=0)
+        self.assertEqual(search.max_nodes, MIN_NODES)
+        self.assertEqual(search.stats()['memory'], MIN_NODES * NODE_SIZE)
+        self.assertIsNotNone(search.search(Board(), visits=200))
+        self.assertLessEqual(search.stats()['nodes'], MIN_NODES)
+        self.assertEqual(search.stats()['visits'], 200)
+
+    def test_shared_board_1(self):
+        # two knights which can both reach d2, so the notation has to be disambiguated
+        board = Board('4k3/8/8/8/8/5N2/8/1N2K3 w - - 0 1')
+        fen = board.output_fen()
+        colors = {square: piece.color for square, piece in board.squares.items()}
+        expected = parallel.analyse_position(board)
+        self.assertEqual(expected['moves']['b1d2'], 'Nbd2')
+
+        results = parallel.analyse_positions([board] * 64, workers=8)
+        self.assertTrue(all(result == expected for result in results))
+        self.assertEqual(board.output_fen(), fen)
+        self.assertEqual({square: piece.color for square, piece in board.squares.items()}, colors)
+        with self.assertRaises(ValueError):
+            parallel.analyse_positions([board], mode='fibres')
+
+    def test_app_1(self):
+        first = App()
+        second = App()
+        self.assertIsNot(first.board, second.board)
+        first.game.play('e2e4')
+        self.assertEqual(first.board.current_player, 'black')
+        self.assertEqual(second.board.current_player, 'white')
+
+    def test_scaling_benchmark_1(self):
+        results = benchmarks.scaling([1, 2], repeat=1, copies=1)
+        self.assertEqual(set(results['timings']), {1, 2})
+        self.assertEqual(results['speedup'][1], 1.0)
+        self.assertEqual(results['positions'], len(benchmarks.POSITIONS))
+
+    def test_tables_file_1(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'tables.bin')
+            self.assertIsNone(load_tables(path))
+            write_tables(path)
+            tables = load_tables(path)
+            self.assertEqual(tables, build_tables())
+            self.assertEqual(sorted(tables['KNIGHT_SQUARES']['a1']), ['b3', 'c2'])
+            self.assertEqual(tables['DIRECTION_BETWEEN'][('a1', 'h8')], 'ne')
+
+            with open(path, 'r+b') as file:
+                file.write(b'XXXX')
+            self.assertIsNone(load_tables(path))
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
\ No newline at end of file